@@ -59,6 +59,20 @@ class BenchmarkCase(object):
                            unique_data: Optional[bool] = False) -> CaseDataset:
         raise NotImplementedError()
 
+    def get_clean_and_corrupted_data(self,
+                                     min_samples: Optional[int] = 10,
+                                     max_samples: Optional[int] = 10,
+                                     seed: Optional[int] = 42,
+                                     unique_data: Optional[bool] = False) -> (CaseDataset, CaseDataset):
+        """Returns clean and corrupted data for the benchmark case, where the i-th corrupted sample is paired with the
+        i-th clean one. By default, they are generated independently."""
+        clean_data = self.get_clean_data(min_samples=min_samples, max_samples=max_samples, seed=seed,
+                                         unique_data=unique_data)
+        corrupted_data = self.get_corrupted_data(min_samples=min_samples, max_samples=max_samples,
+                                                 seed=seed + 1 if seed is not None else None,
+                                                 unique_data=unique_data)
+        return clean_data, corrupted_data
+
     def get_validation_metric(self,
                               ll_model: HookedTransformer,
                               data: t.Tensor,
@@ -1,13 +1,12 @@
-import random
-from math import ceil, floor
 from typing import Set
 
+import numpy as np
 from tracr.rasp import rasp
 
 from circuits_benchmark.benchmark import vocabs
 from circuits_benchmark.benchmark.common_programs import shift_by
+from circuits_benchmark.benchmark.constrained_sampling import SampleGroup, get_token_mask
 from circuits_benchmark.benchmark.tracr_benchmark_case import TracrBenchmarkCase
-from circuits_benchmark.benchmark.vocabs import TRACR_PAD, TRACR_BOS
 from circuits_benchmark.transformers.hooked_tracr_transformer import HookedTracrTransformerBatchInput
 
 
@@ -23,77 +22,30 @@ class Case1(TracrBenchmarkCase):
 
     def sample_data(self, count, min_seq_len, max_seq_len) -> (
     HookedTracrTransformerBatchInput, HookedTracrTransformerBatchInput):
-        """Samples random data for this benchmark case, making sure that we get balanced data."""
-        input_data: HookedTracrTransformerBatchInput = []
-        output_data: HookedTracrTransformerBatchInput = []
-        sorted_vocab = sorted(self.get_vocab())
-
-        all_true_inputs = ceil(count * 0.15)
-        all_false_inputs = ceil(count * 0.15)
-
-        for _ in range(all_true_inputs):
-            input, output = self.gen_all_true_input(sorted_vocab, min_seq_len, max_seq_len)
-            input_data.append(input)
-            output_data.append(output)
-
-        for _ in range(all_false_inputs):
-            input, output = self.gen_all_false_input(sorted_vocab, min_seq_len, max_seq_len)
-            input_data.append(input)
-            output_data.append(output)
-
-        while len(input_data) < count:
-            input, output = self.gen_random_input_output(sorted_vocab, min_seq_len, max_seq_len)
-            if all(output[2:]) or not any(output[2:]):
-                continue
-
-            input_data.append(input)
-            output_data.append(output)
-
-        return input_data, output_data
-
-    def gen_all_true_input(self, sorted_vocab, min_seq_len, max_seq_len):
-        seq_len_with_bos = random.randint(min_seq_len, max_seq_len)
-        seq_len_without_bos = seq_len_with_bos - 1
-
-        sample = random.sample(sorted_vocab, 2)
-        sample = sample * floor(seq_len_without_bos / 2)
-
-        # if odd, add the first character again
-        if seq_len_without_bos % 2 == 1:
-            sample.append(sample[0])
-
-        pad_len = max_seq_len - seq_len_with_bos
-        pad = [TRACR_PAD] * pad_len
-
-        output = self.get_correct_output_for_input(sample)
-        assert all(output[2:])
-
-        input = [TRACR_BOS] + sample + pad
-        output = [TRACR_BOS] + output + pad
-
-        return input, output
-
-    def gen_all_false_input(self, sorted_vocab, min_seq_len, max_seq_len):
-        seq_len_with_bos = random.randint(min_seq_len, max_seq_len)
-        seq_len_without_bos = seq_len_with_bos - 1
-
-        sample = list(sorted_vocab)
-        sample = sample * floor(seq_len_without_bos / len(sorted_vocab))
-
-        # if we have not reached the desired length, add more characters
-        if len(sample) < seq_len_without_bos:
-            sample.extend(sorted_vocab[:seq_len_without_bos - len(sample)])
-
-        pad_len = max_seq_len - seq_len_with_bos
-        pad = [TRACR_PAD] * pad_len
-
-        output = self.get_correct_output_for_input(sample)
-        assert all([not o for o in output[2:]])
-
-        input = [TRACR_BOS] + sample + pad
-        output = [TRACR_BOS] + output + pad
-
-        return input, output
+        """Samples random data for this benchmark case, making sure that we get balanced data: 15% of the inputs where
+        all tokens are rotations, 15% where none of them is, and the rest with a mix of both."""
+        vocab_size = len(self.get_vocab())
+
+        def gen_all_true_codes(lengths: np.ndarray, max_len: int) -> np.ndarray:
+            # alternate two different tokens
+            first = np.random.randint(0, vocab_size, size=len(lengths))
+            second = (first + np.random.randint(1, vocab_size, size=len(lengths))) % vocab_size
+            return np.where(np.arange(max_len)[None, :] % 2 == 0, first[:, None], second[:, None])
+
+        def gen_all_false_codes(lengths: np.ndarray, max_len: int) -> np.ndarray:
+            # cycle through the whole vocab
+            return np.tile(np.arange(max_len) % vocab_size, (len(lengths), 1))
+
+        def is_mixed(codes: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+            is_rotation = codes[:, 2:] == codes[:, :-2]
+            has_rotation = get_token_mask(lengths, codes.shape[1])[:, 2:]
+            return (is_rotation & has_rotation).any(axis=1) & (~is_rotation & has_rotation).any(axis=1)
+
+        return self.sample_constrained_data(count, min_seq_len, max_seq_len, [
+            SampleGroup(0.15, generate=gen_all_true_codes),
+            SampleGroup(0.15, generate=gen_all_false_codes),
+            SampleGroup(0.7, accept=is_mixed),
+        ])
 
 
 def make_token_rotation_identifier(sop: rasp.SOp, rotation: int) -> rasp.SOp:
@@ -1,11 +1,11 @@
-import random
 from typing import Set
 
+import numpy as np
 from tracr.rasp import rasp
 
 from circuits_benchmark.benchmark import vocabs
+from circuits_benchmark.benchmark.constrained_sampling import SampleGroup
 from circuits_benchmark.benchmark.tracr_benchmark_case import TracrBenchmarkCase
-from circuits_benchmark.benchmark.vocabs import TRACR_PAD, TRACR_BOS
 from circuits_benchmark.transformers.hooked_tracr_transformer import HookedTracrTransformerBatchInput
 
 
@@ -28,49 +28,15 @@ class Case109(TracrBenchmarkCase):
         min_seq_len,
         max_seq_len
     ) -> (HookedTracrTransformerBatchInput, HookedTracrTransformerBatchInput):
-        input_data: HookedTracrTransformerBatchInput = []
-        output_data: HookedTracrTransformerBatchInput = []
-
-        true_data_count = count // 2
-        false_data_count = count - true_data_count
-
-        sorted_vocab = list(sorted(self.get_vocab()))
-
-        # Generate 'true' data: sequences where the last two elements are equal
-        for _ in range(true_data_count):
-            seq_len = random.randint(min_seq_len, max_seq_len)
-            random_sequence = random.choices(sorted_vocab, k=seq_len - 3)
-            # Ensure last two elements are equal
-            last_element = random.choice(sorted_vocab)
-            balanced_input = random_sequence + [last_element, last_element]
-
-            pad_len = max_seq_len - seq_len
-            pad = [TRACR_PAD] * pad_len
-
-            output = self.get_correct_output_for_input(balanced_input)
-
-            input_data.append([TRACR_BOS] + balanced_input + pad)
-            output_data.append([TRACR_BOS] + output + pad)
-
-        # Generate 'false' data: sequences where the last two elements are different
-        for _ in range(false_data_count):
-            seq_len = random.randint(min_seq_len, max_seq_len)
-            random_sequence = random.choices(sorted_vocab, k=seq_len - 3)
-            # Ensure last two elements are different
-            last_element_1 = random.choice(sorted_vocab)
-            # Make sure the second-to-last element is different from the last element
-            last_element_2 = random.choice([x for x in sorted_vocab if x != last_element_1])
-            unbalanced_input = random_sequence + [last_element_1, last_element_2]
-
-            pad_len = max_seq_len - seq_len
-            pad = [TRACR_PAD] * pad_len
-
-            output = self.get_correct_output_for_input(unbalanced_input)
-
-            input_data.append([TRACR_BOS] + unbalanced_input + pad)
-            output_data.append([TRACR_BOS] + output + pad)
-
-        return input_data, output_data
+        """Samples random data for this benchmark case, half of it with the last two elements equal."""
+        def last_two_equal(codes: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+            rows = np.arange(len(codes))
+            return codes[rows, lengths - 1] == codes[rows, lengths - 2]
+
+        return self.sample_constrained_data(count, min_seq_len, max_seq_len, [
+            SampleGroup(0.5, accept=last_two_equal),
+            SampleGroup(0.5, accept=lambda codes, lengths: ~last_two_equal(codes, lengths)),
+        ])
 
 
 def make_check_last_two_equal() -> rasp.SOp:
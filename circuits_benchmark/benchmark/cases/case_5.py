@@ -1,11 +1,11 @@
-import random
-from typing import Set, List
+from typing import Set
 
+import numpy as np
 from tracr.rasp import rasp
 
 from circuits_benchmark.benchmark.common_programs import make_shuffle_dyck
+from circuits_benchmark.benchmark.constrained_sampling import SampleGroup, get_token_mask
 from circuits_benchmark.benchmark.tracr_benchmark_case import TracrBenchmarkCase
-from circuits_benchmark.benchmark.vocabs import TRACR_BOS, TRACR_PAD
 from circuits_benchmark.transformers.hooked_tracr_transformer import HookedTracrTransformerBatchInput
 
 
@@ -22,76 +22,67 @@ class Case5(TracrBenchmarkCase):
     def supports_causal_masking(self) -> bool:
         return False
 
-    def gen_balanced_input(self, length) -> List[str]:
-        open_brackets = ['(', '{']
-        close_brackets = [')', '}']
-
-        brackets_map = {
-            '(': ')',
-            ')': '(',
-            '{': '}',
-            '}': '{'
-        }
-
-        input = []
-        open_brackets_stack = []
-
-        while len(input) < length:
-            # let's figure out which characters we can use at this position
-            chars = set()
-
-            if len(open_brackets_stack) > 0:
-                # we can definitely use closed brackets
-                for char in open_brackets_stack:
-                    chars.add(brackets_map[char])
-
-            # if the space left is less or equal than as the number of opened brackets plus one, we can also use the 'x' character
-            if len(open_brackets_stack) + 1 <= length - len(input):
-                chars.add('x')
-
-            # if the space left is less or equal than as the number of opened brackets plus two, we can also use open brackets
-            if len(open_brackets_stack) + 2 <= length - len(input):
-                chars.update(open_brackets)
-
-            # choose a random character from the valid set
-            char = random.choice(list(chars))
-            input.append(char)
-
-            if char in open_brackets:
-                open_brackets_stack.append(char)
-            elif char in close_brackets:
-                # remove the corresponding open bracket
-                open_brackets_stack.remove(brackets_map[char])
-
-        return input
+    def gen_balanced_codes(self, lengths: np.ndarray, max_len: int) -> np.ndarray:
+        """Generates inputs with balanced parentheses/brackets, as token codes (see SampleGroup). All inputs are built at
+        once, position by position: at each position, each input picks a random character among the ones that still
+        allow it to be balanced at the end."""
+        vals = sorted(self.get_vocab())
+        open_codes = np.array([vals.index("("), vals.index("{")])
+        close_codes = np.array([vals.index(")"), vals.index("}")])
+        x_code = vals.index("x")
+
+        n_samples = len(lengths)
+        codes = np.zeros((n_samples, max_len), dtype=np.int64)
+        open_counts = np.zeros((n_samples, 2), dtype=np.int64)
+
+        for position in range(max_len):
+            space_left = lengths - position
+            total_open = open_counts.sum(axis=1)
+
+            # allowed characters, in order: open brackets, close brackets, 'x'
+            allowed = np.concatenate([
+                # we can open brackets if there is space left for closing them and for another character
+                np.repeat((total_open + 2 <= space_left)[:, None], 2, axis=1),
+                # we can close the brackets that are open
+                open_counts > 0,
+                # we can use the 'x' character if there is space left for closing the open brackets
+                (total_open + 1 <= space_left)[:, None],
+            ], axis=1)
+
+            # pick one of the allowed characters uniformly at random (inputs already complete pick nothing)
+            choices = np.where(allowed, np.random.rand(n_samples, 5), -1).argmax(axis=1)
+            is_token = space_left > 0
+
+            is_open = is_token & (choices < 2)
+            is_close = is_token & (choices >= 2) & (choices < 4)
+            bracket_type = choices % 2
+
+            codes[:, position] = np.select([choices < 2, choices < 4],
+                                            [open_codes[bracket_type], close_codes[bracket_type]],
+                                            x_code)
+            open_counts[is_open, bracket_type[is_open]] += 1
+            open_counts[is_close, bracket_type[is_close]] -= 1
+
+        return codes
+
+    def is_balanced(self, codes: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        """Returns whether each input (given as token codes) has balanced parentheses and brackets."""
+        vals = sorted(self.get_vocab())
+        is_token = get_token_mask(lengths, codes.shape[1])
+
+        balanced = np.ones(len(codes), dtype=bool)
+        for open_char, close_char in [("(", ")"), ("{", "}")]:
+            steps = (is_token & (codes == vals.index(open_char))).astype(np.int64) - \
+                    (is_token & (codes == vals.index(close_char))).astype(np.int64)
+            depths = np.cumsum(steps, axis=1)
+            balanced &= (depths >= 0).all(axis=1) & (depths[:, -1] == 0)
+
+        return balanced
 
     def sample_data(self, count, min_seq_len, max_seq_len) -> (
     HookedTracrTransformerBatchInput, HookedTracrTransformerBatchInput):
         """Samples random data for this benchmark case, making sure that we get half of the data with balanced parentheses/brakets and half with unbalanced ones."""
-        input_data: HookedTracrTransformerBatchInput = []
-        output_data: HookedTracrTransformerBatchInput = []
-
-        # we use self.get_correct_output_for_input(sample) to get the correct output for each input
-        balanced_data_count = count // 2
-        unbalanced_data_count = count - balanced_data_count
-
-        # generate balanced data: equal number of open and close parentheses/brakets in each sample
-        for _ in range(balanced_data_count):
-            seq_len = random.randint(min_seq_len, max_seq_len)
-            balanced_input = self.gen_balanced_input(seq_len - 1)
-
-            pad_len = max_seq_len - seq_len
-            pad = [TRACR_PAD] * pad_len
-
-            output = self.get_correct_output_for_input(balanced_input)
-
-            input_data.append([TRACR_BOS] + balanced_input + pad)
-            output_data.append([TRACR_BOS] + output + pad)
-
-        sorted_vocab = ['(', ')', 'x', '{', '}']
-        for _ in range(unbalanced_data_count):
-            input, output = self.gen_random_input_output(sorted_vocab, min_seq_len, max_seq_len)
-            input_data.append(input)
-            output_data.append(output)
-
-        return input_data, output_data
+        return self.sample_constrained_data(count, min_seq_len, max_seq_len, [
+            SampleGroup(0.5, generate=self.gen_balanced_codes),
+            SampleGroup(0.5, accept=lambda codes, lengths: ~self.is_balanced(codes, lengths)),
+        ])
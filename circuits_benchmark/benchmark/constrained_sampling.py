@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from math import ceil
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+# Given the number of tokens of each sample (without BOS) and the max number of tokens, returns the token codes (i.e.,
+# indices in the sorted vocab) of each sample as an array of shape (n_samples, max number of tokens).
+CandidateGenerator = Callable[[np.ndarray, int], np.ndarray]
+
+# Given the token codes and the number of tokens of each sample, returns a boolean array with the samples to keep.
+CandidatePredicate = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+# Lower bound for the estimated acceptance rate of a group, so that the number of candidates drawn per round is bounded.
+MIN_ACCEPTANCE_RATE = 1 / 64
+
+
+@dataclass
+class SampleGroup:
+    """A group of samples in a constrained dataset, taking the given fraction of the samples.
+    Candidates are drawn in bulk with generate (by default, uniformly random tokens), and only the ones for which accept
+    returns True are kept (by default, all of them)."""
+    fraction: float
+    generate: CandidateGenerator | None = None
+    accept: CandidatePredicate | None = None
+
+
+def get_token_mask(lengths_without_bos: np.ndarray, max_len: int) -> np.ndarray:
+    """Returns a boolean array of shape (n_samples, max_len) telling which positions of each sample hold a token."""
+    return np.arange(max_len)[None, :] < lengths_without_bos[:, None]
+
+
+def split_count(n_samples: int, fractions: List[float]) -> List[int]:
+    """Splits n_samples in groups proportional to fractions, rounding so that the counts add up to n_samples."""
+    fractions = np.array(fractions, dtype=np.float64) / sum(fractions)
+    counts = np.floor(fractions * n_samples).astype(np.int64)
+
+    # give the remaining samples to the groups with the largest remainders
+    remainders = fractions * n_samples - counts
+    for i in np.argsort(-remainders, kind="stable")[:n_samples - counts.sum()]:
+        counts[i] += 1
+
+    return counts.tolist()
+
+
+def sample_group_codes(group: SampleGroup,
+                       n_samples: int,
+                       vocab_size: int,
+                       min_seq_len: int,
+                       max_seq_len: int,
+                       max_rounds: int = 100) -> Tuple[np.ndarray, np.ndarray]:
+    """Draws n_samples accepted samples for a group, returning the number of tokens (without BOS) and the token codes of
+    each one. Candidates are drawn in rounds, each one large enough to fill the group at the acceptance rate observed so
+    far. Raises a ValueError if the group can not be filled after max_rounds rounds."""
+    max_len = max_seq_len - 1
+    if n_samples == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, max_len), dtype=np.int64)
+
+    accepted_lengths = []
+    accepted_codes = []
+    n_accepted = 0
+    n_drawn = 0
+
+    for _ in range(max_rounds):
+        if n_accepted >= n_samples:
+            break
+
+        acceptance_rate = max(n_accepted / n_drawn if n_drawn > 0 else 1, MIN_ACCEPTANCE_RATE)
+        n_candidates = ceil((n_samples - n_accepted) / acceptance_rate)
+
+        lengths = np.random.randint(min_seq_len, max_seq_len + 1, size=n_candidates).astype(np.int64) - 1
+        if group.generate is None:
+            codes = np.random.randint(0, vocab_size, size=(n_candidates, max_len)).astype(np.int64)
+        else:
+            codes = np.asarray(group.generate(lengths, max_len), dtype=np.int64)
+
+        # positions beyond the length of each sample are ignored, we zero them so that they don't leak into predicates
+        codes[~get_token_mask(lengths, max_len)] = 0
+
+        if group.accept is not None:
+            keep = np.asarray(group.accept(codes, lengths), dtype=bool)
+            lengths, codes = lengths[keep], codes[keep]
+
+        n_drawn += n_candidates
+        n_accepted += len(lengths)
+        accepted_lengths.append(lengths)
+        accepted_codes.append(codes)
+
+    if n_accepted < n_samples:
+        raise ValueError(f"Unable to sample {n_samples} samples for group {group}: only {n_accepted} of the "
+                         f"{n_drawn} candidates drawn in {max_rounds} rounds were accepted.")
+
+    return np.concatenate(accepted_lengths)[:n_samples], np.concatenate(accepted_codes)[:n_samples]
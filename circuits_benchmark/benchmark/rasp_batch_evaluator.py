@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from tracr.rasp import rasp
+
+
+@dataclass
+class SOpBatchValue:
+    """Values of a SOp for a batch of sequences, stored as indices into a table of distinct Python values.
+    codes[i, j] is the index in table of the value at position j of the i-th sequence. Codes in positions beyond the
+    length of each sequence are meaningless."""
+    codes: np.ndarray
+    table: List[Any]
+
+
+def encode_values(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Returns the code of each value and the table of distinct values. Values with the same value but different types
+    (e.g., True and 1) are kept apart, so that decoding always returns the original objects."""
+    codes = np.empty(len(values), dtype=np.int64)
+    code_by_value: Dict[Tuple[type, Any], int] = {}
+    table = []
+
+    for i, value in enumerate(values):
+        key = (type(value), value)
+        try:
+            code = code_by_value.get(key)
+        except TypeError:
+            raise NotImplementedError(f"Unhashable RASP value: {value}")
+
+        if code is None:
+            code = len(table)
+            code_by_value[key] = code
+            table.append(value)
+        codes[i] = code
+
+    return codes, table
+
+
+def as_object_array(values: Sequence[Any]) -> np.ndarray:
+    """Returns a 1-D object array with the given values (avoiding numpy interpreting tuples as extra dimensions)."""
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
+
+
+class RASPBatchEvaluator(object):
+    """Evaluates RASP programs on a batch of sequences at once, using numpy.
+
+    Every SOp is evaluated only once for the whole batch. Element-wise functions (Map, SequenceMap and Select
+    predicates) are applied once per distinct value (or pair of values) occurring in the batch, and the results are
+    scattered to all the positions using lookup tables. Selectors are boolean arrays of shape (batch, query, key).
+
+    The semantics follow tracr's reference interpreter (rasp.evaluate): Map and SequenceMap propagate None values,
+    Aggregate returns the default value if nothing is selected and the mean of the selected values if they are numbers.
+    Unsupported expressions raise NotImplementedError.
+    """
+
+    def __init__(self, samples: Sequence[Sequence[Any]]):
+        self.lengths = np.array([len(sample) for sample in samples], dtype=np.int64)
+        self.batch_size = len(samples)
+        self.max_len = int(self.lengths.max()) if self.batch_size > 0 else 0
+
+        # mask[i, j] is True iff position j is part of the i-th sequence
+        self.mask = np.arange(self.max_len)[None, :] < self.lengths[:, None]
+        self.selector_mask = self.mask[:, :, None] & self.mask[:, None, :]
+
+        flat_tokens = [token for sample in samples for token in sample]
+        flat_codes, tokens_table = encode_values(flat_tokens)
+        tokens_codes = np.zeros((self.batch_size, self.max_len), dtype=np.int64)
+        tokens_codes[self.mask] = flat_codes
+        self.tokens = SOpBatchValue(tokens_codes, tokens_table)
+
+        self.cache: Dict[int, SOpBatchValue | np.ndarray] = {}
+
+    def evaluate(self, expr: rasp.RASPExpr) -> SOpBatchValue | np.ndarray:
+        """Returns the value of a SOp (as a SOpBatchValue) or of a Selector (as a boolean array)."""
+        key = id(expr)
+        if key not in self.cache:
+            if isinstance(expr, rasp.Selector):
+                self.cache[key] = self.evaluate_selector(expr)
+            else:
+                self.cache[key] = self.evaluate_sop(expr)
+
+        return self.cache[key]
+
+    def evaluate_nodes(self, program: rasp.SOp) -> Dict[str, SOpBatchValue]:
+        """Evaluates the program and returns the values of all the SOps in it, indexed by label."""
+        values = {}
+        visited = set()
+        exprs_to_visit = [program]
+        while len(exprs_to_visit) > 0:
+            expr = exprs_to_visit.pop()
+            if id(expr) in visited:
+                continue
+            visited.add(id(expr))
+
+            value = self.evaluate(expr)
+            if isinstance(value, SOpBatchValue):
+                values[expr.label] = value
+            exprs_to_visit.extend(expr.children)
+
+        return values
+
+    def decode(self, value: SOpBatchValue) -> List[List[Any]]:
+        """Returns the values as Python lists (one per sequence, with its original length)."""
+        decoded = as_object_array(value.table)[value.codes]
+        return [row[:length] for row, length in zip(decoded.tolist(), self.lengths.tolist())]
+
+    def evaluate_sop(self, expr: rasp.SOp) -> SOpBatchValue:
+        if isinstance(expr, rasp.TokensType):
+            return self.tokens
+        elif isinstance(expr, rasp.IndicesType):
+            codes = np.broadcast_to(np.arange(self.max_len), (self.batch_size, self.max_len))
+            return SOpBatchValue(codes, list(range(self.max_len)))
+        elif isinstance(expr, rasp.LengthType):
+            length_codes, table = encode_values(self.lengths.tolist())
+            codes = np.broadcast_to(length_codes[:, None], (self.batch_size, self.max_len))
+            return SOpBatchValue(codes, table)
+        elif isinstance(expr, rasp.Full):
+            return SOpBatchValue(np.zeros((self.batch_size, self.max_len), dtype=np.int64), [expr.fill])
+        elif isinstance(expr, rasp.Map):
+            return self.evaluate_map(expr)
+        elif isinstance(expr, rasp.SequenceMap):
+            return self.evaluate_sequence_map(expr)
+        elif isinstance(expr, rasp.SelectorWidth):
+            counts = (self.evaluate(expr.selector) & self.selector_mask).sum(axis=-1)
+            return self.encode_positions(counts.tolist())
+        elif isinstance(expr, rasp.Aggregate):
+            return self.evaluate_aggregate(expr)
+        else:
+            raise NotImplementedError(f"Unsupported SOp for batch evaluation: {type(expr).__name__}")
+
+    def evaluate_map(self, expr: rasp.Map) -> SOpBatchValue:
+        inner = self.evaluate(expr.inner)
+        used_codes = np.unique(inner.codes[self.mask])
+
+        new_values = []
+        for code in used_codes.tolist():
+            value = inner.table[code]
+            new_values.append(expr.f(value) if value is not None else None)
+
+        return self.remap(inner.codes, used_codes, new_values, len(inner.table))
+
+    def evaluate_sequence_map(self, expr: rasp.SequenceMap) -> SOpBatchValue:
+        fst = self.evaluate(expr.fst)
+        snd = self.evaluate(expr.snd)
+
+        # each pair of values gets its own code
+        snd_table_len = len(snd.table)
+        pair_codes = fst.codes * snd_table_len + snd.codes
+        used_codes = np.unique(pair_codes[self.mask])
+
+        new_values = []
+        for code in used_codes.tolist():
+            x = fst.table[code // snd_table_len]
+            y = snd.table[code % snd_table_len]
+            new_values.append(expr.f(x, y) if x is not None and y is not None else None)
+
+        return self.remap(pair_codes, used_codes, new_values, len(fst.table) * snd_table_len)
+
+    def evaluate_selector(self, expr: rasp.Selector) -> np.ndarray:
+        if isinstance(expr, rasp.Select):
+            return self.evaluate_select(expr)
+        elif isinstance(expr, rasp.SelectorAnd):
+            return self.evaluate(expr.fst) & self.evaluate(expr.snd)
+        elif isinstance(expr, rasp.SelectorOr):
+            return self.evaluate(expr.fst) | self.evaluate(expr.snd)
+        elif isinstance(expr, rasp.SelectorNot):
+            return ~self.evaluate(expr.inner) & self.selector_mask
+        else:
+            raise NotImplementedError(f"Unsupported Selector for batch evaluation: {type(expr).__name__}")
+
+    def evaluate_select(self, expr: rasp.Select) -> np.ndarray:
+        keys = self.evaluate(expr.keys)
+        queries = self.evaluate(expr.queries)
+
+        query_codes = queries.codes[:, :, None]
+        key_codes = keys.codes[:, None, :]
+
+        try:
+            # fast path: evaluate the predicate for every combination of values in the tables
+            predicate_table = np.array([[bool(expr.predicate(key, query)) for key in keys.table]
+                                        for query in queries.table], dtype=bool).reshape(len(queries.table),
+                                                                                         len(keys.table))
+            selected = predicate_table[query_codes, key_codes]
+        except Exception:
+            # Some combinations of values might not be comparable (e.g., None). The reference interpreter only
+            # evaluates the predicate on pairs of values that occur in the same sequence, so we do the same.
+            key_table_len = len(keys.table)
+            pair_codes = query_codes * key_table_len + key_codes
+            used_codes = np.unique(pair_codes[self.selector_mask])
+            predicate_values = [bool(expr.predicate(keys.table[code % key_table_len],
+                                                    queries.table[code // key_table_len]))
+                                for code in used_codes.tolist()]
+
+            predicate_lookup = np.zeros(len(queries.table) * key_table_len, dtype=bool)
+            predicate_lookup[used_codes] = predicate_values
+            selected = predicate_lookup[pair_codes]
+
+        return selected & self.selector_mask
+
+    def evaluate_aggregate(self, expr: rasp.Aggregate) -> SOpBatchValue:
+        selector = self.evaluate(expr.selector) & self.selector_mask
+        sop = self.evaluate(expr.sop)
+
+        counts = selector.sum(axis=-1)
+        first_selected = np.take_along_axis(sop.codes, selector.argmax(axis=-1), axis=1)
+
+        # As in rasp.evaluate, several values can only be aggregated if the first one is an int or bool, and the mean
+        # can only be computed if all of them are numbers
+        is_int = np.array([isinstance(value, (int, bool)) for value in sop.table], dtype=bool)
+        is_number = np.array([isinstance(value, (int, bool, float)) for value in sop.table], dtype=bool)
+        numbers = np.array([float(value) if is_number[i] else 0. for i, value in enumerate(sop.table)])
+
+        several_selected = counts > 1
+        if (several_selected & ~is_int[first_selected]).any() or \
+            (several_selected[:, :, None] & selector & ~is_number[sop.codes][:, None, :]).any():
+            raise ValueError(f"Unsupported type for aggregation in {expr.label}")
+
+        selected_numbers = np.where(selector, numbers[sop.codes][:, None, :], 0.)
+        means = selected_numbers.sum(axis=-1) / np.maximum(counts, 1)
+
+        # build the value of each position as in rasp.evaluate: default if nothing is selected, the selected value if
+        # only one is selected (ints are averaged anyway, so they become floats), and the mean otherwise.
+        sop_values = as_object_array([value / 1 if isinstance(value, (int, bool)) else value for value in sop.table])
+        values = np.empty((self.batch_size, self.max_len), dtype=object)
+        values[counts == 0] = expr.default
+        values[counts == 1] = sop_values[first_selected[counts == 1]]
+        values[several_selected] = as_object_array(means[several_selected].tolist())
+
+        return self.encode_positions(values.tolist())
+
+    def encode_positions(self, values: List[List[Any]]) -> SOpBatchValue:
+        """Encodes a (batch, max_len) nested list of values, ignoring positions beyond the length of each sequence."""
+        flat_values = [value for row, length in zip(values, self.lengths.tolist()) for value in row[:length]]
+        flat_codes, table = encode_values(flat_values)
+
+        codes = np.zeros((self.batch_size, self.max_len), dtype=np.int64)
+        codes[self.mask] = flat_codes
+        return SOpBatchValue(codes, table)
+
+    def remap(self,
+              codes: np.ndarray,
+              used_codes: np.ndarray,
+              new_values: List[Any],
+              n_codes: int) -> SOpBatchValue:
+        """Replaces each code in used_codes by the corresponding new value, using a lookup table."""
+        new_codes, table = encode_values(new_values)
+        lookup = np.zeros(n_codes, dtype=np.int64)
+        lookup[used_codes] = new_codes
+        return SOpBatchValue(lookup[codes], table)
+
+
+def evaluate_batch(program: rasp.SOp,
+                   samples: Sequence[Sequence[Any]],
+                   chunk_size: int = 10_000) -> List[List[Any]]:
+    """Evaluates a RASP program on a batch of samples (without BOS and PAD tokens), and returns the outputs as Python
+    lists, equivalent to [rasp.evaluate(program, sample) for sample in samples]. Samples are evaluated in chunks of
+    chunk_size, since selectors take memory quadratic in the sequence length."""
+    outputs = []
+    for start in range(0, len(samples), chunk_size):
+        evaluator = RASPBatchEvaluator(samples[start:start + chunk_size])
+        outputs.extend(evaluator.decode(evaluator.evaluate(program)))
+
+    return outputs
@@ -1,7 +1,9 @@
+import copy
 import itertools
 import random
+from contextlib import nullcontext
 from functools import partial
-from typing import Optional, Sequence, Set, Callable
+from typing import Optional, Sequence, Set, Callable, Dict, Tuple, List, Any, Literal
 
 import numpy as np
 import torch as t
@@ -14,12 +16,23 @@ from tracr.compiler import compiling
 from tracr.compiler.compiling import TracrOutput
 from tracr.rasp import rasp
 from tracr.rasp.rasp import RASPExpr
+from tracr.transformer.encoder import CategoricalEncoder
 from transformer_lens import HookedTransformer
 from transformer_lens.hook_points import HookedRootModule
 
 from circuits_benchmark.benchmark.benchmark_case import BenchmarkCase
-from circuits_benchmark.benchmark.tracr_dataset import TracrDataset
+from circuits_benchmark.benchmark.constrained_sampling import SampleGroup, split_count, sample_group_codes
+from circuits_benchmark.benchmark.rasp_batch_evaluator import evaluate_batch
+from circuits_benchmark.benchmark.tracr_compilation_cache import build_tracr_cache_key, load_cached_tracr_output, \
+    save_tracr_output
+from circuits_benchmark.benchmark.tracr_dataset import TracrDataset, label_encoded_inputs
+from circuits_benchmark.benchmark.tracr_dataset_cache import build_dataset_cache_key, load_cached_encoded_dataset, \
+    save_encoded_dataset
 from circuits_benchmark.benchmark.tracr_encoded_dataset import TracrEncodedDataset
+from circuits_benchmark.benchmark.tracr_streaming_dataset import TracrStreamingDataset, DEFAULT_SHARD_SIZE, \
+    sample_data_in_shards, preserved_rngs
+from circuits_benchmark.benchmark.tracr_truth_table import TruthTable, load_or_build_truth_table, \
+    get_truth_table_size, MIN_TRUTH_TABLE_USAGE
 from circuits_benchmark.benchmark.vocabs import TRACR_BOS, TRACR_PAD
 from circuits_benchmark.metrics.validation_metrics import l2_metric, kl_metric
 from circuits_benchmark.transformers.hooked_tracr_transformer import HookedTracrTransformer, \
@@ -37,6 +50,10 @@ class TracrBenchmarkCase(BenchmarkCase):
     def __init__(self):
         super().__init__()
         self.tracr_output: TracrOutput | None = None
+        self.hl_models: Dict[Tuple[str, t.dtype], HookedTracrTransformer] = {}
+        self.labelling_program: rasp.SOp | None = None
+        self.truth_table: TruthTable | None = None
+        self.truth_table_loaded = False
 
     def get_program(self) -> rasp.SOp:
         """Returns the RASP program to be compiled by Tracr."""
@@ -52,6 +69,12 @@ class TracrBenchmarkCase(BenchmarkCase):
         """
         return True
 
+    def label_with_hl_model(self) -> bool:
+        """Returns whether the ground truth outputs should be computed by running the compiled HL model instead of the
+        RASP program. False by default. When True, a sample of the outputs is still cross-checked against the RASP
+        program (see get_correct_outputs_for_inputs)."""
+        return False
+
     def build_model_pair(
         self,
         training_args: dict | None = None,
@@ -113,12 +136,36 @@ class TracrBenchmarkCase(BenchmarkCase):
     def get_hl_model(
         self,
         device: str | t.device = t.device("cuda") if t.cuda.is_available() else t.device("cpu"),
+        dtype: t.dtype = t.float32,
+        clone: bool = False,
         *args, **kwargs
     ) -> HookedTracrTransformer:
         """Returns the transformer_lens reference model for this benchmark case.
-        In IIT terminology, this is the HL model."""
-        tracr_output = self.get_tracr_output()
-        return HookedTracrTransformer.from_tracr_model(tracr_output.model, device=device, *args, **kwargs)
+        In IIT terminology, this is the HL model.
+
+        The model is built only once per device and dtype, and the same frozen instance (i.e., without gradients) is
+        returned on every call. Callers that intend to mutate the model (e.g., train it, move it to another device or
+        change its hooks setup) should pass clone=True to get their own copy, with gradients enabled."""
+        # extra arguments may change the model, so in that case we build a new one that is not shared
+        shareable = len(args) == 0 and len(kwargs) == 0
+        key = (str(t.device(device)), dtype)
+
+        if not shareable or key not in self.hl_models:
+            tracr_output = self.get_tracr_output()
+            hl_model = HookedTracrTransformer.from_tracr_model(tracr_output.model, device=device, dtype=dtype,
+                                                               *args, **kwargs)
+            if not shareable:
+                return hl_model
+
+            hl_model.requires_grad_(False)
+            self.hl_models[key] = hl_model
+
+        hl_model = self.hl_models[key]
+        if clone:
+            hl_model = copy.deepcopy(hl_model)
+            hl_model.requires_grad_(True)
+
+        return hl_model
 
     def get_correspondence(self, same_size: bool = False, *args, **kwargs) -> Correspondence:
         """Returns the correspondence between the reference and the benchmark model."""
@@ -130,7 +177,7 @@ class TracrBenchmarkCase(BenchmarkCase):
 
     def is_categorical(self) -> bool:
         """Returns whether the benchmark case is categorical."""
-        return self.get_hl_model().is_categorical()
+        return isinstance(self.get_tracr_output().model.output_encoder, CategoricalEncoder)
 
     def get_clean_data(self,
                        min_samples: Optional[int] = 10,
@@ -138,10 +185,21 @@ class TracrBenchmarkCase(BenchmarkCase):
                        seed: Optional[int] = 42,
                        unique_data: Optional[bool] = False,
                        variable_length_seqs: Optional[bool] = False,
-                       encoded_dataset: bool = True) -> TracrDataset | TracrEncodedDataset:
+                       encoded_dataset: bool = True,
+                       use_cache: bool = True,
+                       compact_dataset: bool = False,
+                       n_workers: int | None = None) -> TracrDataset | TracrEncodedDataset:
         """Returns clean data for the benchmark case.
         If the number of unique datapoints is between min_samples and max_samples, returns all possible unique datapoints.
-        Otherwise, returns a random sample of max_samples datapoints."""
+        Otherwise, returns a random sample of max_samples datapoints.
+
+        Encoded datasets generated with a seed are deterministic, so they are stored on disk (see tracr_dataset_cache)
+        and loaded from there on later calls with the same arguments. Set use_cache to False to always generate them.
+        In both cases, the global random number generators are left seeded with seed after the call.
+        If compact_dataset is True, the encoded dataset is a CompactTracrEncodedDataset, which yields the same items and
+        batches but uses several times less memory.
+        If n_workers is given, random samples are drawn in shards by that many processes (see sample_data_in_shards).
+        Sharded samples differ from the ones drawn sequentially, but they are the same for any number of workers."""
         max_seq_len = self.get_max_seq_len()
 
         if variable_length_seqs:
@@ -158,6 +216,60 @@ class TracrBenchmarkCase(BenchmarkCase):
             np.random.seed(seed)
             random.seed(seed)
 
+        dataset_cache_key = None
+        if encoded_dataset and use_cache and seed is not None:
+            sampling_settings = dict(min_samples=min_samples,
+                                     max_samples=max_samples,
+                                     seed=seed,
+                                     unique_data=unique_data,
+                                     min_seq_len=min_seq_len,
+                                     max_seq_len=max_seq_len)
+            if n_workers is not None:
+                # sharded samples are different from sequential ones (but not between different numbers of workers)
+                sampling_settings["sharded"] = True
+            dataset_cache_key = build_dataset_cache_key(self, sampling_settings)
+            cached_dataset = load_cached_encoded_dataset(dataset_cache_key, targets_device=self.get_hl_model().device)
+            if cached_dataset is not None:
+                return cached_dataset if compact_dataset else cached_dataset.to_encoded_dataset()
+
+        # the seeded RNG states are restored after sampling, so that they are the same as after loading a cached dataset
+        with preserved_rngs() if seed is not None else nullcontext():
+            input_data, output_data = self.sample_clean_data(min_samples, max_samples, seed, unique_data, min_seq_len,
+                                                             max_seq_len, n_workers)
+
+        tracr_dataset = TracrDataset(input_data, output_data, self.get_hl_model())
+
+        if encoded_dataset:
+            # the cache stores compact datasets, so we also encode in compact form if we are going to store it
+            encoded_tracr_dataset = tracr_dataset.get_encoded_dataset(
+                compact=compact_dataset or dataset_cache_key is not None)
+            if dataset_cache_key is not None:
+                save_encoded_dataset(dataset_cache_key, encoded_tracr_dataset)
+                if not compact_dataset:
+                    return encoded_tracr_dataset.to_encoded_dataset()
+            return encoded_tracr_dataset
+        else:
+            return tracr_dataset
+
+    def sample_clean_data(self,
+                          min_samples: Optional[int],
+                          max_samples: Optional[int],
+                          seed: Optional[int],
+                          unique_data: bool,
+                          min_seq_len: int,
+                          max_seq_len: int,
+                          n_workers: int | None = None) -> (HookedTracrTransformerBatchInput,
+                                                            HookedTracrTransformerBatchInput):
+        """Samples and labels the inputs and outputs of the clean data (see get_clean_data), in random order."""
+
+        def sample_data(n_samples: int):
+            if n_workers is None:
+                return self.sample_data(n_samples, min_seq_len, max_seq_len)
+
+            return sample_data_in_shards(self, n_samples, min_seq_len, max_seq_len,
+                                         seed=seed if seed is not None else random.randrange(2 ** 32),
+                                         n_workers=n_workers)
+
         input_data = None
         output_data = None
         if min_samples is not None and max_samples is not None and min_samples < self.get_total_data_len() < max_samples:
@@ -169,28 +281,17 @@ class TracrBenchmarkCase(BenchmarkCase):
         elif min_samples is not None and max_samples is None:
             if self.get_total_data_len() < min_samples:
                 # we have fewer data than the min_samples, produce at least min_samples, with repeating sequences
-                input_data, output_data = self.sample_data(min_samples, min_seq_len, max_seq_len)
+                input_data, output_data = sample_data(min_samples)
             else:
                 input_data, output_data = self.gen_all_data(min_seq_len, max_seq_len)
         elif max_samples is not None:
             # produce at most max_samples
-            input_data, output_data = self.sample_data(max_samples, min_seq_len, max_seq_len)
+            input_data, output_data = sample_data(max_samples)
 
         assert len(set([tuple(o) for o in output_data])) > 1, "All outputs are the same for this case"
 
-        unique_inputs = set()
         if unique_data:
-            # remove duplicates from input_data
-            unique_input_data = []
-            unique_output_data = []
-            for i in range(len(input_data)):
-                input = input_data[i]
-                if str(input) not in unique_inputs:
-                    unique_inputs.add(tuple(input))
-                    unique_input_data.append(input)
-                    unique_output_data.append(output_data[i])
-            input_data = unique_input_data
-            output_data = unique_output_data
+            input_data, output_data = self.make_unique_data(input_data, output_data, min_seq_len, max_seq_len)
 
         # shuffle input_data and output_data maintaining the correspondence between input and output
         indices = np.arange(len(input_data))
@@ -198,18 +299,83 @@ class TracrBenchmarkCase(BenchmarkCase):
         input_data: HookedTracrTransformerBatchInput = [input_data[i] for i in indices]
         output_data = [output_data[i] for i in indices]
 
-        tracr_dataset = TracrDataset(input_data, output_data, self.get_hl_model())
-
-        if encoded_dataset:
-            return tracr_dataset.get_encoded_dataset()
-        else:
-            return tracr_dataset
+        return input_data, output_data
 
-    def get_total_data_len(self):
-        """Returns the total number of possible sequences for the vocab and sequence lengths."""
+    def get_streaming_data(self,
+                           n_samples: int,
+                           seed: int = 42,
+                           shard_size: int = DEFAULT_SHARD_SIZE,
+                           variable_length_seqs: bool = False,
+                           compact_dataset: bool = False) -> TracrStreamingDataset:
+        """Returns n_samples random datapoints for the benchmark case, which are generated and labelled on the fly in
+        shards of shard_size samples while iterating the dataset (see TracrStreamingDataset). Unlike get_clean_data,
+        the samples are never materialized all at once, so n_samples is not bounded by the available memory."""
+        return TracrStreamingDataset(self,
+                                     n_samples,
+                                     seed=seed,
+                                     shard_size=shard_size,
+                                     variable_length_seqs=variable_length_seqs,
+                                     compact=compact_dataset)
+
+    def make_unique_data(self,
+                         input_data: HookedTracrTransformerBatchInput,
+                         output_data: HookedTracrTransformerBatchInput,
+                         min_seq_len: int,
+                         max_seq_len: int,
+                         max_rounds_without_progress: int = 10) -> (HookedTracrTransformerBatchInput,
+                                                                    HookedTracrTransformerBatchInput):
+        """Removes duplicated inputs, keeping the first occurrence of each one in the original order. Then, tops up the
+        data with fresh samples until it has as many unique inputs as the original data had inputs, or as many as there
+        are possible inputs. We give up topping up if sampling yields no new inputs max_rounds_without_progress times in
+        a row (e.g., if the case samples from a small subset of all possible inputs)."""
+        n_samples = len(input_data)
+        total_data_len = self.get_total_data_len(min_seq_len, max_seq_len)
+        if n_samples > total_data_len:
+            print(f"Requested {n_samples} unique samples for case {self.get_name()}, but there are only "
+                  f"{total_data_len} possible inputs.")
+            n_samples = total_data_len
+
+        token_codes: Dict[Any, int] = {}
+        codes = self.encode_inputs_as_codes(input_data, token_codes)
+        unique_indices = get_unique_row_indices(codes)
+        codes = codes[unique_indices]
+        input_data = [input_data[i] for i in unique_indices]
+        output_data = [output_data[i] for i in unique_indices]
+
+        rounds_without_progress = 0
+        while len(input_data) < n_samples and rounds_without_progress < max_rounds_without_progress:
+            new_input_data, new_output_data = self.sample_data(n_samples - len(input_data), min_seq_len, max_seq_len)
+            new_codes = self.encode_inputs_as_codes(new_input_data, token_codes)
+
+            # previous inputs are already unique, so they are all kept, and new ones are appended after them
+            unique_indices = get_unique_row_indices(np.concatenate([codes, new_codes]))
+            new_indices = unique_indices[unique_indices >= len(codes)] - len(codes)
+            rounds_without_progress = rounds_without_progress + 1 if len(new_indices) == 0 else 0
+
+            codes = np.concatenate([codes, new_codes[new_indices]])
+            input_data = input_data + [new_input_data[i] for i in new_indices]
+            output_data = output_data + [new_output_data[i] for i in new_indices]
+
+        return input_data[:n_samples], output_data[:n_samples]
+
+    def encode_inputs_as_codes(self,
+                               inputs: HookedTracrTransformerBatchInput,
+                               token_codes: Dict[Any, int]) -> np.ndarray:
+        """Returns the inputs as an integer array of shape (n_inputs, max input length), where each token is replaced by
+        its code in token_codes (new tokens are added to it). Shorter inputs are padded with -1."""
+        max_len = max([len(input) for input in inputs], default=0)
+        codes = np.full((len(inputs), max_len), -1, dtype=np.int64)
+        for i, input in enumerate(inputs):
+            codes[i, :len(input)] = [token_codes.setdefault(token, len(token_codes)) for token in input]
+
+        return codes
+
+    def get_total_data_len(self, min_seq_len: Optional[int] = None, max_seq_len: Optional[int] = None):
+        """Returns the total number of possible sequences for the vocab and sequence lengths (including BOS). By
+        default, the sequence lengths of the case are used."""
         vals = sorted(list(self.get_vocab()))
-        max_len = self.get_max_seq_len()
-        min_len = self.get_min_seq_len() - 1
+        max_len = max_seq_len if max_seq_len is not None else self.get_max_seq_len()
+        min_len = (min_seq_len if min_seq_len is not None else self.get_min_seq_len()) - 1
 
         total_len = 0
         for l in range(min_len, max_len):
@@ -226,21 +392,135 @@ class TracrBenchmarkCase(BenchmarkCase):
         Default implementation: re-generate clean data with a different seed."""
         return self.get_clean_data(min_samples=min_samples, max_samples=max_samples, seed=seed, unique_data=unique_data)
 
+    def get_clean_and_corrupted_data(self,
+                                     min_samples: Optional[int] = 10,
+                                     max_samples: Optional[int] = 10,
+                                     seed: Optional[int] = 42,
+                                     unique_data: Optional[bool] = False,
+                                     corruption: Literal["permutation", "positions"] = "permutation",
+                                     n_corrupted_positions: int = 1,
+                                     compact_dataset: bool = False) -> (TracrEncodedDataset, TracrEncodedDataset):
+        """Returns clean and corrupted encoded data for the benchmark case, derived from a single pool of labelled
+        samples (the clean data, as returned by get_clean_data). The i-th corrupted sample is paired with the i-th clean
+        one, and is built according to corruption:
+        - "permutation": another sample of the pool, so that no sample is paired with itself. No extra labelling is
+          needed, but the pool must have at least 2 samples.
+        - "positions": the same sample, with n_corrupted_positions of its tokens replaced by different tokens of the
+          vocab. The corrupted inputs are labelled by the HL model, without running the RASP program."""
+        clean_data = self.get_clean_data(min_samples=min_samples, max_samples=max_samples, seed=seed,
+                                         unique_data=unique_data, compact_dataset=compact_dataset)
+
+        generator = t.Generator()
+        if seed is not None:
+            generator.manual_seed(seed)
+        else:
+            generator.seed()
+
+        if corruption == "permutation":
+            if len(clean_data) < 2:
+                raise ValueError(f"Permutation corruption needs at least 2 clean samples, got {len(clean_data)}")
+
+            # pair each sample in a random cycle with the next one, so that there are no fixed points
+            permutation = t.randperm(len(clean_data), generator=generator)
+            corrupted_indices = t.empty_like(permutation)
+            corrupted_indices[permutation] = permutation.roll(-1)
+            return clean_data, clean_data.select(corrupted_indices)
+
+        if corruption == "positions":
+            corrupted_inputs = self.corrupt_encoded_inputs(clean_data.inputs, n_corrupted_positions, generator)
+            corrupted_data = label_encoded_inputs(self.get_hl_model(), corrupted_inputs, compact=compact_dataset)
+            return clean_data, corrupted_data
+
+        raise ValueError(f"Unknown corruption: {corruption}")
+
+    def corrupt_encoded_inputs(self,
+                               encoded_inputs: Tensor,
+                               n_positions: int,
+                               generator: t.Generator | None = None) -> Tensor:
+        """Returns a copy of the encoded inputs where, for each input, n_positions random tokens (excluding BOS and PAD)
+        are replaced by a different random token of the vocab. Inputs with fewer tokens have all of them replaced."""
+        input_encoder = self.get_hl_model().tracr_input_encoder
+        encoding_map = input_encoder.encoding_map
+        vocab_ids = t.tensor(sorted(encoding_map[val] for val in self.get_vocab()), dtype=t.long)
+        assert len(vocab_ids) > 1, "Inputs can not be corrupted with a single-token vocab"
+
+        inputs = encoded_inputs.long()
+        is_token = (inputs != encoding_map[input_encoder.bos_token]) & (inputs != encoding_map[input_encoder.pad_token])
+        is_token[:, 0] = False
+
+        # pick n_positions random token positions of each input: the ones with the highest random scores
+        scores = t.rand(inputs.shape, generator=generator).masked_fill(~is_token, -1)
+        n_positions = min(n_positions, inputs.shape[1])
+        positions = scores.topk(n_positions, dim=1).indices
+        is_corrupted = t.zeros_like(is_token).scatter_(1, positions, True) & is_token
+
+        # replace each token by another one, shifting its index in the vocab by a random non-zero offset
+        vocab_indices = t.searchsorted(vocab_ids, inputs.clamp(max=int(vocab_ids.max())))
+        offsets = t.randint(1, len(vocab_ids), inputs.shape, generator=generator)
+        new_tokens = vocab_ids[(vocab_indices + offsets) % len(vocab_ids)]
+
+        return t.where(is_corrupted, new_tokens, inputs).to(encoded_inputs.dtype)
+
     def sample_data(self, n_samples: int, min_seq_len: int, max_seq_len: int):
-        """Samples random data for the benchmark case."""
+        """Samples random data for the benchmark case.
+        The random draws are the same as calling gen_random_input n_samples times, but they are done all at once. If
+        the case has a truth table (see get_truth_table), the outputs are gathered from it instead of running the
+        labelling program."""
         vals = sorted(list(self.get_vocab()))
 
-        input_data: HookedTracrTransformerBatchInput = []
-        output_data: HookedTracrTransformerBatchInput = []
+        seq_lens = np.array([random.randint(min_seq_len, max_seq_len) for _ in range(n_samples)], dtype=np.int64)
+        lengths_without_bos = seq_lens - 1
+
+        # tokens of each input are drawn consecutively, as in np.random.choice(vals, size=seq_len - 1)
+        is_token = np.arange(max_seq_len - 1)[None, :] < lengths_without_bos[:, None]
+        token_codes = np.zeros((n_samples, max_seq_len - 1), dtype=np.int64)
+        token_codes[is_token] = np.random.randint(0, len(vals), size=int(lengths_without_bos.sum()))
+
+        return self.label_token_codes(vals, lengths_without_bos, token_codes, max_seq_len)
+
+    def sample_constrained_data(self,
+                                n_samples: int,
+                                min_seq_len: int,
+                                max_seq_len: int,
+                                groups: List[SampleGroup]) -> (HookedTracrTransformerBatchInput,
+                                                               HookedTracrTransformerBatchInput):
+        """Samples random data made of groups of samples (e.g., one per label), each one taking its fraction of
+        n_samples. Candidates for each group are drawn and filtered in bulk (see sample_group_codes), and the samples
+        are returned group after group."""
+        vals = sorted(list(self.get_vocab()))
 
-        for _ in range(n_samples):
-            input, output = self.gen_random_input_output(vals, min_seq_len, max_seq_len)
-            input_data.append(input)
-            output_data.append(output)
+        lengths_without_bos = []
+        token_codes = []
+        for group, count in zip(groups, split_count(n_samples, [group.fraction for group in groups])):
+            group_lengths, group_codes = sample_group_codes(group, count, len(vals), min_seq_len, max_seq_len)
+            lengths_without_bos.append(group_lengths)
+            token_codes.append(group_codes)
+
+        return self.label_token_codes(vals, np.concatenate(lengths_without_bos), np.concatenate(token_codes),
+                                      max_seq_len)
+
+    def label_token_codes(self,
+                          vals: List[Any],
+                          lengths_without_bos: np.ndarray,
+                          token_codes: np.ndarray,
+                          max_seq_len: int) -> (HookedTracrTransformerBatchInput, HookedTracrTransformerBatchInput):
+        """Decodes the inputs given as token codes (see decode_inputs) and returns them along with their outputs. If the
+        case has a truth table and there are enough inputs to use it (see get_truth_table), the outputs are gathered
+        from it instead of running the labelling program."""
+        input_data: HookedTracrTransformerBatchInput = self.decode_inputs(vals, lengths_without_bos, token_codes,
+                                                                          max_seq_len).tolist()
+
+        truth_table = self.get_truth_table(len(input_data))
+        if truth_table is not None and max_seq_len <= truth_table.max_seq_len:
+            indices = truth_table.get_indices(lengths_without_bos, token_codes)
+            output_data = truth_table.lookup(indices, max_seq_len)
+        else:
+            output_data = self.get_correct_outputs_for_inputs(input_data)
 
         return input_data, output_data
 
-    def gen_random_input_output(self, vals, min_seq_len, max_seq_len) -> (Sequence, Sequence):
+    def gen_random_input(self, vals, min_seq_len, max_seq_len) -> Sequence:
+        """Returns a random input (including BOS and PAD tokens)."""
         seq_len = random.randint(min_seq_len, max_seq_len)
 
         # figure out padding
@@ -248,55 +528,224 @@ class TracrBenchmarkCase(BenchmarkCase):
         pad = [TRACR_PAD] * pad_len
 
         sample = np.random.choice(vals, size=seq_len - 1).tolist()  # sample with replacement
-        output = self.get_correct_output_for_input(sample)
 
-        input = [TRACR_BOS] + sample + pad
-        output = [TRACR_BOS] + output + pad
+        return [TRACR_BOS] + sample + pad
+
+    def gen_random_input_output(self, vals, min_seq_len, max_seq_len) -> (Sequence, Sequence):
+        input = self.gen_random_input(vals, min_seq_len, max_seq_len)
+        output = self.get_correct_outputs_for_inputs([input])[0]
 
         return input, output
 
-    def gen_all_data(self, min_seq_len, max_seq_len) -> (
-        HookedTracrTransformerBatchInput, HookedTracrTransformerBatchInput):
-        """Generates all possible sequences for the vocab on this case."""
+    def gen_all_data(self,
+                     min_seq_len: int,
+                     max_seq_len: int,
+                     n_samples: Optional[int] = None,
+                     shuffle: bool = False) -> (HookedTracrTransformerBatchInput, HookedTracrTransformerBatchInput):
+        """Generates all possible sequences for the vocab on this case.
+        If shuffle is True, the sequences are randomly permuted. If n_samples is not None, only the first n_samples
+        sequences are returned (and labelled)."""
+        inputs = self.gen_all_inputs(min_seq_len, max_seq_len, n_samples=n_samples, shuffle=shuffle)
+
+        input_data: HookedTracrTransformerBatchInput = inputs.tolist()
+        output_data = self.get_correct_outputs_for_inputs(input_data)
+
+        return input_data, output_data
+
+    def gen_all_inputs(self,
+                       min_seq_len: int,
+                       max_seq_len: int,
+                       n_samples: Optional[int] = None,
+                       shuffle: bool = False) -> np.ndarray:
+        """Enumerates all possible input sequences (with BOS and PAD) for the vocab on this case, as an object array of
+        shape (n_samples, max_seq_len).
+
+        Each sequence is identified by an integer: sequences are ordered by length, and sequences of the same length by
+        the value of their tokens read as a number in base len(vocab). The enumeration (and the optional shuffling and
+        slicing) is done over these integers, and only the selected ones are decoded into tokens."""
         vals = sorted(list(self.get_vocab()))
+        base = len(vals)
+
+        seq_lens = np.arange(min_seq_len, max_seq_len + 1)
+        counts = np.array([base ** (seq_len - 1) for seq_len in seq_lens], dtype=np.int64)
+        ends = np.cumsum(counts)
+        total = int(ends[-1])
 
-        input_data: HookedTracrTransformerBatchInput = []
-        output_data: HookedTracrTransformerBatchInput = []
+        if shuffle:
+            indices = sample_without_replacement(total, n_samples if n_samples is not None else total)
+        else:
+            indices = np.arange(min(total, n_samples) if n_samples is not None else total, dtype=np.int64)
 
-        for seq_len in range(min_seq_len, max_seq_len + 1):
-            pad_len = max_seq_len - seq_len
-            pad = [TRACR_PAD] * pad_len
+        # split each global index into the sequence length and the index among the sequences of that length
+        length_ids = np.searchsorted(ends, indices, side="right")
+        local_indices = indices - (ends - counts)[length_ids]
+        lengths_without_bos = seq_lens[length_ids] - 1
 
-            count = len(vals) ** (seq_len - 1)
-            for index in range(count):
-                # we want to produce all possible sequences for these lengths, so we convert the index to base len(vals) and
-                # then convert each digit to the corresponding value in vals
-                sample = []
-                base = len(vals)
-                num = index
-                while num:
-                    sample.append(vals[num % base])
-                    num //= base
+        # the digit at position p (most significant first) of a sequence of n tokens is (index // base^(n-1-p)) % base
+        positions = np.arange(max_seq_len - 1)
+        exponents = lengths_without_bos[:, None] - 1 - positions[None, :]
+        digits = (local_indices[:, None] // np.power(base, np.maximum(exponents, 0), dtype=np.int64)) % base
 
-                if len(sample) < seq_len - 1:
-                    # extend with the first value in vocab to fill the sequence
-                    sample.extend([vals[0]] * (seq_len - 1 - len(sample)))
+        return self.decode_inputs(vals, lengths_without_bos, digits, max_seq_len)
 
-                # reverse the list to produce the sequence in the correct order
-                sample = sample[::-1]
+    def decode_inputs(self,
+                      vals: List[Any],
+                      lengths_without_bos: np.ndarray,
+                      token_codes: np.ndarray,
+                      max_seq_len: int) -> np.ndarray:
+        """Returns the inputs (with BOS and PAD) as an object array of shape (n_inputs, max_seq_len), given the number
+        of tokens of each input and the index in vals of each of its tokens. Codes beyond the length of each input are
+        ignored."""
+        # object array, so that decoded tokens keep their original Python types
+        vocab_lookup = np.empty(len(vals), dtype=object)
+        for i, val in enumerate(vals):
+            vocab_lookup[i] = val
 
-                output = self.get_correct_output_for_input(sample)
+        is_token = np.arange(max_seq_len - 1)[None, :] < lengths_without_bos[:, None]
 
-                input_data.append([TRACR_BOS] + sample + pad)
-                output_data.append([TRACR_BOS] + output + pad)
+        inputs = np.full((len(lengths_without_bos), max_seq_len), TRACR_PAD, dtype=object)
+        inputs[:, 0] = TRACR_BOS
+        inputs[:, 1:][is_token] = vocab_lookup[token_codes[is_token]]
 
-        return input_data, output_data
+        return inputs
 
     def get_correct_output_for_input(self, input: Sequence) -> Sequence:
         """Returns the correct output for the given input.
         By default, we run the program and use its output as ground truth.
         """
-        return self.get_program()(input)
+        return self.get_labelling_program()(input)
+
+    def get_correct_outputs_for_inputs(self,
+                                       inputs: HookedTracrTransformerBatchInput,
+                                       cross_check_samples: int = 10,
+                                       atol: float = 1e-2) -> HookedTracrTransformerBatchInput:
+        """Returns the correct outputs for a batch of inputs. Inputs and outputs include the BOS and PAD tokens.
+        If the case has a truth table covering all the inputs (see get_truth_table), the outputs are looked up there.
+        Otherwise, they are computed by compute_correct_outputs_for_inputs."""
+        truth_table = self.get_truth_table(len(inputs))
+        if truth_table is not None:
+            indices = truth_table.encode_inputs(inputs)
+            if indices is not None:
+                outputs = truth_table.lookup(indices, truth_table.max_seq_len)
+                return [output[:len(input)] for output, input in zip(outputs, inputs)]
+
+        return self.compute_correct_outputs_for_inputs(inputs, cross_check_samples, atol)
+
+    def compute_correct_outputs_for_inputs(self,
+                                           inputs: HookedTracrTransformerBatchInput,
+                                           cross_check_samples: int = 10,
+                                           atol: float = 1e-2) -> HookedTracrTransformerBatchInput:
+        """Computes the correct outputs for a batch of inputs. Inputs and outputs include the BOS and PAD tokens.
+
+        By default, the whole batch is evaluated at once by the RASP program. Cases that override
+        get_correct_output_for_input are labelled one input at a time using that method. Cases for which
+        label_with_hl_model returns True are labelled by the compiled HL model, and cross_check_samples random outputs
+        are then compared against the RASP program (up to atol for numerical cases).
+        """
+        samples = [[x for x in input[1:] if x != TRACR_PAD] for input in inputs]
+
+        if self.label_with_hl_model():
+            outputs = self.run_hl_model_on_samples(inputs, samples)
+            self.cross_check_outputs(samples, outputs, cross_check_samples, atol)
+        elif type(self).get_correct_output_for_input is not TracrBenchmarkCase.get_correct_output_for_input:
+            outputs = [self.get_correct_output_for_input(sample) for sample in samples]
+        else:
+            outputs = self.evaluate_program_on_samples(samples)
+
+        return [[TRACR_BOS] + list(output) + [TRACR_PAD] * (len(input) - 1 - len(output))
+                for input, output in zip(inputs, outputs)]
+
+    def get_truth_table(self, n_inputs: int | None = None) -> TruthTable | None:
+        """Returns the truth table of this case (i.e., the outputs for all possible inputs), or None if the case has too
+        many possible inputs. The table is built the first time it is needed and stored on disk.
+        If n_inputs is given (i.e., the number of inputs to be labelled with the table), the table is only loaded or
+        built if n_inputs is at least MIN_TRUTH_TABLE_USAGE times its size, and None is returned otherwise. Tables that
+        were already loaded are always returned."""
+        if not self.truth_table_loaded:
+            if n_inputs is not None:
+                table_size = get_truth_table_size(len(self.get_vocab()), self.get_max_seq_len())
+                if n_inputs < MIN_TRUTH_TABLE_USAGE * table_size:
+                    return None
+
+            self.truth_table = load_or_build_truth_table(self)
+            self.truth_table_loaded = True
+
+        return self.truth_table
+
+    def get_labelling_program(self) -> rasp.SOp:
+        """Returns the RASP program used to compute ground truth outputs. It is built only once per case."""
+        if self.labelling_program is None:
+            self.labelling_program = self.get_program()
+
+        return self.labelling_program
+
+    def evaluate_program_on_samples(self,
+                                    samples: List[List[Any]],
+                                    validation_samples: int = 10,
+                                    atol: float = 1e-6) -> List[List[Any]]:
+        """Evaluates the RASP program on a batch of samples (without BOS and PAD tokens).
+        We use the vectorized evaluator, and check validation_samples random outputs against the reference interpreter
+        (up to atol for numbers). We fall back to the reference interpreter (one sample at a time) if the vectorized
+        evaluator fails (e.g., the program uses expressions it does not support) or disagrees with it."""
+        program = self.get_labelling_program()
+        if len(samples) == 0:
+            return []
+
+        try:
+            outputs = evaluate_batch(program, samples)
+
+            # use a separate random generator, so that we don't alter the global random state used for sampling data
+            rng = np.random.default_rng(len(samples))
+            indices = rng.choice(len(samples), size=min(validation_samples, len(samples)), replace=False)
+            if all(outputs_match(outputs[i], rasp.evaluate(program, samples[i]), atol) for i in indices):
+                return outputs
+
+            print(f"Batch RASP evaluation disagrees with the reference interpreter for {self.get_name()}, "
+                  f"falling back to it.")
+        except Exception as e:
+            print(f"Unable to evaluate the RASP program of {self.get_name()} in batch, falling back to the reference "
+                  f"interpreter: {e!r}")
+
+        return [rasp.evaluate(program, sample) for sample in samples]
+
+    def run_hl_model_on_samples(self,
+                                inputs: HookedTracrTransformerBatchInput,
+                                samples: List[List[Any]]) -> List[List[Any]]:
+        """Runs the compiled HL model on a batch of inputs (with BOS and PAD tokens), and returns the decoded outputs
+        for the given samples (i.e., without BOS and PAD tokens)."""
+        hl_model = self.get_hl_model()
+        with t.no_grad():
+            decoded_outputs = hl_model(inputs, return_type="decoded")
+
+        return [decoded_output[1:len(sample) + 1] for decoded_output, sample in zip(decoded_outputs, samples)]
+
+    def cross_check_outputs(self,
+                            samples: List[List[Any]],
+                            outputs: List[List[Any]],
+                            cross_check_samples: int,
+                            atol: float):
+        """Compares a random subset of the given outputs against the ones produced by the RASP program, and raises an
+        error if they differ. Positions for which the RASP program returns None are ignored."""
+        if cross_check_samples <= 0 or len(samples) == 0:
+            return
+
+        # use a separate random generator, so that we don't alter the global random state used for sampling data
+        rng = np.random.default_rng(len(samples))
+        indices = rng.choice(len(samples), size=min(cross_check_samples, len(samples)), replace=False)
+
+        is_categorical = self.is_categorical()
+        expected_outputs = self.evaluate_program_on_samples([samples[i] for i in indices])
+        for i, expected_output in zip(indices, expected_outputs):
+            for expected, actual in zip(expected_output, outputs[i]):
+                if expected is None:
+                    continue
+
+                correct = expected == actual if is_categorical else np.isclose(expected, actual, atol=atol)
+                if not correct:
+                    raise ValueError(f"HL model output does not match the RASP program for case {self.get_name()}."
+                                     f"\n >>> Input: {samples[i]}"
+                                     f"\n >>> Expected: {expected_output}"
+                                     f"\n >>> Got: {outputs[i]}")
 
     def get_validation_metric(
         self,
@@ -308,11 +757,10 @@ class TracrBenchmarkCase(BenchmarkCase):
         """Returns the validation metric for the benchmark case.
         By default, only the l2 and kl metrics are available. Other metrics should override this method.
         """
+        is_categorical = self.is_categorical()
         if metric_name is None:
-            hl_model = self.get_hl_model()
-            metric_name = "l2" if not hl_model.is_categorical() else "kl"
+            metric_name = "l2" if not is_categorical else "kl"
 
-        is_categorical = self.get_hl_model().is_categorical()
         with t.no_grad():
             baseline_output = ll_model(data)
         if metric_name == "l2":
@@ -335,29 +783,45 @@ class TracrBenchmarkCase(BenchmarkCase):
     def get_relative_path_from_root(self) -> str:
         return f"circuits_benchmark/benchmark/cases/case_{self.get_name()}.py"
 
-    def get_tracr_output(self) -> TracrOutput:
-        """Compiles a single case to a tracr model."""
+    def get_tracr_output(self, use_cache: bool = True, cache_dir: str | None = None) -> TracrOutput:
+        """Compiles a single case to a tracr model.
+        Compiled models are stored on disk (see tracr_compilation_cache), so that they are only compiled once across
+        processes. Set use_cache to False to always compile from scratch."""
         if self.tracr_output is not None:
             return self.tracr_output
 
+        # Tracr assumes that max_seq_len means the maximum sequence length without BOS
+        compiler_settings = dict(
+            max_seq_len=self.get_max_seq_len() - 1,
+            compiler_bos=TRACR_BOS,
+            compiler_pad=TRACR_PAD,
+            causal=self.supports_causal_masking(),
+        )
+
+        cache_key = None
+        if use_cache:
+            cache_key = build_tracr_cache_key(self, compiler_settings)
+            tracr_output = load_cached_tracr_output(cache_key, cache_dir=cache_dir)
+            if tracr_output is not None:
+                self.tracr_output = tracr_output
+                return tracr_output
+
         # Reset the RASPExpr ids to ensure reproducibility of Tracr labels
         RASPExpr._ids = itertools.count(1)
 
         program = self.get_program()
-        max_seq_len_without_BOS = self.get_max_seq_len() - 1
         vocab = self.get_vocab()
 
-        # Tracr assumes that max_seq_len in the following call means the maximum sequence length without BOS
         tracr_output = compiling.compile_rasp_to_model(
             program,
             vocab=vocab,
-            max_seq_len=max_seq_len_without_BOS,
-            compiler_bos=TRACR_BOS,
-            compiler_pad=TRACR_PAD,
-            causal=self.supports_causal_masking(),
+            **compiler_settings,
         )
         self.tracr_output = tracr_output
 
+        if use_cache:
+            save_tracr_output(cache_key, tracr_output, cache_dir=cache_dir)
+
         return tracr_output
 
     def get_ll_gt_circuit(self, granularity: CircuitGranularity = "acdc_hooks", *args, **kwargs) -> Circuit:
@@ -370,3 +834,52 @@ class TracrBenchmarkCase(BenchmarkCase):
         tacr_output = self.get_tracr_output()
         tracr_circuits = build_tracr_circuits(tacr_output.graph, tacr_output.craft_model, granularity=granularity)
         return tracr_circuits.tracr_transformer_circuit
+
+
+def get_unique_row_indices(rows: np.ndarray) -> np.ndarray:
+    """Returns the indices of the first occurrence of each distinct row in a 2-D array, in increasing order. Each row
+    is packed into a single opaque value, so that np.unique compares whole rows at once."""
+    if len(rows) == 0:
+        return np.arange(0)
+
+    rows = np.ascontiguousarray(rows)
+    packed_rows = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+    _, first_indices = np.unique(packed_rows, return_index=True)
+
+    return np.sort(first_indices)
+
+
+def outputs_match(output: Sequence[Any], expected_output: Sequence[Any], atol: float) -> bool:
+    """Returns whether two outputs of a RASP program are equal. Numbers are compared up to atol, and other values
+    (e.g., categorical tokens or None) must be equal."""
+    if len(output) != len(expected_output):
+        return False
+
+    for value, expected in zip(output, expected_output):
+        is_number = isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+        is_expected_number = isinstance(expected, (int, float, np.number)) and not isinstance(expected, bool)
+        if is_number and is_expected_number:
+            if not np.isclose(value, expected, rtol=0, atol=atol):
+                return False
+        elif value != expected:
+            return False
+
+    return True
+
+
+def sample_without_replacement(total: int, n_samples: int) -> np.ndarray:
+    """Returns min(n_samples, total) distinct random integers in [0, total), in random order, using the global numpy
+    random state. If n_samples is small compared to total, random integers are drawn and deduplicated (drawing more
+    until there are enough), so time and memory depend on n_samples instead of total. Note that
+    np.random.choice(total, n_samples, replace=False) permutes all of [0, total) to do the same."""
+    if 2 * n_samples >= total:
+        return np.random.permutation(total)[:n_samples]
+
+    indices = np.empty(0, dtype=np.int64)
+    while len(indices) < n_samples:
+        new_indices = np.random.randint(0, total, size=n_samples - len(indices), dtype=np.int64)
+        candidates = np.concatenate([indices, new_indices])
+        _, first_indices = np.unique(candidates, return_index=True)
+        indices = candidates[np.sort(first_indices)]
+
+    return indices
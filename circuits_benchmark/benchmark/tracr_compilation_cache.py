@@ -0,0 +1,102 @@
+import hashlib
+import inspect
+import os
+import sys
+import tempfile
+from typing import List, Dict, Any
+
+from tracr.compiler.compiling import TracrOutput
+
+from circuits_benchmark.utils.cloudpickle import dump_to_pickle, load_from_pickle
+from circuits_benchmark.utils.project_paths import get_default_cache_dir
+
+# Bump this number whenever the layout of the cached artifacts changes, so that stale entries are ignored.
+TRACR_CACHE_VERSION = 1
+
+# Modules whose source code can change the RASP program (or its vocab) of a case.
+PROGRAM_SOURCE_PACKAGES = (
+    "circuits_benchmark.benchmark.cases",
+    "circuits_benchmark.benchmark.common_programs",
+    "circuits_benchmark.benchmark.vocabs",
+)
+
+
+def get_tracr_cache_dir() -> str:
+    """Returns the directory where compiled Tracr programs are stored."""
+    return os.path.join(get_default_cache_dir(), "tracr")
+
+
+def get_program_source_files(case: "TracrBenchmarkCase") -> List[str]:
+    """Returns the source files that define the RASP program of a case.
+    This includes the module of the case (and of its parent cases), plus every module in PROGRAM_SOURCE_PACKAGES
+    referenced from them (e.g., helper functions imported from common_programs or from other cases).
+    """
+    def is_program_module(module) -> bool:
+        return module is not None and module.__name__.startswith(PROGRAM_SOURCE_PACKAGES)
+
+    files = set()
+    for cls in inspect.getmro(type(case)):
+        module = sys.modules.get(cls.__module__)
+        if not is_program_module(module):
+            continue
+
+        files.add(inspect.getsourcefile(module))
+        for value in vars(module).values():
+            value_module = inspect.getmodule(value)
+            if is_program_module(value_module):
+                files.add(inspect.getsourcefile(value_module))
+
+    return sorted(files)
+
+
+def build_tracr_cache_key(case: "TracrBenchmarkCase", compiler_settings: Dict[str, Any]) -> str:
+    """Returns a content-addressed key for the compiled Tracr program of a case.
+    The key is a hash of the program source, the vocab, and the settings passed to the Tracr compiler (which include
+    max_seq_len)."""
+    hasher = hashlib.sha256()
+    hasher.update(f"version={TRACR_CACHE_VERSION}".encode())
+    hasher.update(f"class={type(case).__module__}.{type(case).__qualname__}".encode())
+
+    for file_path in get_program_source_files(case):
+        with open(file_path, "rb") as f:
+            hasher.update(f.read())
+
+    # vocabs may mix types, so we sort them by their string representation
+    vocab = sorted(case.get_vocab(), key=lambda v: (type(v).__name__, str(v)))
+    hasher.update(f"vocab={vocab!r}".encode())
+
+    for name, value in sorted(compiler_settings.items()):
+        hasher.update(f"{name}={value!r}".encode())
+
+    return hasher.hexdigest()
+
+
+def load_cached_tracr_output(key: str, cache_dir: str | None = None) -> TracrOutput | None:
+    """Loads a compiled Tracr program from the cache. Returns None if it is not cached or can not be loaded."""
+    if cache_dir is None:
+        cache_dir = get_tracr_cache_dir()
+
+    try:
+        return load_from_pickle(os.path.join(cache_dir, f"{key}.pkl"))
+    except Exception as e:
+        print(f"Ignoring unreadable Tracr cache entry {key}: {e}")
+        return None
+
+
+def save_tracr_output(key: str, tracr_output: TracrOutput, cache_dir: str | None = None) -> None:
+    """Stores a compiled Tracr program in the cache. Failing to store it is not an error, we just don't cache it."""
+    if cache_dir is None:
+        cache_dir = get_tracr_cache_dir()
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # write to a temporary file first, so that concurrent processes never read a partially written entry
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        dump_to_pickle(tmp_path, tracr_output)
+        os.replace(tmp_path, os.path.join(cache_dir, f"{key}.pkl"))
+    except Exception as e:
+        print(f"Unable to store Tracr cache entry {key}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
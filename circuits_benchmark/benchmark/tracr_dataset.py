@@ -3,13 +3,18 @@ from __future__ import annotations
 from typing import List, Any, Optional
 
 import torch as t
+from torch import Tensor
 from torch.utils.data import DataLoader
 
 from circuits_benchmark.benchmark.case_dataset import CaseDataset
-from circuits_benchmark.benchmark.tracr_encoded_dataset import TracrEncodedDataset
+from circuits_benchmark.benchmark.tracr_encoded_dataset import TracrEncodedDataset, CompactTracrEncodedDataset, \
+    get_smallest_int_dtype
 
 TracrBatchInput = List[List[Any]]
 
+# Default memory budget (in bytes) for a single forward pass of the HL model when encoding a dataset.
+DEFAULT_ENCODING_MEMORY_BUDGET = 512 * 2 ** 20
+
 
 class TracrDataset(CaseDataset):
     def __init__(self,
@@ -51,17 +56,111 @@ class TracrDataset(CaseDataset):
             collate_fn=lambda x: self.collate_fn(x),
         )
 
-    def get_encoded_dataset(self):
-        encoded_inputs = self.hl_model.map_tracr_input_to_tl_input(self.inputs)
+    def get_encoded_dataset(self,
+                            chunk_size: int | None = None,
+                            memory_budget: int = DEFAULT_ENCODING_MEMORY_BUDGET,
+                            compact: bool = False) -> TracrEncodedDataset | CompactTracrEncodedDataset:
+        """Encodes the inputs and computes the HL model outputs for them.
+        The dataset is processed in chunks, written into preallocated tensors, so that peak memory scales with the
+        chunk size instead of the dataset size. If chunk_size is None, it is derived from memory_budget (in bytes), the
+        approximate amount of memory that a single forward pass of the HL model may use.
+        If compact is True, returns a CompactTracrEncodedDataset, which stores token ids and class indices instead of
+        int64 inputs and one-hot targets."""
+        if chunk_size is None:
+            chunk_size = self.get_encoding_chunk_size(memory_budget)
+
+        n_samples = len(self.inputs)
+        seq_len = max([len(input) for input in self.inputs], default=0)
+
+        if compact:
+            encoded_inputs = t.empty((n_samples, seq_len), dtype=get_smallest_int_dtype(self.hl_model.cfg.d_vocab - 1))
+        else:
+            encoded_inputs = t.empty((n_samples, seq_len), dtype=t.long)
+
+        for start in range(0, n_samples, chunk_size):
+            end = min(start + chunk_size, n_samples)
+            chunk_inputs = self.hl_model.map_tracr_input_to_tl_input(self.inputs[start:end])
+            if chunk_inputs.shape[1] < seq_len:
+                # a chunk may have shorter sequences than the whole dataset, so we pad the rest explicitly
+                chunk_inputs = t.nn.functional.pad(chunk_inputs, (0, seq_len - chunk_inputs.shape[1]),
+                                                   value=self.get_pad_token_id())
+            encoded_inputs[start:end] = chunk_inputs
+
+        return label_encoded_inputs(self.hl_model, encoded_inputs, chunk_size=chunk_size, compact=compact)
+
+    def get_pad_token_id(self) -> int:
+        input_encoder = self.hl_model.tracr_input_encoder
+        return input_encoder.encoding_map[input_encoder.pad_token]
+
+    def get_encoding_chunk_size(self, memory_budget: int) -> int:
+        """Returns the number of samples of this dataset that can be run through the HL model at once within
+        memory_budget bytes (see get_encoding_chunk_size)."""
+        return get_encoding_chunk_size(self.hl_model,
+                                       max([len(input) for input in self.inputs], default=1),
+                                       memory_budget)
+
+
+def get_encoding_chunk_size(hl_model: "HookedTracrTransformer", seq_len: int, memory_budget: int) -> int:
+    """Returns the number of samples of seq_len positions that can be run through the HL model at once within
+    memory_budget bytes. The estimate counts the residual stream, the attention patterns of one layer, the MLP hidden
+    activations, and the logits, for every position of a sample."""
+    cfg = hl_model.cfg
+    bytes_per_element = t.finfo(cfg.dtype).bits // 8 if cfg.dtype.is_floating_point else 4
+
+    elements_per_position = (4 * cfg.d_model + cfg.n_heads * (3 * cfg.d_head + 2 * seq_len) +
+                             (cfg.d_mlp or 0) + cfg.d_vocab_out)
+    bytes_per_sample = bytes_per_element * max(seq_len, 1) * elements_per_position
+
+    return max(1, memory_budget // bytes_per_sample)
+
+
+def label_encoded_inputs(hl_model: "HookedTracrTransformer",
+                         encoded_inputs: Tensor,
+                         chunk_size: int | None = None,
+                         memory_budget: int = DEFAULT_ENCODING_MEMORY_BUDGET,
+                         compact: bool = False) -> TracrEncodedDataset | CompactTracrEncodedDataset:
+    """Computes the HL model outputs for already encoded inputs, in chunks (see TracrDataset.get_encoded_dataset), and
+    returns them along with the inputs as an encoded dataset. If compact is True, the inputs are expected to be compact
+    already."""
+    if chunk_size is None:
+        chunk_size = get_encoding_chunk_size(hl_model, encoded_inputs.shape[1], memory_budget)
+
+    n_samples, seq_len = encoded_inputs.shape
+    is_categorical = hl_model.is_categorical()
+    d_vocab_out = hl_model.cfg.d_vocab_out
+
+    if compact and is_categorical:
+        # class indices only
+        encoded_outputs = t.empty((n_samples, seq_len),
+                                  dtype=get_smallest_int_dtype(d_vocab_out - 1),
+                                  device=hl_model.device)
+    else:
+        # categorical outputs are stored as float one-hot vectors, numerical ones keep the dtype of the model
+        encoded_outputs = t.empty((n_samples, seq_len, d_vocab_out),
+                                  dtype=t.float32 if is_categorical else hl_model.cfg.dtype,
+                                  device=hl_model.device)
+
+    for start in range(0, n_samples, chunk_size):
+        end = min(start + chunk_size, n_samples)
+
         with t.no_grad():
-            encoded_outputs = self.hl_model(encoded_inputs)
-            if self.hl_model.is_categorical():
+            chunk_outputs = hl_model(encoded_inputs[start:end].long())
+            if is_categorical:
                 # take argmax
-                argmax_encoded_outputs = t.argmax(encoded_outputs, dim=-1)
+                argmax_encoded_outputs = t.argmax(chunk_outputs, dim=-1)
                 argmax_encoded_outputs[:, 0] = 0  # to make sure that the bos token return redundant information
-                # make one-hot
-                encoded_outputs = t.nn.functional.one_hot(
-                    argmax_encoded_outputs, num_classes=encoded_outputs.shape[-1]
-                ).float()
+                if compact:
+                    chunk_outputs = argmax_encoded_outputs
+                else:
+                    # make one-hot
+                    chunk_outputs = t.nn.functional.one_hot(
+                        argmax_encoded_outputs, num_classes=chunk_outputs.shape[-1]
+                    ).float()
+
+        encoded_outputs[start:end] = chunk_outputs
+
+    if compact:
+        return CompactTracrEncodedDataset(encoded_inputs, encoded_outputs,
+                                          num_classes=d_vocab_out if is_categorical else None)
 
-        return TracrEncodedDataset(encoded_inputs, encoded_outputs)
+    return TracrEncodedDataset(encoded_inputs, encoded_outputs)
@@ -0,0 +1,80 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Any
+
+import numpy as np
+import torch as t
+
+from circuits_benchmark.benchmark.tracr_compilation_cache import build_tracr_cache_key
+from circuits_benchmark.benchmark.tracr_encoded_dataset import CompactTracrEncodedDataset
+from circuits_benchmark.utils.project_paths import get_default_cache_dir
+
+# Bump this number whenever the way datasets are generated or stored changes, so that stale entries are ignored.
+DATASET_CACHE_VERSION = 3
+
+
+def get_dataset_cache_dir() -> str:
+    """Returns the directory where encoded datasets are stored."""
+    return os.path.join(get_default_cache_dir(), "datasets")
+
+
+def build_dataset_cache_key(case: "TracrBenchmarkCase", sampling_settings: Dict[str, Any]) -> str:
+    """Returns a content-addressed key for a dataset of a case. The key is a hash of the program source and vocab of
+    the case (see build_tracr_cache_key), and of the settings used to sample the data (seed, number of samples, sequence
+    lengths, etc.)."""
+    settings = dict(kind="dataset", version=DATASET_CACHE_VERSION, max_seq_len=case.get_max_seq_len())
+    settings.update({f"sampling_{name}": value for name, value in sampling_settings.items()})
+    return build_tracr_cache_key(case, settings)
+
+
+def load_cached_encoded_dataset(key: str,
+                                targets_device: str | t.device = t.device("cpu"),
+                                cache_dir: str | None = None) -> CompactTracrEncodedDataset | None:
+    """Loads a compact encoded dataset from the cache. Returns None if it is not cached or can not be loaded.
+    Arrays are memory-mapped (copy-on-write), so on CPU their contents are only read from disk when accessed.
+    Inputs stay on the CPU and targets are moved to targets_device, the same layout as the one of freshly encoded
+    datasets (see TracrDataset.get_encoded_dataset)."""
+    if cache_dir is None:
+        cache_dir = get_dataset_cache_dir()
+
+    entry_dir = os.path.join(cache_dir, key)
+    if not os.path.exists(entry_dir):
+        return None
+
+    try:
+        inputs = t.from_numpy(np.load(os.path.join(entry_dir, "inputs.npy"), mmap_mode="c"))
+        targets = t.from_numpy(np.load(os.path.join(entry_dir, "targets.npy"), mmap_mode="c"))
+        with open(os.path.join(entry_dir, "metadata.json"), "r") as f:
+            metadata = json.load(f)
+        return CompactTracrEncodedDataset(inputs, targets.to(targets_device), num_classes=metadata["num_classes"])
+    except Exception as e:
+        print(f"Ignoring unreadable dataset cache entry {key}: {e}")
+        return None
+
+
+def save_encoded_dataset(key: str, dataset: CompactTracrEncodedDataset, cache_dir: str | None = None) -> None:
+    """Stores a compact encoded dataset in the cache, as one .npy file for the token ids, another one for the targets,
+    and a JSON file with the number of classes. Failing to store it is not an error, we just don't cache it."""
+    if cache_dir is None:
+        cache_dir = get_dataset_cache_dir()
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # write to a temporary directory first, so that concurrent processes never read a partially written entry
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, suffix=".tmp")
+    try:
+        # store the compact tensors as they are, without expanding them
+        np.save(os.path.join(tmp_dir, "inputs.npy"), dataset.inputs.detach().cpu().numpy())
+        np.save(os.path.join(tmp_dir, "targets.npy"), dataset.targets.detach().cpu().numpy())
+        with open(os.path.join(tmp_dir, "metadata.json"), "w") as f:
+            json.dump(dict(num_classes=dataset.num_classes), f)
+        os.replace(tmp_dir, os.path.join(cache_dir, key))
+    except Exception as e:
+        # another process may have stored the same entry in the meantime
+        if not os.path.exists(os.path.join(cache_dir, key)):
+            print(f"Unable to store dataset cache entry {key}: {e}")
+    finally:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
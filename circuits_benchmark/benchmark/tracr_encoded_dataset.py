@@ -1,6 +1,8 @@
+from typing import Tuple
+
 import torch as t
 from torch import Tensor
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Sampler
 
 from circuits_benchmark.benchmark.case_dataset import CaseDataset
 
@@ -30,17 +32,155 @@ class TracrEncodedDataset(CaseDataset):
         targets = t.stack([x[1] for x in batch])
         return inputs.to(device=device), targets.to(device=device)
 
+    def to(self, device: str | t.device) -> "TracrEncodedDataset":
+        """Returns the same dataset with its tensors on device."""
+        return TracrEncodedDataset(self.inputs.to(device), self.targets.to(device))
+
+    def select(self, indices: Tensor) -> "TracrEncodedDataset":
+        """Returns a dataset with the samples at indices, in that order."""
+        return TracrEncodedDataset(self.inputs[indices.to(self.inputs.device)],
+                                   self.targets[indices.to(self.targets.device)])
+
     def make_loader(
         self,
         batch_size: int | None = None,
         shuffle: bool | None = False,
         device: str | t.device = t.device("cuda") if t.cuda.is_available() else t.device("cpu"),
         num_workers: int = 0,
+        device_resident: bool = False,
+        pin_memory: bool | None = None,
     ) -> DataLoader:
+        """Returns a loader that indexes whole batches directly out of the dataset tensors: a slice of consecutive
+        samples, or a block of a random permutation if shuffle is True. If batch_size is None, samples are not batched.
+
+        If device_resident is True, the whole dataset is moved to device once, and batches are indexed there. Otherwise,
+        each batch is moved to device after indexing it, through pinned memory if pin_memory is True (by default, when
+        device is a CUDA device and there are no worker processes). Batches are pinned by the collate function, which
+        runs in the worker processes if num_workers > 0, so pinned loaders can not use them."""
+        device = t.device(device)
+        dataset = self
+        if device_resident:
+            assert num_workers == 0, "Device-resident loaders can not use worker processes"
+            dataset = self.to(device)
+
+        if pin_memory is None:
+            pin_memory = not device_resident and device.type == "cuda" and num_workers == 0
+        assert not pin_memory or num_workers == 0, "Pinned loaders can not use worker processes"
+
         return DataLoader(
-            self,
-            batch_size=batch_size,
-            shuffle=shuffle,
+            dataset,
+            sampler=BlockSampler(len(self), batch_size, shuffle),
+            batch_size=None,
             num_workers=num_workers,
-            collate_fn=lambda x: self.collate_fn(x, device=device),
+            collate_fn=lambda batch: move_batch_to_device(batch, device, pin_memory),
         )
+
+
+class BlockSampler(Sampler):
+    """Yields the index of each batch of a dataset: a slice of consecutive samples, or a tensor with a block of a random
+    permutation if shuffle is True. If batch_size is None, yields the index of each sample instead."""
+
+    def __init__(self, n_samples: int, batch_size: int | None, shuffle: bool | None = False):
+        self.n_samples = n_samples
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __len__(self):
+        if self.batch_size is None:
+            return self.n_samples
+
+        return (self.n_samples + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        if self.batch_size is None:
+            indices = t.randperm(self.n_samples) if self.shuffle else t.arange(self.n_samples)
+            yield from indices.tolist()
+            return
+
+        permutation = t.randperm(self.n_samples) if self.shuffle else None
+        for start in range(0, self.n_samples, self.batch_size):
+            end = min(start + self.batch_size, self.n_samples)
+            yield slice(start, end) if permutation is None else permutation[start:end]
+
+
+def move_batch_to_device(batch: Tuple[Tensor, Tensor],
+                         device: t.device,
+                         pin_memory: bool = False) -> Tuple[Tensor, Tensor]:
+    """Moves the inputs and targets of a batch to device. With pin_memory, CPU tensors are first copied to pinned
+    memory, so that the copy to the device is asynchronous."""
+    if pin_memory:
+        batch = tuple(x.pin_memory() if x.device.type == "cpu" else x for x in batch)
+
+    return tuple(x.to(device=device, non_blocking=pin_memory) for x in batch)
+
+
+class CompactTracrEncodedDataset(TracrEncodedDataset):
+    """Same as TracrEncodedDataset, but storing the inputs as token ids of the smallest integer dtype that fits the
+    vocab, and the targets of categorical cases as class indices instead of one-hot vectors. Inputs are converted back
+    to int64 and targets to one-hot float vectors when accessed, so items and batches are identical to the ones of the
+    equivalent TracrEncodedDataset. Numerical targets are stored as they are.
+
+    Since the loader indexes whole batches, each batch is expanded at once after gathering it from the compact
+    tensors."""
+
+    def __init__(self, inputs: Tensor, targets: Tensor, num_classes: int | None = None):
+        """If num_classes is None, targets are numerical. Otherwise, they are class indices in [0, num_classes)."""
+        super().__init__(inputs, targets)
+        self.num_classes = num_classes
+
+    @staticmethod
+    def from_encoded_dataset(dataset: TracrEncodedDataset, is_categorical: bool) -> "CompactTracrEncodedDataset":
+        """Builds a compact dataset from an encoded one. Categorical targets must be one-hot vectors."""
+        inputs = dataset.get_inputs()
+        targets = dataset.get_targets()
+
+        compact_inputs = inputs.to(get_smallest_int_dtype(int(inputs.max()) if inputs.numel() > 0 else 0))
+        if not is_categorical:
+            return CompactTracrEncodedDataset(compact_inputs, targets)
+
+        num_classes = targets.shape[-1]
+        return CompactTracrEncodedDataset(compact_inputs,
+                                          targets.argmax(dim=-1).to(get_smallest_int_dtype(num_classes - 1)),
+                                          num_classes)
+
+    def is_categorical(self) -> bool:
+        return self.num_classes is not None
+
+    def __getitem__(self, idx):
+        return self.expand_inputs(self.inputs[idx]), self.expand_targets(self.targets[idx])
+
+    def get_inputs(self):
+        return self.expand_inputs(self.inputs)
+
+    def get_targets(self):
+        return self.expand_targets(self.targets)
+
+    def expand_inputs(self, inputs: Tensor) -> Tensor:
+        return inputs.long()
+
+    def expand_targets(self, targets: Tensor) -> Tensor:
+        if not self.is_categorical():
+            return targets
+
+        return t.nn.functional.one_hot(targets.long(), num_classes=self.num_classes).float()
+
+    def to_encoded_dataset(self) -> TracrEncodedDataset:
+        """Returns the equivalent (non-compact) encoded dataset."""
+        return TracrEncodedDataset(self.get_inputs(), self.get_targets())
+
+    def to(self, device: str | t.device) -> "CompactTracrEncodedDataset":
+        return CompactTracrEncodedDataset(self.inputs.to(device), self.targets.to(device), self.num_classes)
+
+    def select(self, indices: Tensor) -> "CompactTracrEncodedDataset":
+        return CompactTracrEncodedDataset(self.inputs[indices.to(self.inputs.device)],
+                                          self.targets[indices.to(self.targets.device)],
+                                          self.num_classes)
+
+
+def get_smallest_int_dtype(max_value: int) -> t.dtype:
+    """Returns the smallest integer dtype that can hold values in [0, max_value]."""
+    for dtype in [t.uint8, t.int16, t.int32]:
+        if max_value <= t.iinfo(dtype).max:
+            return dtype
+
+    return t.int64
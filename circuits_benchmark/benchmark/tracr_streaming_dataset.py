@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import importlib
+import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from typing import Iterator, Tuple, List
+
+import numpy as np
+import torch as t
+from torch import Tensor
+from torch.utils.data import IterableDataset, DataLoader, get_worker_info
+
+from circuits_benchmark.benchmark.tracr_dataset import TracrDataset, TracrBatchInput
+from circuits_benchmark.benchmark.tracr_encoded_dataset import TracrEncodedDataset, move_batch_to_device
+
+DEFAULT_SHARD_SIZE = 10_000
+
+
+def get_shard_seed(seed: int, shard_index: int) -> int:
+    """Returns the seed for sampling a shard of a dataset. Seeds are derived from both the base seed and the shard
+    index, so that shards of datasets with different base seeds (e.g., clean and corrupted data) never share a seed."""
+    return int(np.random.SeedSequence((seed, shard_index)).generate_state(1)[0])
+
+
+@contextmanager
+def preserved_rngs():
+    """Restores the states of the python, numpy and torch random number generators on exit."""
+    python_state = random.getstate()
+    numpy_state = np.random.get_state()
+    torch_state = t.random.get_rng_state()
+    try:
+        yield
+    finally:
+        random.setstate(python_state)
+        np.random.set_state(numpy_state)
+        t.random.set_rng_state(torch_state)
+
+
+@contextmanager
+def seeded_rngs(seed: int):
+    """Seeds the python, numpy and torch random number generators, and restores their previous states on exit."""
+    with preserved_rngs():
+        random.seed(seed)
+        np.random.seed(seed)
+        t.random.manual_seed(seed)
+        yield
+
+
+def get_shard_sizes(n_samples: int, shard_size: int) -> List[int]:
+    """Returns the number of samples of each shard. All shards have shard_size samples, except maybe the last one."""
+    return [min(shard_size, n_samples - start) for start in range(0, n_samples, shard_size)]
+
+
+def sample_shard(case: "TracrBenchmarkCase",
+                 n_samples: int,
+                 min_seq_len: int,
+                 max_seq_len: int,
+                 seed: int,
+                 shard_index: int) -> (TracrBatchInput, TracrBatchInput):
+    """Samples the inputs and outputs of a shard. The samples only depend on the seed and the shard index. Some cases
+    return their samples grouped by output (e.g., the ones using sample_constrained_data), so the shard is permuted with
+    the same seed."""
+    with seeded_rngs(get_shard_seed(seed, shard_index)):
+        inputs, outputs = case.sample_data(n_samples, min_seq_len, max_seq_len)
+        permutation = np.random.permutation(len(inputs))
+        return [inputs[i] for i in permutation], [outputs[i] for i in permutation]
+
+
+_worker_case: "TracrBenchmarkCase | None" = None
+
+
+def _init_shard_worker(case_module: str, case_class_name: str):
+    global _worker_case
+    _worker_case = getattr(importlib.import_module(case_module), case_class_name)()
+
+
+def _sample_shard_in_worker(args: Tuple[int, int, int, int, int]):
+    return sample_shard(_worker_case, *args)
+
+
+def sample_data_in_shards(case: "TracrBenchmarkCase",
+                          n_samples: int,
+                          min_seq_len: int,
+                          max_seq_len: int,
+                          seed: int,
+                          shard_size: int = DEFAULT_SHARD_SIZE,
+                          n_workers: int = 1) -> (TracrBatchInput, TracrBatchInput):
+    """Samples n_samples inputs and outputs for the case, split in shards of shard_size samples. If n_workers > 1, the
+    shards are sampled in a pool of processes, each one with its own instance of the case. Since each shard is seeded
+    from the base seed and its index (see get_shard_seed), and shards are concatenated in order, the result is the same
+    for any number of workers."""
+    shard_args = [(shard_n_samples, min_seq_len, max_seq_len, seed, shard_index)
+                  for shard_index, shard_n_samples in enumerate(get_shard_sizes(n_samples, shard_size))]
+
+    if n_workers <= 1 or len(shard_args) <= 1:
+        shards = [sample_shard(case, *args) for args in shard_args]
+    else:
+        # spawn fresh processes, since forking a process that already initialized torch (or CUDA) is not safe
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(shard_args)),
+                                 mp_context=get_context("spawn"),
+                                 initializer=_init_shard_worker,
+                                 initargs=(type(case).__module__, type(case).__name__)) as executor:
+            shards = list(executor.map(_sample_shard_in_worker, shard_args))
+
+    inputs = [input for shard_inputs, _ in shards for input in shard_inputs]
+    outputs = [output for _, shard_outputs in shards for output in shard_outputs]
+    return inputs, outputs
+
+
+class TracrStreamingDataset(IterableDataset):
+    """Dataset of n_samples random samples of a Tracr benchmark case, generated and labelled on the fly in shards of
+    shard_size samples, instead of materializing all of them at once. Each shard is sampled with its own seed (see
+    get_shard_seed), so the dataset always yields the same samples, and only one shard per worker is held in memory at
+    any time. Items are the same as the ones of a TracrEncodedDataset."""
+
+    def __init__(self,
+                 case: "TracrBenchmarkCase",
+                 n_samples: int,
+                 seed: int = 42,
+                 shard_size: int = DEFAULT_SHARD_SIZE,
+                 variable_length_seqs: bool = False,
+                 compact: bool = False):
+        assert n_samples > 0 and shard_size > 0, "n_samples and shard_size must be positive"
+        self.case = case
+        self.n_samples = n_samples
+        self.seed = seed
+        self.shard_size = shard_size
+        self.compact = compact
+
+        self.max_seq_len = case.get_max_seq_len()
+        self.min_seq_len = case.get_min_seq_len() if variable_length_seqs else self.max_seq_len
+
+    def __len__(self):
+        return self.n_samples
+
+    def get_n_shards(self) -> int:
+        return (self.n_samples + self.shard_size - 1) // self.shard_size
+
+    def get_shard(self, shard_index: int) -> TracrEncodedDataset:
+        """Samples, labels and encodes the samples of a shard. The last shard may be smaller than shard_size."""
+        assert 0 <= shard_index < self.get_n_shards(), f"Invalid shard index {shard_index}"
+        n_samples = min(self.shard_size, self.n_samples - shard_index * self.shard_size)
+        inputs, outputs = sample_shard(self.case, n_samples, self.min_seq_len, self.max_seq_len, self.seed, shard_index)
+
+        return TracrDataset(inputs, outputs, self.case.get_hl_model()).get_encoded_dataset(compact=self.compact)
+
+    def get_shard_indices(self) -> range:
+        """Returns the indices of the shards to be generated by the current worker (all of them in the main process)."""
+        worker_info = get_worker_info()
+        if worker_info is None:
+            return range(self.get_n_shards())
+
+        return range(worker_info.id, self.get_n_shards(), worker_info.num_workers)
+
+    def __iter__(self) -> Iterator[Tuple[Tensor, Tensor]]:
+        for shard_index in self.get_shard_indices():
+            shard = self.get_shard(shard_index)
+            for i in range(len(shard)):
+                yield shard[i]
+
+    def make_loader(
+        self,
+        batch_size: int | None = None,
+        shuffle: bool | None = False,
+        device: str | t.device = t.device("cuda") if t.cuda.is_available() else t.device("cpu"),
+        num_workers: int = 0,
+    ) -> DataLoader:
+        """Returns a loader over the streamed samples. If batch_size is None, samples are not batched. Each shard is
+        sampled and permuted with its own seed, so the order of the samples is fixed and shuffle=True raises a
+        ValueError."""
+        if shuffle:
+            raise ValueError("Streaming datasets can not be shuffled, the order of their samples is fixed by the seed")
+
+        if batch_size is None:
+            collate_fn = lambda x: move_batch_to_device(x, t.device(device))
+        else:
+            collate_fn = lambda x: TracrEncodedDataset.collate_fn(x, device=device)
+
+        return DataLoader(self, batch_size=batch_size, num_workers=num_workers, collate_fn=collate_fn)
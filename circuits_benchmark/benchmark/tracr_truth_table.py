@@ -0,0 +1,171 @@
+import os
+import tempfile
+from typing import Any, List, Sequence
+
+import numpy as np
+
+from circuits_benchmark.benchmark.rasp_batch_evaluator import encode_values, as_object_array
+from circuits_benchmark.benchmark.tracr_compilation_cache import build_tracr_cache_key
+from circuits_benchmark.benchmark.vocabs import TRACR_BOS, TRACR_PAD
+from circuits_benchmark.utils.project_paths import get_default_cache_dir
+
+# Bump this number whenever the layout of the stored truth tables changes, so that stale entries are ignored.
+TRUTH_TABLE_VERSION = 1
+
+# Maximum number of input sequences for which we build a truth table.
+MAX_TRUTH_TABLE_SIZE = 100_000
+
+# Minimum number of inputs to label, as a fraction of the truth table size, for building the truth table to label them.
+# Smaller batches are labelled directly, since building the table would cost more than labelling them.
+MIN_TRUTH_TABLE_USAGE = 0.1
+
+
+def get_truth_tables_dir() -> str:
+    """Returns the directory where truth tables are stored."""
+    return os.path.join(get_default_cache_dir(), "truth_tables")
+
+
+def get_truth_table_size(vocab_size: int, max_seq_len: int) -> int:
+    """Returns the number of input sequences (without BOS) of length 1 to max_seq_len - 1 for the given vocab size."""
+    return sum(vocab_size ** seq_len for seq_len in range(1, max_seq_len))
+
+
+class TruthTable(object):
+    """Maps every input of a case (of up to max_seq_len tokens, including BOS) to its correct output.
+
+    Input sequences are identified by an integer index: sequences are ordered by length, and sequences of the same
+    length by the value of their tokens read as a number in base len(vocab), with vocab sorted. This is the same order
+    used by TracrBenchmarkCase.gen_all_inputs, so the table can be built directly from gen_all_data.
+
+    Outputs are stored as an integer array of shape (n_inputs, max_seq_len - 1), where each element is an index into
+    output_values (the distinct values appearing in the outputs, including PAD). Looking up the outputs of a batch of
+    inputs is then just a gather.
+    """
+
+    def __init__(self,
+                 vocab: Sequence[Any],
+                 max_seq_len: int,
+                 output_codes: np.ndarray,
+                 output_values: List[Any]):
+        self.vocab = list(vocab)
+        self.max_seq_len = max_seq_len
+        self.output_codes = output_codes
+        self.output_values = as_object_array(output_values)
+
+        self.base = len(self.vocab)
+        self.code_by_token = {token: code for code, token in enumerate(self.vocab)}
+
+        # offsets[n] is the index of the first sequence with n tokens
+        counts = [0] + [self.base ** seq_len for seq_len in range(1, max_seq_len)]
+        self.offsets = np.cumsum(counts, dtype=np.int64) - np.array(counts, dtype=np.int64)
+        assert self.output_codes.shape == (int(sum(counts)), max_seq_len - 1)
+
+    @staticmethod
+    def from_outputs(vocab: Sequence[Any], max_seq_len: int, outputs: Sequence[Sequence[Any]]) -> "TruthTable":
+        """Builds a truth table from the outputs (with BOS and PAD) of all the inputs, in the gen_all_inputs order."""
+        flat_values = [value for output in outputs for value in output[1:]]
+        flat_codes, output_values = encode_values(flat_values)
+
+        dtype = np.min_scalar_type(max(len(output_values) - 1, 0))
+        output_codes = flat_codes.astype(dtype).reshape(len(outputs), max_seq_len - 1)
+
+        return TruthTable(vocab, max_seq_len, output_codes, output_values)
+
+    def get_indices(self, lengths: np.ndarray, token_codes: np.ndarray) -> np.ndarray:
+        """Returns the index of each input, given the number of tokens (without BOS) of each input and the codes of its
+        tokens, as an integer array of shape (n_inputs, positions). Codes beyond the length of each input are
+        ignored."""
+        positions = np.arange(token_codes.shape[1])
+        exponents = lengths[:, None] - 1 - positions[None, :]
+        weights = np.where(exponents >= 0, np.power(self.base, np.maximum(exponents, 0), dtype=np.int64), 0)
+
+        return self.offsets[lengths] + (token_codes.astype(np.int64) * weights).sum(axis=1)
+
+    def encode_inputs(self, inputs: Sequence[Sequence[Any]]) -> np.ndarray | None:
+        """Returns the index of each input (with BOS and PAD), or None if any of them is not covered by this table."""
+        lengths = np.zeros(len(inputs), dtype=np.int64)
+        token_codes = np.zeros((len(inputs), self.max_seq_len - 1), dtype=np.int64)
+
+        for i, input in enumerate(inputs):
+            if len(input) == 0 or len(input) > self.max_seq_len or input[0] != TRACR_BOS:
+                return None
+
+            sample = input[1:]
+            seq_len = len(sample)
+            while seq_len > 0 and sample[seq_len - 1] == TRACR_PAD:
+                seq_len -= 1
+
+            if seq_len == 0 or seq_len >= self.max_seq_len:
+                return None
+
+            for j in range(seq_len):
+                code = self.code_by_token.get(sample[j])
+                if code is None:
+                    return None
+                token_codes[i, j] = code
+
+            lengths[i] = seq_len
+
+        return self.get_indices(lengths, token_codes)
+
+    def lookup(self, indices: np.ndarray, max_seq_len: int) -> List[List[Any]]:
+        """Returns the outputs (with BOS and PAD) of the inputs with the given indices, padded to max_seq_len."""
+        values = self.output_values[self.output_codes[indices, :max_seq_len - 1]]
+        return [[TRACR_BOS] + row for row in values.tolist()]
+
+    def save(self, path: str) -> None:
+        """Stores the truth table in a .npz file. The file is written atomically, so that concurrent processes never
+        read a partially written table."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp.npz")
+        os.close(fd)
+        try:
+            np.savez(tmp_path,
+                     vocab=as_object_array(self.vocab),
+                     max_seq_len=self.max_seq_len,
+                     output_codes=self.output_codes,
+                     output_values=self.output_values)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Unable to store truth table {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def load(path: str) -> "TruthTable":
+        with np.load(path, allow_pickle=True) as data:
+            return TruthTable(data["vocab"].tolist(),
+                              int(data["max_seq_len"]),
+                              data["output_codes"],
+                              data["output_values"].tolist())
+
+
+def load_or_build_truth_table(case: "TracrBenchmarkCase", tables_dir: str | None = None) -> TruthTable | None:
+    """Returns the truth table for a case, building it (and storing it on disk) the first time. Returns None if the
+    input space of the case is larger than MAX_TRUTH_TABLE_SIZE."""
+    vocab = sorted(list(case.get_vocab()))
+    max_seq_len = case.get_max_seq_len()
+    if get_truth_table_size(len(vocab), max_seq_len) > MAX_TRUTH_TABLE_SIZE:
+        return None
+
+    if tables_dir is None:
+        tables_dir = get_truth_tables_dir()
+
+    settings = dict(kind="truth_table",
+                    version=TRUTH_TABLE_VERSION,
+                    max_seq_len=max_seq_len,
+                    label_with_hl_model=case.label_with_hl_model())
+    path = os.path.join(tables_dir, f"{build_tracr_cache_key(case, settings)}.npz")
+
+    if os.path.exists(path):
+        try:
+            return TruthTable.load(path)
+        except Exception as e:
+            print(f"Ignoring unreadable truth table {path}: {e}")
+
+    inputs = case.gen_all_inputs(2, max_seq_len).tolist()
+    outputs = case.compute_correct_outputs_for_inputs(inputs)
+    truth_table = TruthTable.from_outputs(vocab, max_seq_len, outputs)
+    truth_table.save(path)
+
+    return truth_table
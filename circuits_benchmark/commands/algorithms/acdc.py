@@ -67,8 +67,7 @@ class ACDCRunner:
             param.requires_grad = False
 
         # prepare data
-        clean_dataset = self.case.get_clean_data(max_samples=self.config.data_size)
-        corrupted_dataset = self.case.get_corrupted_data(max_samples=self.config.data_size)
+        clean_dataset, corrupted_dataset = self.case.get_clean_and_corrupted_data(max_samples=self.config.data_size)
 
         clean_outputs = clean_dataset.get_targets()
         corrupted_outputs = corrupted_dataset.get_targets()
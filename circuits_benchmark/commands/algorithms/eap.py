@@ -99,8 +99,7 @@ class EAPRunner:
             use_pos_embed=self.config.use_pos_embed
         )
 
-        clean_dataset = self.case.get_clean_data(max_samples=self.config.data_size)
-        corrupted_dataset = self.case.get_corrupted_data(max_samples=self.config.data_size)
+        clean_dataset, corrupted_dataset = self.case.get_clean_and_corrupted_data(max_samples=self.config.data_size)
 
         clean_outputs = clean_dataset.get_targets()
         corrupted_outputs = corrupted_dataset.get_targets()
@@ -1,23 +1,25 @@
 import traceback
 
-from circuits_benchmark.commands.algorithms import acdc, legacy_acdc, eap, sp
+from circuits_benchmark.commands.lazy_subparsers import LazyArgumentParser, add_lazy_subparser
 from circuits_benchmark.utils.get_cases import get_cases
 from circuits_benchmark.utils.ll_model_loader.ll_model_loader_factory import get_ll_model_loader_from_args
 
 
 def setup_args_parser(subparsers):
     run_parser = subparsers.add_parser("run")
-    run_subparsers = run_parser.add_subparsers(dest="algorithm")
+    run_subparsers = run_parser.add_subparsers(dest="algorithm", parser_class=LazyArgumentParser)
     run_subparsers.required = True
 
-    # Setup arguments for each algorithm
-    legacy_acdc.LegacyACDCRunner.setup_subparser(run_subparsers)
-    acdc.ACDCRunner.setup_subparser(run_subparsers)
-    sp.SPRunner.setup_subparser(run_subparsers)
-    eap.EAPRunner.setup_subparser(run_subparsers)
+    # Setup arguments for each algorithm. Algorithm modules are only imported when the algorithm is selected.
+    add_lazy_subparser(run_subparsers, "legacy_acdc",
+                       "circuits_benchmark.commands.algorithms.legacy_acdc:LegacyACDCRunner.setup_subparser")
+    add_lazy_subparser(run_subparsers, "acdc", "circuits_benchmark.commands.algorithms.acdc:ACDCRunner.setup_subparser")
+    add_lazy_subparser(run_subparsers, "sp", "circuits_benchmark.commands.algorithms.sp:SPRunner.setup_subparser")
+    add_lazy_subparser(run_subparsers, "eap", "circuits_benchmark.commands.algorithms.eap:EAPRunner.setup_subparser")
 
 
 def run(args):
+    # algorithm modules are imported here, so that we only import the one that is selected
     for case in get_cases(args):
         print(f"\nRunning {args.algorithm} on {case}")
 
@@ -25,13 +27,17 @@ def run(args):
 
         try:
             if args.algorithm == "legacy_acdc":
-                legacy_acdc.LegacyACDCRunner(case, args=args).run_using_model_loader(ll_model_loader)
+                from circuits_benchmark.commands.algorithms.legacy_acdc import LegacyACDCRunner
+                LegacyACDCRunner(case, args=args).run_using_model_loader(ll_model_loader)
             elif args.algorithm == "acdc":
-                acdc.ACDCRunner(case, args=args).run_using_model_loader(ll_model_loader)
+                from circuits_benchmark.commands.algorithms.acdc import ACDCRunner
+                ACDCRunner(case, args=args).run_using_model_loader(ll_model_loader)
             elif args.algorithm == "sp":
-                sp.SPRunner(case, args=args).run_using_model_loader(ll_model_loader)
+                from circuits_benchmark.commands.algorithms.sp import SPRunner
+                SPRunner(case, args=args).run_using_model_loader(ll_model_loader)
             elif args.algorithm == "eap":
-                eap.EAPRunner(case, args=args).run_using_model_loader(ll_model_loader)
+                from circuits_benchmark.commands.algorithms.eap import EAPRunner
+                EAPRunner(case, args=args).run_using_model_loader(ll_model_loader)
             else:
                 raise ValueError(f"Unknown algorithm: {args.algorithm}")
         except Exception as e:
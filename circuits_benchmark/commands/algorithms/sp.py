@@ -156,8 +156,7 @@ class SPRunner:
         metric_name = self.config.metric
 
         data_size = self.config.data_size
-        clean_data = self.case.get_clean_data(max_samples=int(1.2 * data_size))
-        corrupted_data = self.case.get_corrupted_data(max_samples=int(1.2 * data_size))
+        clean_data, corrupted_data = self.case.get_clean_and_corrupted_data(max_samples=int(1.2 * data_size))
 
         clean_outputs = clean_data.get_targets()
         baseline_output = clean_outputs[:data_size]
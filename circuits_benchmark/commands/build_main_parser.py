@@ -1,20 +1,18 @@
 import argparse
 
-from circuits_benchmark.commands.algorithms import run_algorithm
-from circuits_benchmark.commands.evaluation import evaluation
-from circuits_benchmark.commands.train import train
+from circuits_benchmark.commands.lazy_subparsers import LazyArgumentParser, add_lazy_subparser
 
 
 def build_main_parser():
     # define commands for our main script.
     parser = ArgumentParserWithOriginals()
-    subparsers = parser.add_subparsers(dest="command")
+    subparsers = parser.add_subparsers(dest="command", parser_class=LazyArgumentParser)
     subparsers.required = True
 
-    # Setup command arguments
-    run_algorithm.setup_args_parser(subparsers)
-    train.setup_args_parser(subparsers)
-    evaluation.setup_args_parser(subparsers)
+    # Setup command arguments. Command modules are only imported when their command is selected.
+    add_lazy_subparser(subparsers, "run", "circuits_benchmark.commands.algorithms.run_algorithm:setup_args_parser")
+    add_lazy_subparser(subparsers, "train", "circuits_benchmark.commands.train.train:setup_args_parser")
+    add_lazy_subparser(subparsers, "eval", "circuits_benchmark.commands.evaluation.evaluation:setup_args_parser")
 
     return parser
 
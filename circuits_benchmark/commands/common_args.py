@@ -1,3 +1,5 @@
+from argparse import Namespace
+
 import torch as t
 
 from circuits_benchmark.utils.project_paths import get_default_output_dir
@@ -15,6 +17,23 @@ def add_common_args(parser):
                         help='The seed to use for experiments.')
 
 
+def add_data_generation_args(parser):
+    parser.add_argument("--data-workers", type=int, default=None,
+                        help="Number of processes used to sample the data of Tracr cases, in shards. Sharded data is the "
+                             "same for any number of workers. If not specified, data is sampled sequentially.")
+
+
+def get_data_generation_kwargs(case, args: Namespace) -> dict:
+    """Returns the extra arguments for get_clean_data according to the data generation args, which only apply to Tracr
+    cases."""
+    from circuits_benchmark.benchmark.tracr_benchmark_case import TracrBenchmarkCase
+
+    if not isinstance(case, TracrBenchmarkCase) or args.data_workers is None:
+        return {}
+
+    return dict(n_workers=args.data_workers)
+
+
 def add_evaluation_common_ags(parser):
     parser.add_argument(
         "-w",
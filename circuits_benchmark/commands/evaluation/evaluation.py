@@ -4,20 +4,21 @@ import traceback
 import numpy as np
 import torch as t
 
-from circuits_benchmark.commands.evaluation.iit import iit_eval
-from circuits_benchmark.commands.evaluation.realism import node_wise_ablation, gt_circuit_node_wise_ablation
+from circuits_benchmark.commands.lazy_subparsers import LazyArgumentParser, add_lazy_subparser
 from circuits_benchmark.utils.get_cases import get_cases
 
 
 def setup_args_parser(subparsers):
     run_parser = subparsers.add_parser("eval")
-    run_subparsers = run_parser.add_subparsers(dest="type")
+    run_subparsers = run_parser.add_subparsers(dest="type", parser_class=LazyArgumentParser)
     run_subparsers.required = True
 
-    # Setup arguments for each evaluation type
-    iit_eval.setup_args_parser(run_subparsers)
-    node_wise_ablation.setup_args_parser(run_subparsers)
-    gt_circuit_node_wise_ablation.setup_args_parser(run_subparsers)
+    # Setup arguments for each evaluation type. Evaluation modules are only imported when the type is selected.
+    add_lazy_subparser(run_subparsers, "iit", "circuits_benchmark.commands.evaluation.iit.iit_eval:setup_args_parser")
+    add_lazy_subparser(run_subparsers, "node_realism",
+                       "circuits_benchmark.commands.evaluation.realism.node_wise_ablation:setup_args_parser")
+    add_lazy_subparser(run_subparsers, "gt_node_realism",
+                       "circuits_benchmark.commands.evaluation.realism.gt_circuit_node_wise_ablation:setup_args_parser")
 
 
 def run(args):
@@ -33,12 +34,17 @@ def run(args):
         random.seed(seed)
 
         try:
+            # evaluation modules are imported here, so that we only import the one that is selected
             if evaluation_type == "iit":
-                iit_eval.run_iit_eval(case, args)
+                from circuits_benchmark.commands.evaluation.iit.iit_eval import run_iit_eval
+                run_iit_eval(case, args)
             elif evaluation_type == "node_realism":
-                node_wise_ablation.run_nodewise_ablation(case, args)
+                from circuits_benchmark.commands.evaluation.realism.node_wise_ablation import run_nodewise_ablation
+                run_nodewise_ablation(case, args)
             elif evaluation_type == "gt_node_realism":
-                gt_circuit_node_wise_ablation.run_nodewise_ablation(case, args)
+                from circuits_benchmark.commands.evaluation.realism.gt_circuit_node_wise_ablation import \
+                    run_nodewise_ablation
+                run_nodewise_ablation(case, args)
             else:
                 raise ValueError(f"Unknown evaluation: {evaluation_type}")
         except Exception as e:
@@ -10,7 +10,8 @@ from iit.utils.nodes import LLNode
 from transformer_lens import HookedTransformer
 
 from circuits_benchmark.benchmark.benchmark_case import BenchmarkCase
-from circuits_benchmark.commands.common_args import add_common_args, add_evaluation_common_ags
+from circuits_benchmark.commands.common_args import add_common_args, add_evaluation_common_ags, \
+    add_data_generation_args, get_data_generation_kwargs
 from circuits_benchmark.transformers.hooked_tracr_transformer import HookedTracrTransformer
 from circuits_benchmark.utils.circuit.circuit import Circuit
 from circuits_benchmark.utils.circuit.circuit_eval import build_from_acdc_correspondence
@@ -25,6 +26,7 @@ def setup_args_parser(subparsers):
     parser = subparsers.add_parser("gt_node_realism")
     add_common_args(parser)
     add_evaluation_common_ags(parser)
+    add_data_generation_args(parser)
 
     parser.add_argument(
         "-m",
@@ -121,7 +123,8 @@ def run_nodewise_ablation(case: BenchmarkCase, args: Namespace):
         training_args={},
     )
 
-    unique_dataset = case.get_clean_data(max_samples=args.max_len, unique_data=True)
+    unique_dataset = case.get_clean_data(max_samples=args.max_len, unique_data=True,
+                                         **get_data_generation_kwargs(case, args))
     test_set = IITDataset(unique_dataset, unique_dataset, every_combination=True)
     mean_cache = None
     if use_mean_cache:
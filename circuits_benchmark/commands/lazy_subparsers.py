@@ -0,0 +1,57 @@
+import argparse
+import importlib
+from operator import attrgetter
+
+
+class LazyArgumentParser(argparse.ArgumentParser):
+    """ArgumentParser whose arguments are added by a setup function defined in another module.
+    The module is only imported (and the setup function called) when the parser is actually used, i.e., when its
+    subcommand is selected or its help is printed. This way, building the main parser does not import the heavy
+    modules of every command."""
+
+    def __init__(self, *args, setup_fn_path: str | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setup_fn_path = setup_fn_path
+
+    def ensure_setup(self):
+        """Imports the module of the setup function and calls it, if it was not called already."""
+        if self.setup_fn_path is None:
+            return
+
+        setup_fn_path, self.setup_fn_path = self.setup_fn_path, None
+        module_name, setup_fn_name = setup_fn_path.split(":")
+        setup_fn = attrgetter(setup_fn_name)(importlib.import_module(module_name))
+
+        # setup functions receive a subparsers action and create their own parser, so we hand them this one instead
+        setup_fn(_ExistingParserSubparsers(self))
+
+    def parse_known_args(self, args=None, namespace=None):
+        self.ensure_setup()
+        return super().parse_known_args(args, namespace)
+
+    def format_usage(self):
+        self.ensure_setup()
+        return super().format_usage()
+
+    def format_help(self):
+        self.ensure_setup()
+        return super().format_help()
+
+
+class _ExistingParserSubparsers(object):
+    """Stand-in for the subparsers action passed to setup functions, returning an already created parser."""
+
+    def __init__(self, parser: LazyArgumentParser):
+        self.parser = parser
+
+    def add_parser(self, name: str, **kwargs) -> LazyArgumentParser:
+        assert self.parser.prog.split(" ")[-1] == name, \
+            f"Setup function adds parser {name}, but it was registered as {self.parser.prog}"
+        return self.parser
+
+
+def add_lazy_subparser(subparsers, name: str, setup_fn_path: str) -> LazyArgumentParser:
+    """Registers a subcommand whose arguments are added by the setup function at setup_fn_path (e.g.,
+    "package.module:function" or "package.module:Class.method"), which receives a subparsers action and calls
+    add_parser(name) on it. The subparsers action must have been created with parser_class=LazyArgumentParser."""
+    return subparsers.add_parser(name, setup_fn_path=setup_fn_path)
@@ -11,15 +11,18 @@ import wandb
 from iit.utils.iit_dataset import train_test_split, IITDataset
 
 from circuits_benchmark.benchmark.benchmark_case import BenchmarkCase
-from circuits_benchmark.commands.common_args import add_common_args
+from circuits_benchmark.benchmark.tracr_benchmark_case import TracrBenchmarkCase
+from circuits_benchmark.commands.common_args import add_common_args, add_data_generation_args
 from circuits_benchmark.transformers.hooked_tracr_transformer import HookedTracrTransformer
 from circuits_benchmark.utils.circuit.edges_list import circuit_to_edges_list
 from circuits_benchmark.utils.iit.iit_hl_model import IITHLModel
+from circuits_benchmark.utils.iit.iit_streaming_dataset import IITStreamingDataset
 
 
 def setup_args_parser(subparsers):
     parser = subparsers.add_parser("iit")
     add_common_args(parser)
+    add_data_generation_args(parser)
 
     # IIT training args
     parser.add_argument(
@@ -59,6 +62,10 @@ def setup_args_parser(subparsers):
     parser.add_argument(
         "--num-samples", type=int, default=12000, help="Number of samples"
     )
+    parser.add_argument(
+        "--stream-data", action="store_true",
+        help="Generate the training data of Tracr cases on the fly in shards, instead of all at once"
+    )
     parser.add_argument(
         "--scheduler-val-metric", nargs="+", default=["val/accuracy", "val/IIA", "val/strict_accuracy"],
         help="Scheduler validation metrics"
@@ -285,7 +292,7 @@ def train_model(
 
     ll_model = case.get_ll_model(same_size=args.same_size)
 
-    hl_model = case.get_hl_model()
+    hl_model = case.get_hl_model(device=args.device)
     if isinstance(hl_model, HookedTracrTransformer):
         hl_model = IITHLModel(hl_model, eval_mode=False)
         hl_model.to(args.device)
@@ -300,12 +307,24 @@ def train_model(
     )
 
     # prepare iit datasets for training and testing
-    dataset = case.get_clean_data(min_samples=20000, max_samples=120_000, seed=args.seed)
-    train_dataset, test_dataset = train_test_split(
-        dataset, test_size=0.2, random_state=42
-    )
-    train_dataset = IITDataset(train_dataset, train_dataset, seed=args.seed)
-    test_dataset = IITDataset(test_dataset, test_dataset, seed=args.seed)
+    if isinstance(case, TracrBenchmarkCase) and args.stream_data:
+        # same number of samples and split as below, but base and ablation samples come from independent streams
+        train_dataset = IITStreamingDataset(case.get_streaming_data(96_000, seed=args.seed, compact_dataset=True),
+                                            case.get_streaming_data(96_000, seed=args.seed + 1, compact_dataset=True))
+        test_dataset = IITStreamingDataset(case.get_streaming_data(24_000, seed=args.seed + 2, compact_dataset=True),
+                                           case.get_streaming_data(24_000, seed=args.seed + 3, compact_dataset=True))
+    else:
+        if isinstance(case, TracrBenchmarkCase):
+            # keep the (large) training set as token ids and class indices, batches are expanded on the fly
+            dataset = case.get_clean_data(min_samples=20000, max_samples=120_000, seed=args.seed, compact_dataset=True,
+                                          n_workers=args.data_workers)
+        else:
+            dataset = case.get_clean_data(min_samples=20000, max_samples=120_000, seed=args.seed)
+        train_dataset, test_dataset = train_test_split(
+            dataset, test_size=0.2, random_state=42
+        )
+        train_dataset = IITDataset(train_dataset, train_dataset, seed=args.seed)
+        test_dataset = IITDataset(test_dataset, test_dataset, seed=args.seed)
 
     # train model
     print("Starting IIT training")
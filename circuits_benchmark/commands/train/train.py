@@ -4,23 +4,21 @@ import traceback
 import numpy as np
 import torch as t
 
-from circuits_benchmark.commands.train.compression import linear_compression, \
-    non_linear_compression
-from circuits_benchmark.commands.train.compression.linear_compression import train_linear_compression
-from circuits_benchmark.commands.train.compression.non_linear_compression import train_non_linear_compression
-from circuits_benchmark.commands.train.iit import iit_train
+from circuits_benchmark.commands.lazy_subparsers import LazyArgumentParser, add_lazy_subparser
 from circuits_benchmark.utils.get_cases import get_cases
 
 
 def setup_args_parser(subparsers):
     run_parser = subparsers.add_parser("train")
-    run_subparsers = run_parser.add_subparsers(dest="type")
+    run_subparsers = run_parser.add_subparsers(dest="type", parser_class=LazyArgumentParser)
     run_subparsers.required = True
 
-    # Setup arguments for each algorithm
-    linear_compression.setup_args_parser(run_subparsers)
-    non_linear_compression.setup_args_parser(run_subparsers)
-    iit_train.setup_args_parser(run_subparsers)
+    # Setup arguments for each algorithm. Training modules are only imported when the training type is selected.
+    add_lazy_subparser(run_subparsers, "linear-compression",
+                       "circuits_benchmark.commands.train.compression.linear_compression:setup_args_parser")
+    add_lazy_subparser(run_subparsers, "non-linear-compression",
+                       "circuits_benchmark.commands.train.compression.non_linear_compression:setup_args_parser")
+    add_lazy_subparser(run_subparsers, "iit", "circuits_benchmark.commands.train.iit.iit_train:setup_args_parser")
 
 
 def run(args):
@@ -40,12 +38,17 @@ def run(args):
         random.seed(seed)
 
         try:
+            # training modules are imported here, so that we only import the one that is selected
             if training_type == "linear-compression":
+                from circuits_benchmark.commands.train.compression.linear_compression import train_linear_compression
                 train_linear_compression(case, args)
             elif training_type == "non-linear-compression":
+                from circuits_benchmark.commands.train.compression.non_linear_compression import \
+                    train_non_linear_compression
                 train_non_linear_compression(case, args)
             elif training_type == "iit":
-                iit_train.run_iit_train(case, args)
+                from circuits_benchmark.commands.train.iit.iit_train import run_iit_train
+                run_iit_train(case, args)
             else:
                 raise ValueError(f"Unknown training: {training_type}")
         except Exception as e:
@@ -9,6 +9,7 @@ from torch.utils.data import DataLoader
 
 from circuits_benchmark.benchmark.benchmark_case import BenchmarkCase
 from circuits_benchmark.benchmark.case_dataset import CaseDataset
+from circuits_benchmark.benchmark.tracr_streaming_dataset import TracrStreamingDataset
 from circuits_benchmark.training.compression.autencoder import AutoEncoder
 from circuits_benchmark.training.generic_trainer import GenericTrainer
 from circuits_benchmark.training.training_args import TrainingArgs
@@ -38,7 +39,9 @@ class AutoEncoderTrainer(GenericTrainer):
         # We can't always use all the data, since it can lead to memory errors
         input_samples = min(int(self.args.max_train_samples * (1 + self.args.test_data_ratio)),
                             len(self.dataset))
-        train_loader = self.dataset.make_loader(batch_size=input_samples, shuffle=True)
+        # Streaming datasets can not be shuffled, but their shards are already permuted when sampled
+        shuffle = not isinstance(self.dataset, TracrStreamingDataset)
+        train_loader = self.dataset.make_loader(batch_size=input_samples, shuffle=shuffle)
         inputs = next(iter(train_loader))[0]
 
         if self.hook_name_for_input_activations is None:
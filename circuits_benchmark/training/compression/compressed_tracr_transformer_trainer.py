@@ -21,6 +21,8 @@ from circuits_benchmark.training.generic_trainer import GenericTrainer
 from circuits_benchmark.training.training_args import TrainingArgs
 from circuits_benchmark.utils.circuit.circuit_eval import get_full_circuit
 from circuits_benchmark.utils.circuit.circuit_node import CircuitNode
+from circuits_benchmark.utils.iit.iit_dataset_batch import IITDatasetBatch
+from circuits_benchmark.utils.iit.iit_streaming_dataset import IITStreamingDataset
 
 
 class CompressedTracrTransformerTrainer(GenericTrainer):
@@ -42,6 +44,10 @@ class CompressedTracrTransformerTrainer(GenericTrainer):
             self.epochs_since_last_test_resample_ablation_loss = self.args.resample_ablation_loss_epochs_gap
 
     def setup_dataset(self):
+        if self.args.stream_train_data:
+            self.setup_streaming_dataset()
+            return
+
         self.dataset = self.case.get_clean_data(min_samples=self.args.min_train_samples,
                                                 max_samples=self.args.max_train_samples)
         train_dataset, test_dataset = train_test_split(
@@ -53,6 +59,25 @@ class CompressedTracrTransformerTrainer(GenericTrainer):
         self.train_loader = self.train_dataset.make_loader(batch_size=self.args.batch_size, num_workers=0)
         self.test_loader = self.test_dataset.make_loader(batch_size=self.args.batch_size, num_workers=0)
 
+    def setup_streaming_dataset(self):
+        """Same as setup_dataset, but the train and test data are generated on the fly while iterating them. Base and
+        ablation samples are drawn from independent streams, each one with its own seed derived from
+        stream_data_seed."""
+        n_test_samples = int(self.args.max_train_samples * self.args.test_data_ratio)
+        n_train_samples = self.args.max_train_samples - n_test_samples
+
+        def get_streaming_data(n_samples: int, seed: int):
+            return self.case.get_streaming_data(n_samples, seed=seed, shard_size=self.args.train_data_shard_size)
+
+        seed = self.args.stream_data_seed
+        self.dataset = get_streaming_data(n_train_samples, seed=seed)
+        self.train_dataset = IITStreamingDataset(self.dataset, get_streaming_data(n_train_samples, seed=seed + 1))
+        self.test_dataset = IITStreamingDataset(get_streaming_data(n_test_samples, seed=seed + 2),
+                                                get_streaming_data(n_test_samples, seed=seed + 3))
+
+        self.train_loader = self.train_dataset.make_loader(batch_size=self.args.batch_size, num_workers=0)
+        self.test_loader = self.test_dataset.make_loader(batch_size=self.args.batch_size, num_workers=0)
+
     def get_original_model(self) -> LLModel:
         raise NotImplementedError
 
@@ -90,10 +115,12 @@ class CompressedTracrTransformerTrainer(GenericTrainer):
         if not self.is_categorical:
             self.test_metrics["test_mse"] = t.nn.functional.mse_loss(predictions, targets).item()
 
-        # measure the effect of each node on the compressed model's output
+        # measure the effect of each node on the compressed model's output, using the same test batch for both models.
+        # The batch is loaded only once, since streaming test data is generated again every time it is iterated.
+        node_effect_batch = next(iter(self.test_dataset.make_loader(batch_size=len(self.test_dataset), num_workers=0)))
         compressed_model_node_effect_results = self.evaluate_node_effect(
             self.get_compressed_model(),
-            self.test_dataset
+            node_effect_batch
         )
 
         for node_str, node_effect in compressed_model_node_effect_results.items():
@@ -104,7 +131,7 @@ class CompressedTracrTransformerTrainer(GenericTrainer):
 
         original_model_node_effect_results = self.evaluate_node_effect(
             self.get_original_model(),
-            self.test_dataset
+            node_effect_batch
         )
 
         for node_str, node_effect in original_model_node_effect_results.items():
@@ -173,8 +200,11 @@ class CompressedTracrTransformerTrainer(GenericTrainer):
         if self.use_wandb:
             wandb.log(self.test_metrics, step=self.step)
 
-    def evaluate_node_effect(self, model, dataset: IITDataset):
+    def evaluate_node_effect(self, model, batch: IITDatasetBatch):
         effect_by_node = {}
+        clean_data, corrupted_data = batch
+        clean_inputs = clean_data[0]
+        corrupted_inputs = corrupted_data[0]
 
         full_circuit = get_full_circuit(self.get_original_model().cfg.n_layers, self.get_original_model().cfg.n_heads)
         all_nodes: Set[CircuitNode] = set(full_circuit.nodes)
@@ -188,10 +218,6 @@ class CompressedTracrTransformerTrainer(GenericTrainer):
             if is_qkv_granularity_hook(hook_name):
                 continue
 
-            clean_data, corrupted_data = next(iter(dataset.make_loader(batch_size=len(dataset), num_workers=0)))
-            clean_inputs = clean_data[0]
-            corrupted_inputs = corrupted_data[0]
-
             original_logits = model(clean_inputs)
             _, corrupted_cache = model.run_with_cache(corrupted_inputs)
 
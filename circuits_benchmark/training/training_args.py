@@ -14,6 +14,9 @@ class TrainingArgs():
     min_train_samples: Optional[int] = 20_000
     max_train_samples: Optional[int] = 120_000
     test_data_ratio: Optional[float] = 0.2  # same as train data
+    stream_train_data: Optional[bool] = False  # generate the data on the fly in shards, instead of all at once
+    train_data_shard_size: Optional[int] = 10_000
+    stream_data_seed: Optional[int] = 42  # base seed of the streamed train and test data
 
     # training time and early stopping
     epochs: int = 100
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import itertools
+from dataclasses import dataclass
+from typing import Any, List
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+import torch as t
+from tracr.compiler.assemble import AssembledTransformerModel
+from tracr.transformer.encoder import CategoricalEncoder
+
+from circuits_benchmark.benchmark.tracr_dataset import TracrBatchInput
+from circuits_benchmark.transformers.hooked_tracr_transformer import HookedTracrTransformer
+
+DEFAULT_REFERENCE_BATCH_SIZE = 512
+
+
+class BatchedTracrModel:
+    """Runs a compiled Tracr model on whole batches of inputs, as a faster reference than calling apply on each input.
+    Inputs are encoded and padded at once, and run in chunks of batch_size inputs through a single jitted forward pass.
+    The last chunk is padded up to batch_size, so that the forward pass is only compiled once per sequence length."""
+
+    def __init__(self, tracr_model: AssembledTransformerModel, batch_size: int = DEFAULT_REFERENCE_BATCH_SIZE):
+        assert tracr_model.input_encoder is not None, "Tracr model must have an input encoder."
+        assert batch_size > 0, "batch_size must be positive"
+        self.tracr_model = tracr_model
+        self.batch_size = batch_size
+
+        # The model output is not a pytree, so we jit a function returning only the unembedded output.
+        self._forward = jax.jit(lambda params, tokens: tracr_model.forward(params, tokens).unembedded_output)
+
+    def is_categorical(self) -> bool:
+        return isinstance(self.tracr_model.output_encoder, CategoricalEncoder)
+
+    def encode(self, batch_input: TracrBatchInput) -> np.ndarray:
+        """Encodes a batch of inputs with the Tracr input encoder, padding ragged inputs at the end with PAD."""
+        input_encoder = self.tracr_model.input_encoder
+        encoding_map = input_encoder.encoding_map
+        max_len = max((len(input) for input in batch_input), default=0)
+
+        tokens = itertools.chain.from_iterable(
+            itertools.chain(input, itertools.repeat(input_encoder.pad_token, max_len - len(input)))
+            for input in batch_input)
+        try:
+            encoding = np.fromiter(map(encoding_map.__getitem__, tokens), dtype=np.int64,
+                                   count=len(batch_input) * max_len)
+        except KeyError as e:
+            raise ValueError(f"Inputs {e.args[0]} not found in encoding ", encoding_map.keys())
+
+        return encoding.reshape(len(batch_input), max_len)
+
+    def run_encoded(self, encoded_inputs: np.ndarray) -> np.ndarray:
+        """Runs the Tracr model on encoded inputs, returning the unembedded output: the output ids of each position for
+        categorical models, and the output values for numerical ones."""
+        n_inputs, seq_len = encoded_inputs.shape
+        outputs = []
+        for start in range(0, n_inputs, self.batch_size):
+            chunk = encoded_inputs[start:start + self.batch_size]
+            n_missing = self.batch_size - len(chunk)
+            if n_missing > 0:
+                # repeat the last input, so that every chunk has the same shape
+                chunk = np.concatenate([chunk, np.repeat(chunk[-1:], n_missing, axis=0)])
+
+            output = self._forward(self.tracr_model.params, jnp.asarray(chunk, dtype=jnp.int32))
+            outputs.append(np.asarray(output)[:self.batch_size - n_missing])
+
+        if len(outputs) == 0:
+            return np.zeros((0, seq_len), dtype=np.int64 if self.is_categorical() else np.float32)
+
+        return np.concatenate(outputs)
+
+    def decode(self, unembedded_output: np.ndarray) -> TracrBatchInput:
+        """Decodes the unembedded output of a batch, returning the same values as the decoded output of apply."""
+        if self.is_categorical():
+            decoding_map = self.tracr_model.output_encoder.decoding_map
+            values_table = np.empty(len(decoding_map), dtype=object)
+            values_table[:] = [decoding_map[output_id] for output_id in range(len(decoding_map))]
+            decoded = values_table[unembedded_output].tolist()
+        else:
+            decoded = unembedded_output.tolist()
+
+        # The output has unspecified behavior for the BOS token, so it is replaced by BOS, as in apply.
+        bos_token = self.tracr_model.input_encoder.bos_token
+        return [[bos_token] + output[1:] for output in decoded]
+
+    def apply(self, batch_input: TracrBatchInput) -> TracrBatchInput:
+        """Returns the decoded outputs of the Tracr model for a batch of inputs."""
+        return self.decode(self.run_encoded(self.encode(batch_input)))
+
+
+@dataclass
+class TracrEquivalenceResult:
+    """Result of comparing a HookedTracrTransformer with the Tracr model it was built from. Positions are compared
+    after BOS, and only when they don't hold a PAD token."""
+    n_inputs: int
+    mismatching_indices: List[int]
+    max_abs_error: float | None = None  # only for numerical models
+
+    @property
+    def is_equivalent(self) -> bool:
+        return len(self.mismatching_indices) == 0
+
+
+def check_tracr_equivalence(tracr_model: AssembledTransformerModel,
+                            hl_model: HookedTracrTransformer,
+                            inputs: TracrBatchInput,
+                            batch_size: int = DEFAULT_REFERENCE_BATCH_SIZE,
+                            atol: float = 1.e-5) -> TracrEquivalenceResult:
+    """Runs the inputs through both the Tracr model (in JAX) and the HookedTracrTransformer (in torch) in batches, and
+    returns the indices of the inputs whose outputs differ. Categorical outputs must have the same output ids, and
+    numerical outputs must be within atol of each other."""
+    reference = BatchedTracrModel(tracr_model, batch_size=batch_size)
+    encoded_inputs = reference.encode(inputs)
+    tracr_output = reference.run_encoded(encoded_inputs)
+
+    hl_outputs = []
+    with t.inference_mode():
+        for start in range(0, len(encoded_inputs), batch_size):
+            chunk = t.from_numpy(encoded_inputs[start:start + batch_size]).to(hl_model.device)
+            logits = hl_model(chunk)
+            hl_output = logits.argmax(dim=-1) if hl_model.is_categorical() else logits.squeeze(dim=-1)
+            hl_outputs.append(hl_output.cpu().numpy())
+    hl_output = np.concatenate(hl_outputs) if len(hl_outputs) > 0 else np.zeros_like(tracr_output)
+
+    pad_id = tracr_model.input_encoder.encoding_map[tracr_model.input_encoder.pad_token]
+    valid_positions = encoded_inputs[:, 1:] != pad_id
+    tracr_output, hl_output = tracr_output[:, 1:], hl_output[:, 1:]
+
+    max_abs_error = None
+    if reference.is_categorical():
+        mismatches = tracr_output != hl_output
+    else:
+        abs_error = np.where(valid_positions, np.abs(tracr_output - hl_output), 0)
+        max_abs_error = float(abs_error.max(initial=0))
+        mismatches = ~np.isclose(tracr_output, hl_output, atol=atol)
+
+    mismatching_indices = np.flatnonzero((mismatches & valid_positions).any(axis=1)).tolist()
+    return TracrEquivalenceResult(len(encoded_inputs), mismatching_indices, max_abs_error)
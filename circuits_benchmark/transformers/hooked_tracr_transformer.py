@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import List, Literal, Any, Union, Callable, Optional, Dict
+import itertools
+from typing import List, Literal, Any, Union, Callable, Optional, Dict, Iterable
 
 import einops
 import jax.numpy as jnp
@@ -17,7 +18,7 @@ from transformer_lens import HookedTransformerConfig, HookedTransformer
 from circuits_benchmark.benchmark.tracr_dataset import TracrBatchInput
 
 HookedTracrTransformerBatchInput = TracrBatchInput | np.ndarray
-HookedTracrTransformerReturnType = Literal["logits", "decoded"]
+HookedTracrTransformerReturnType = Literal["logits", "decoded", "typed"]
 
 
 class HookedTracrTransformer(HookedTransformer):
@@ -37,6 +38,7 @@ class HookedTracrTransformer(HookedTransformer):
         self.tracr_output_encoder = tracr_output_encoder
         self.residual_stream_labels = residual_stream_labels
         self.normalize_output = False
+        self.output_values_table: t.Tensor | np.ndarray | None = None  # built on first use, see get_output_values_table
 
         if "use_hook_mlp_in" in self.cfg.to_dict():  # Tracr models always include MLPs
             self.set_use_hook_mlp_in(True)
@@ -50,6 +52,7 @@ class HookedTracrTransformer(HookedTransformer):
         cls,
         tracr_model: AssembledTransformerModel,
         device: t.device = t.device("cuda") if t.cuda.is_available() else t.device("cpu"),
+        dtype: t.dtype = t.float32,
         *args, **kwargs
     ) -> HookedTracrTransformer:
         """
@@ -57,6 +60,7 @@ class HookedTracrTransformer(HookedTransformer):
         """
         cfg = cls.extract_tracr_config(tracr_model)
         cfg.device = device
+        cfg.dtype = dtype
         tl_model = cls(cfg,
                        tracr_model.input_encoder,
                        tracr_model.output_encoder,
@@ -128,7 +132,9 @@ class HookedTracrTransformer(HookedTransformer):
                         return_type: HookedTracrTransformerReturnType = "logits") -> HookedTracrTransformerBatchInput | \
                                                                                      Float[
                                                                                          Tensor, "batch_size seq_len d_vocab_out"]:
-        """Applies the internal transformer_lens model to an input."""
+        """Applies the internal transformer_lens model to an input.
+        The return type can be "logits", "decoded" (Python lists, as Tracr models return) or "typed" (a tensor or numpy
+        array with the decoded values, see map_tl_output_to_typed_output)."""
         tl_batch_input = self.map_tracr_input_to_tl_input(batch_input)
         logits = self(tl_batch_input)
         if return_type == "logits":
@@ -136,29 +142,117 @@ class HookedTracrTransformer(HookedTransformer):
                 return t.nn.functional.normalize(logits)
             else:
                 return logits
+        elif return_type == "typed":
+            return self.map_tl_output_to_typed_output(logits)
         else:
             return self.map_tl_output_to_tracr_output(logits)
 
     def map_tracr_input_to_tl_input(self, batch_input: HookedTracrTransformerBatchInput) -> t.Tensor:
-        """Maps a tracr input to a transformer_lens input."""
-        encoding = [self.tracr_input_encoder.encode(input) for input in batch_input]
-        return t.tensor(encoding)
+        """Maps a tracr input to a transformer_lens input.
+        The whole batch is encoded at once using the encoding map of the Tracr input encoder as lookup table. Batches
+        can be lists of inputs or 2-D arrays (of objects or strings). Ragged batches are padded at the end with PAD."""
+        encoding_map = self.tracr_input_encoder.encoding_map
+
+        if isinstance(batch_input, np.ndarray) and batch_input.ndim == 2:
+            if batch_input.dtype.kind == "U":
+                encoding = self.encode_string_tokens(batch_input)
+            else:
+                encoding = self.encode_tokens(batch_input.ravel(), batch_input.size).reshape(batch_input.shape)
+        else:
+            lengths = [len(input) for input in batch_input]
+            max_len = max(lengths, default=0)
+            pad_token = self.tracr_input_encoder.pad_token
+            tokens = itertools.chain.from_iterable(
+                input if length == max_len else itertools.chain(input, itertools.repeat(pad_token, max_len - length))
+                for input, length in zip(batch_input, lengths))
+            encoding = self.encode_tokens(tokens, len(lengths) * max_len).reshape(len(lengths), max_len)
+
+        if getattr(self.tracr_input_encoder, "enforce_bos", False) and encoding.size > 0:
+            missing_bos = encoding[:, 0] != encoding_map[self.tracr_input_encoder.bos_token]
+            if missing_bos.any():
+                raise ValueError(f"First input token must be BOS token. Got: {batch_input[int(missing_bos.argmax())]}")
+
+        return t.from_numpy(encoding)
+
+    def encode_tokens(self, tokens: Iterable[Any], n_tokens: int) -> np.ndarray:
+        """Returns the ids of the given tokens (in a flat array), using the encoding map of the Tracr input encoder."""
+        encoding_map = self.tracr_input_encoder.encoding_map
+        try:
+            return np.fromiter(map(encoding_map.__getitem__, tokens), dtype=np.int64, count=n_tokens)
+        except KeyError as e:
+            raise ValueError(f"Inputs {e.args[0]} not found in encoding ", encoding_map.keys())
+
+    def encode_string_tokens(self, batch_input: np.ndarray) -> np.ndarray:
+        """Returns the ids of the tokens in a 2-D string array, by searching them in the sorted string tokens of the
+        Tracr input encoder."""
+        encoding_map = self.tracr_input_encoder.encoding_map
+        string_tokens = sorted([token for token in encoding_map.keys() if isinstance(token, str)])
+        sorted_tokens = np.array(string_tokens, dtype=batch_input.dtype)
+        sorted_ids = np.array([encoding_map[token] for token in string_tokens], dtype=np.int64)
+
+        positions = np.minimum(np.searchsorted(sorted_tokens, batch_input), len(sorted_tokens) - 1)
+        found = sorted_tokens[positions] == batch_input
+        if not found.all():
+            raise ValueError(f"Inputs {batch_input[~found][0]} not found in encoding ", encoding_map.keys())
+
+        return sorted_ids[positions]
 
     def map_tl_output_to_tracr_output(self, logits: t.Tensor) -> HookedTracrTransformerBatchInput:
         """Maps a transformer_lens output to a tracr output."""
-        if self.is_categorical():
-            logits = logits.argmax(dim=-1)
-        else:
-            logits = logits.squeeze(dim=-1)
-
         # The output has unspecified behavior for the BOS token, so we remove it and add it back in after decoding.
         bos_token = self.tracr_input_encoder.bos_token
-        logits = logits[:, 1:]
-        decoded_output_with_bos = [[bos_token] + self.tracr_output_encoder.decode(output)
-                                   for output in logits.tolist()]
+        decoded_output_with_bos = [[bos_token] + output
+                                   for output in self.map_tl_output_to_typed_output(logits).tolist()]
 
         return decoded_output_with_bos
 
+    def map_tl_output_to_typed_output(self, logits: t.Tensor) -> t.Tensor | np.ndarray:
+        """Maps a transformer_lens output to the decoded values of all positions except BOS, with shape
+        (batch, seq_len - 1). Numerical outputs, and categorical outputs whose values are all bools, all ints or all
+        floats, are returned as a tensor on the same device as the logits. Other categorical outputs (e.g., strings or
+        mixed types) are returned as a numpy array. Call tolist() on the result to get the same Python values as the
+        Tracr output encoder."""
+        logits = logits[:, 1:]
+        if not self.is_categorical():
+            return logits.squeeze(dim=-1)
+
+        output_ids = logits.argmax(dim=-1)
+        output_values = self.get_output_values_table()
+        if isinstance(output_values, t.Tensor):
+            return output_values.to(output_ids.device)[output_ids]
+        else:
+            return output_values[output_ids.cpu().numpy()]
+
+    def get_output_values_table(self) -> t.Tensor | np.ndarray:
+        """Returns the value decoded for each output id of a categorical model. The table is built only once per
+        model (see build_output_values_table)."""
+        if self.output_values_table is None:
+            self.output_values_table = self.build_output_values_table()
+
+        return self.output_values_table
+
+    def build_output_values_table(self) -> t.Tensor | np.ndarray:
+        """Builds the table of values decoded for each output id of a categorical model: a tensor if all values are
+        bools, all ints or all floats, and a numpy array otherwise. Values of mixed types (e.g., ints and floats) are
+        kept as the original Python objects."""
+        decoding_map = self.tracr_output_encoder.decoding_map
+        values = [decoding_map[output_id] for output_id in range(len(decoding_map))]
+
+        if all(isinstance(value, bool) for value in values):
+            return t.tensor(values, dtype=t.bool)
+        elif all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+            return t.tensor(values, dtype=t.int64)
+        elif all(isinstance(value, float) for value in values):
+            return t.tensor(values, dtype=t.float64)
+
+        values_table = np.array(values)
+        if values_table.dtype.kind != "U" or values_table.tolist() != values:
+            # mixed types, keep the original Python objects
+            values_table = np.empty(len(values), dtype=object)
+            values_table[:] = values
+
+        return values_table
+
     def load_weights_from_tracr_model(self, tracr_model: AssembledTransformerModel) -> None:
         """Loads the weights from a tracr model into the transformer_lens model."""
         self.load_tracr_state_dict(self.extract_tracr_state_dict(tracr_model))
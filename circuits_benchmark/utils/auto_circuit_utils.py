@@ -1,8 +1,11 @@
+import numpy as np
 from auto_circuit.types import PruneScores
 from auto_circuit.utils.patchable_model import PatchableModel
 
 from circuits_benchmark.utils.circuit.circuit import Circuit
 from circuits_benchmark.utils.circuit.circuit_node import CircuitNode
+from circuits_benchmark.utils.circuit.edge_mask import EdgeIndex
+from circuits_benchmark.utils.circuit.prepare_circuit import prepare_circuit_for_evaluation
 
 
 def build_circuit(model: PatchableModel,
@@ -26,6 +29,47 @@ def build_circuit(model: PatchableModel,
     return circuit
 
 
+def build_edge_scores(model: PatchableModel,
+                      attribution_scores: PruneScores,
+                      index: EdgeIndex,
+                      abs_val_threshold: bool = False,
+                      prepare_for_evaluation: bool = True) -> np.ndarray:
+    """Returns the score of each edge in the index, to compute the TPR and FPR of all thresholds at once (see
+    roc.get_roc_curve) instead of calling build_circuit for each one. If prepare_for_evaluation is True, the edges of
+    the model are mapped with prepare_circuit_for_evaluation, and each edge in the index gets the highest score of the
+    model edges mapped to it, since it is in a thresholded circuit as soon as one of them is. Edges in the index that
+    no model edge is mapped to get a score of -inf."""
+    model_circuit = Circuit()
+    model_edge_scores = {}
+    for edge in model.edges:
+        from_node = CircuitNode(edge.src.module_name, edge.src.head_idx)
+        to_node = CircuitNode(edge.dest.module_name, edge.dest.head_idx)
+        score = attribution_scores[edge.dest.module_name][edge.patch_idx].item()
+        if abs_val_threshold:
+            score = abs(score)
+
+        model_circuit.add_edge(from_node, to_node)
+        model_edge_scores[(from_node, to_node)] = max(score, model_edge_scores.get((from_node, to_node), -np.inf))
+
+    if prepare_for_evaluation:
+        edges_mapping = {}
+        prepare_circuit_for_evaluation(model_circuit, edges_mapping=edges_mapping)
+    else:
+        edges_mapping = {edge: edge for edge in model_circuit.edges}
+
+    edge_scores = np.full(index.n_edges, -np.inf)
+    for model_edge, index_edge in edges_mapping.items():
+        if index_edge is None:
+            continue
+
+        edge_id = index.edge_ids.get(index_edge)
+        if edge_id is None:
+            raise ValueError(f"Edge {index_edge} is not in the full circuit")
+        edge_scores[edge_id] = max(edge_scores[edge_id], model_edge_scores[model_edge])
+
+    return edge_scores
+
+
 def build_normalized_scores(attribution_scores: PruneScores) -> PruneScores:
     """Normalize the scores so that they all lie between 0 and 1."""
     max_score = max(scores.max() for scores in attribution_scores.values())
@@ -0,0 +1,150 @@
+import ast
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import List, Dict, Tuple
+
+from circuits_benchmark.utils.project_paths import detect_project_root, get_default_cache_dir
+
+# Bump this number whenever the layout of the index changes, so that stale indices are rebuilt.
+CASE_INDEX_VERSION = 1
+
+CASES_PACKAGE = "circuits_benchmark.benchmark.cases"
+
+# Classes that all cases derive from (directly or transitively).
+BASE_CASE_CLASSES = ("BenchmarkCase", "TracrBenchmarkCase")
+
+
+@dataclass(frozen=True)
+class CaseIndexEntry:
+    case_id: str
+    module: str
+    class_name: str
+
+
+_case_index_by_path: Dict[str, Tuple[Dict[str, int], List[CaseIndexEntry]]] = {}
+
+
+def get_cases_dir() -> str:
+    """Returns the directory of the package containing the benchmark cases."""
+    return os.path.join(detect_project_root(), *CASES_PACKAGE.split("."))
+
+
+def get_case_index_path() -> str:
+    """Returns the path of the file storing the case index."""
+    return os.path.join(get_default_cache_dir(), "case_index.json")
+
+
+def get_source_mtimes(cases_dir: str) -> Dict[str, int]:
+    """Returns the modification time of each Python file in the cases package, indexed by relative path."""
+    mtimes = {}
+    for dir_path, dir_names, file_names in os.walk(cases_dir):
+        dir_names[:] = [dir_name for dir_name in dir_names if dir_name != "__pycache__"]
+        for file_name in file_names:
+            if file_name.endswith(".py"):
+                file_path = os.path.join(dir_path, file_name)
+                mtimes[os.path.relpath(file_path, cases_dir)] = os.stat(file_path).st_mtime_ns
+
+    return mtimes
+
+
+def build_case_index(cases_dir: str, package_name: str, source_files: List[str]) -> List[CaseIndexEntry]:
+    """Builds the case index by parsing (not importing) the source files of the cases package.
+    A class is a case if its name starts with "Case" and it derives, directly or transitively, from one of
+    BASE_CASE_CLASSES. Base classes are matched by name."""
+    classes = []
+    for source_file in sorted(source_files):
+        module_parts = source_file[:-len(".py")].split(os.sep)
+        if module_parts[-1] == "__init__":
+            module_parts = module_parts[:-1]
+        module = ".".join([package_name] + module_parts)
+
+        with open(os.path.join(cases_dir, source_file), "r") as f:
+            tree = ast.parse(f.read(), filename=source_file)
+
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                base_names = [base.id if isinstance(base, ast.Name) else base.attr
+                              for base in node.bases if isinstance(base, (ast.Name, ast.Attribute))]
+                classes.append((module, node.name, base_names))
+
+    # propagate the "is a case" property from the base classes until we reach a fixed point
+    case_class_names = set(BASE_CASE_CLASSES)
+    changed = True
+    while changed:
+        changed = False
+        for _, class_name, base_names in classes:
+            if class_name not in case_class_names and any(name in case_class_names for name in base_names):
+                case_class_names.add(class_name)
+                changed = True
+
+    return [CaseIndexEntry(case_id=class_name[4:].lower(), module=module, class_name=class_name)
+            for module, class_name, _ in classes
+            if class_name.startswith("Case") and class_name in case_class_names]
+
+
+def load_case_index_file(index_path: str) -> Tuple[Dict[str, int], List[CaseIndexEntry]] | None:
+    """Loads the case index from disk. Returns None if it does not exist or can not be read."""
+    if not os.path.exists(index_path):
+        return None
+
+    try:
+        with open(index_path, "r") as f:
+            data = json.load(f)
+
+        if data["version"] != CASE_INDEX_VERSION:
+            return None
+
+        return data["mtimes"], [CaseIndexEntry(**entry) for entry in data["cases"]]
+    except Exception as e:
+        print(f"Ignoring unreadable case index {index_path}: {e}")
+        return None
+
+
+def save_case_index_file(index_path: str, mtimes: Dict[str, int], entries: List[CaseIndexEntry]) -> None:
+    """Stores the case index on disk. Failing to store it is not an error, we just rebuild it next time."""
+    data = {
+        "version": CASE_INDEX_VERSION,
+        "mtimes": mtimes,
+        "cases": [entry.__dict__ for entry in entries],
+    }
+
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+
+        # write to a temporary file first, so that concurrent processes never read a partially written index
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, index_path)
+    except Exception as e:
+        print(f"Unable to store case index {index_path}: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def get_case_index(cases_dir: str | None = None,
+                   package_name: str = CASES_PACKAGE,
+                   index_path: str | None = None) -> List[CaseIndexEntry]:
+    """Returns the index of all benchmark cases, without importing them.
+    The index is stored on disk and rebuilt whenever a file in the cases package is added, removed or modified."""
+    if cases_dir is None:
+        cases_dir = get_cases_dir()
+
+    if index_path is None:
+        index_path = get_case_index_path()
+
+    mtimes = get_source_mtimes(cases_dir)
+
+    index = _case_index_by_path.get(index_path)
+    if index is None:
+        index = load_case_index_file(index_path)
+
+    if index is None or index[0] != mtimes:
+        index = (mtimes, build_case_index(cases_dir, package_name, list(mtimes.keys())))
+        save_case_index_file(index_path, *index)
+
+    _case_index_by_path[index_path] = index
+    return index[1]
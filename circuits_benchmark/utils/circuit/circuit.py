@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from functools import cached_property
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, Iterable, List
 
 import cmapy
 import networkx as nx
@@ -19,15 +19,42 @@ from circuits_benchmark.utils.cloudpickle import dump_to_pickle, load_from_pickl
 
 class Circuit(DiGraph):
     def __init__(self, granularity: CircuitGranularity | None = None, *args, **kwargs):
+        # Index of the nodes by name, and nodes without successors (as ordered sets). Both are kept in sync with the
+        # graph on every mutation, so that membership checks, lookups by name and get_result_node don't scan all nodes.
+        self._nodes_by_name: Dict[str, Dict[CircuitNode, None]] = {}
+        self._sink_nodes: Dict[CircuitNode, None] = {}
+
         super().__init__(*args, **kwargs)
         self.granularity = granularity
 
+    def __setstate__(self, state):
+        # The node view is recreated on first access, and circuits pickled before the index existed get it rebuilt.
+        state.pop("nodes", None)
+        self.__dict__.update(state)
+        if "_nodes_by_name" not in state:
+            self._nodes_by_name = {}
+            self._sink_nodes = {}
+            for node in self._node:
+                self._index_node(node)
+
     def add_node(self, node_for_adding: CircuitNode, **attr):
         # Make sure that node_for_adding is a CircuitNode
         if not isinstance(node_for_adding, CircuitNode):
             raise ValueError(f"Expected a CircuitNode, got {type(node_for_adding)}")
 
         super().add_node(node_for_adding, **attr)
+        self._index_node(node_for_adding)
+
+    def add_nodes_from(self, nodes_for_adding: Iterable, **attr):
+        nodes_for_adding = list(nodes_for_adding)
+        nodes = [node if isinstance(node, CircuitNode) else node[0] for node in nodes_for_adding]
+        for node in nodes:
+            if not isinstance(node, CircuitNode):
+                raise ValueError(f"Expected a CircuitNode, got {type(node)}")
+
+        super().add_nodes_from(nodes_for_adding, **attr)
+        for node in nodes:
+            self._index_node(node)
 
     def add_edge(self, u_of_edge: CircuitNode, v_of_edge: CircuitNode, **attr):
         # Make sure that u_of_edge and v_of_edge are CircuitNodes
@@ -35,11 +62,90 @@ class Circuit(DiGraph):
             raise ValueError(f"Expected a CircuitNode, got {type(u_of_edge)} and {type(v_of_edge)}")
 
         super().add_edge(u_of_edge, v_of_edge, **attr)
+        self._index_node(u_of_edge)
+        self._index_node(v_of_edge)
+
+    def add_edges_from(self, ebunch_to_add: Iterable, **attr):
+        ebunch_to_add = list(ebunch_to_add)
+        for edge in ebunch_to_add:
+            if not isinstance(edge[0], CircuitNode) or not isinstance(edge[1], CircuitNode):
+                raise ValueError(f"Expected a CircuitNode, got {type(edge[0])} and {type(edge[1])}")
+
+        super().add_edges_from(ebunch_to_add, **attr)
+        for edge in ebunch_to_add:
+            self._index_node(edge[0])
+            self._index_node(edge[1])
+
+    def remove_node(self, n: CircuitNode):
+        predecessors = [node for node in self._pred[n] if node != n] if n in self._node else []
+        super().remove_node(n)
+        self._unindex_node(n)
+        for node in predecessors:
+            self._index_node(node)
+
+    def remove_nodes_from(self, nodes: Iterable[CircuitNode]):
+        nodes = [node for node in nodes if node in self._node]
+        predecessors = {pred: None for node in nodes for pred in self._pred[node]}
+        super().remove_nodes_from(nodes)
+        for node in nodes:
+            self._unindex_node(node)
+        for node in predecessors:
+            if node in self._node:
+                self._index_node(node)
+
+    def remove_edge(self, u: CircuitNode, v: CircuitNode):
+        super().remove_edge(u, v)
+        self._index_node(u)
+
+    def remove_edges_from(self, ebunch: Iterable):
+        ebunch = list(ebunch)
+        super().remove_edges_from(ebunch)
+        for edge in ebunch:
+            if edge[0] in self._node:
+                self._index_node(edge[0])
+
+    def clear(self):
+        super().clear()
+        self._nodes_by_name.clear()
+        self._sink_nodes.clear()
+
+    def clear_edges(self):
+        super().clear_edges()
+        self._sink_nodes = dict.fromkeys(self._node)
+
+    def _index_node(self, node: CircuitNode):
+        """Updates the index entries of a node that is in the graph, after it or its edges changed."""
+        self._nodes_by_name.setdefault(node.name, {})[node] = None
+        if self._succ[node]:
+            self._sink_nodes.pop(node, None)
+        else:
+            self._sink_nodes[node] = None
+
+    def _unindex_node(self, node: CircuitNode):
+        """Removes the index entries of a node that is no longer in the graph."""
+        nodes_with_name = self._nodes_by_name.get(node.name)
+        if nodes_with_name is not None:
+            nodes_with_name.pop(node, None)
+            if not nodes_with_name:
+                del self._nodes_by_name[node.name]
+        self._sink_nodes.pop(node, None)
 
     @cached_property
     def nodes(self):
         return CircuitNodeView(self)
 
+    def has_node_named(self, name: str) -> bool:
+        """Returns true if the circuit has a node with the given name, regardless of its index."""
+        return name in self._nodes_by_name
+
+    def get_nodes_by_name(self, name: str) -> List[CircuitNode]:
+        """Returns the nodes in the circuit with the given name (e.g., one per head for attention hooks)."""
+        return list(self._nodes_by_name.get(name, ()))
+
+    def get_sink_nodes(self) -> List[CircuitNode]:
+        """Returns the nodes in the circuit that don't have successors."""
+        return list(self._sink_nodes)
+
     def save(self, file_path: str):
         if not file_path.endswith(".pkl"):
             file_path += ".pkl"
@@ -52,9 +158,8 @@ class Circuit(DiGraph):
 
     def get_result_node(self):
         """Returns the node in the circuit that doesn't have successors (there should be only one)."""
-        result_nodes = [node for node in self.nodes if not list(self.successors(node))]
-        assert len(result_nodes) == 1, f"Expected 1 result node, got {len(result_nodes)}"
-        return result_nodes[0]
+        assert len(self._sink_nodes) == 1, f"Expected 1 result node, got {len(self._sink_nodes)}"
+        return next(iter(self._sink_nodes))
 
     def nx_plot(self, file_path: str, seed: int = 42, n_layers: Optional[int] = None, n_heads: Optional[int] = None):
         if n_layers is None or n_heads is None:
@@ -1,5 +1,9 @@
 from dataclasses import dataclass
-from typing import Optional, Set
+from typing import Optional, Set, Dict, Tuple
+from weakref import WeakKeyDictionary
+
+import networkx as nx
+import numpy as np
 
 from acdc.TLACDCCorrespondence import TLACDCCorrespondence
 from acdc.TLACDCEdge import EdgeType
@@ -8,7 +12,9 @@ from transformer_lens import HookedTransformer
 
 from circuits_benchmark.benchmark.benchmark_case import BenchmarkCase
 from circuits_benchmark.utils.circuit.circuit import Circuit
+from circuits_benchmark.utils.circuit.circuit_granularity import CircuitGranularity
 from circuits_benchmark.utils.circuit.circuit_node import CircuitNode
+from circuits_benchmark.utils.circuit.edge_mask import EdgeIndex, get_masks_tpr_and_fpr
 from circuits_benchmark.utils.circuit.prepare_circuit import prepare_circuit_for_evaluation
 from circuits_benchmark.utils.iit._acdc_utils import get_gt_circuit
 
@@ -47,25 +53,24 @@ def calculate_fpr_and_tpr(
     promote_to_heads: bool = True,
     print_summary: bool = True,
 ) -> CircuitEvalResult:
+    """Returns the true/false positives/negatives and the TP and FP rates of the nodes and edges of a hypothesis
+    circuit, with respect to a true circuit. Circuits are prepared for evaluation (see prepare_circuit_for_evaluation)
+    and represented as masks over the edges and nodes of the prepared full circuit (see
+    get_prepared_full_circuit_index), so the rates are computed with vectorized operations. Raises a ValueError if a circuit has nodes or edges not in the full circuit."""
     processed_true_circuit = prepare_circuit_for_evaluation(true_circuit, promote_to_heads)
     processed_hypothesis_circuit = prepare_circuit_for_evaluation(hypothesis_circuit, promote_to_heads)
-    processed_full_circuit = prepare_circuit_for_evaluation(full_circuit, promote_to_heads)
-
-    all_nodes = set(processed_full_circuit.nodes)
-    true_nodes = set(processed_true_circuit.nodes)
-    hypothesis_nodes = set(processed_hypothesis_circuit.nodes)
+    index = get_prepared_full_circuit_index(full_circuit, promote_to_heads)
 
     # calculate nodes false positives and false negatives
+    hypothesis_nodes_mask = index.get_nodes_mask(processed_hypothesis_circuit.nodes)
+    true_nodes_mask = index.get_nodes_mask(processed_true_circuit.nodes)
+    nodes_tpr, nodes_fpr = get_masks_tpr_and_fpr(hypothesis_nodes_mask, true_nodes_mask)
 
-    assert hypothesis_nodes.issubset(
-        all_nodes), f"hypothesis nodes contain the following nodes that are not in the full circuit: {hypothesis_nodes - all_nodes}"
-    assert true_nodes.issubset(
-        all_nodes), f"true nodes contain the following nodes that are not in the full circuit: {true_nodes - all_nodes}"
-
-    false_positive_nodes = hypothesis_nodes - true_nodes
-    false_negative_nodes = true_nodes - hypothesis_nodes
-    true_positive_nodes = hypothesis_nodes & true_nodes
-    true_negative_nodes = all_nodes - (hypothesis_nodes | true_nodes)
+    get_nodes = lambda mask: set(index.nodes[i] for i in np.flatnonzero(mask))
+    false_positive_nodes = get_nodes(hypothesis_nodes_mask & ~true_nodes_mask)
+    false_negative_nodes = get_nodes(true_nodes_mask & ~hypothesis_nodes_mask)
+    true_positive_nodes = get_nodes(hypothesis_nodes_mask & true_nodes_mask)
+    true_negative_nodes = get_nodes(~(hypothesis_nodes_mask | true_nodes_mask))
 
     if verbose:
         print("\nNodes analysis:")
@@ -75,20 +80,15 @@ def calculate_fpr_and_tpr(
         print(f" - True Negatives: {sorted(true_negative_nodes)}")
 
     # calculate edges false positives and false negatives
-    hypothesis_edges = set(processed_hypothesis_circuit.edges)
-    true_edges = set(processed_true_circuit.edges)
-    all_edges = set(processed_full_circuit.edges)
+    hypothesis_edges_mask = index.get_edges_mask(processed_hypothesis_circuit.edges)
+    true_edges_mask = index.get_edges_mask(processed_true_circuit.edges)
+    edges_tpr, edges_fpr = get_masks_tpr_and_fpr(hypothesis_edges_mask, true_edges_mask)
 
-    assert hypothesis_edges.issubset(
-        all_edges), f"hypothesis edges contain the following edges that are not in the full circuit: {hypothesis_edges - all_edges}, hypothesis edges: {hypothesis_edges}, all edges: {all_edges}"
-    assert true_edges.issubset(
-        all_edges), f"true edges contain the following edges that are not in the full circuit: {true_edges - all_edges}"
-
-    false_positive_edges = (hypothesis_edges - true_edges) & all_edges
-    false_negative_edges = true_edges - hypothesis_edges
-    true_positive_edges = hypothesis_edges & true_edges
-    true_negative_edges = all_edges - (
-        hypothesis_edges | true_edges)  # == (all_edges - hypothesis_edges) & (all_edges - true_edges)
+    get_edges = lambda mask: set(index.edges[i] for i in np.flatnonzero(mask))
+    false_positive_edges = get_edges(hypothesis_edges_mask & ~true_edges_mask)
+    false_negative_edges = get_edges(true_edges_mask & ~hypothesis_edges_mask)
+    true_positive_edges = get_edges(hypothesis_edges_mask & true_edges_mask)
+    true_negative_edges = get_edges(~(hypothesis_edges_mask | true_edges_mask))
 
     if verbose:
         print("\nEdges analysis:")
@@ -100,38 +100,15 @@ def calculate_fpr_and_tpr(
     # print FP and TP rates for nodes and edges as summary
     make_summary = lambda *args, **kwargs: print(*args, **kwargs) if print_summary else None
     if verbose:
-        make_summary("\n\n-------------------\n\nhypothesis_edges", hypothesis_edges, "\n-----------\n")
-        make_summary("true_edges", true_edges, "\n-----------\n")
-        make_summary("all_edges", all_edges, "\n\n-------------------\n\n")
+        make_summary("\n\n-------------------\n\nhypothesis_edges", set(processed_hypothesis_circuit.edges),
+                     "\n-----------\n")
+        make_summary("true_edges", set(processed_true_circuit.edges), "\n-----------\n")
+        make_summary("all_edges", set(index.edges), "\n\n-------------------\n\n")
     make_summary(f"\nSummary:")
-
-    if len(true_positive_nodes | false_negative_nodes) == 0:
-        nodes_tpr = "N/A"
-        make_summary(f" - Nodes TP rate: N/A")
-    else:
-        nodes_tpr = len(true_positive_nodes) / len(true_positive_nodes | false_negative_nodes)
-        make_summary(f" - Nodes TP rate: {nodes_tpr}")
-
-    if len(false_positive_nodes | true_negative_nodes) == 0:
-        nodes_fpr = "N/A"
-        make_summary(f" - Nodes FP rate: N/A")
-    else:
-        nodes_fpr = len(false_positive_nodes) / len(false_positive_nodes | true_negative_nodes)
-        make_summary(f" - Nodes FP rate: {nodes_fpr}")
-
-    if len(true_positive_edges | false_negative_edges) == 0:
-        edges_tpr = "N/A"
-        make_summary(f" - Edges TP rate: N/A")
-    else:
-        edges_tpr = len(true_positive_edges) / len(true_positive_edges | false_negative_edges)
-        make_summary(f" - Edges TP rate: {edges_tpr}")
-
-    if len(false_positive_edges | true_negative_edges) == 0:
-        edges_fpr = "N/A"
-        make_summary(f" - Edges FP rate: N/A")
-    else:
-        edges_fpr = len(false_positive_edges) / len(false_positive_edges | true_negative_edges)
-        make_summary(f" - Edges FP rate: {edges_fpr}")
+    make_summary(f" - Nodes TP rate: {nodes_tpr}")
+    make_summary(f" - Nodes FP rate: {nodes_fpr}")
+    make_summary(f" - Edges TP rate: {edges_tpr}")
+    make_summary(f" - Edges FP rate: {edges_fpr}")
 
     return CircuitEvalResult(
         nodes=CircuitEvalNodesResult(
@@ -153,6 +130,30 @@ def calculate_fpr_and_tpr(
     )
 
 
+# Edge indices of prepared full circuits, by frozen full circuit and promote_to_heads
+_prepared_full_circuit_indices: WeakKeyDictionary[Circuit, Dict[bool, EdgeIndex]] = WeakKeyDictionary()
+
+
+def get_prepared_full_circuit_index(full_circuit: Circuit, promote_to_heads: bool = True) -> EdgeIndex:
+    """Returns the edge index of a full circuit after prepare_circuit_for_evaluation. Frozen full circuits are shared
+    per architecture (see get_full_circuit and get_full_circuit_from_model) and can not change, so their indices are
+    built once per promote_to_heads. Other circuits are prepared on every call."""
+    if not nx.is_frozen(full_circuit):
+        return _build_prepared_full_circuit_index(full_circuit, promote_to_heads)
+
+    indices = _prepared_full_circuit_indices.setdefault(full_circuit, {})
+    if promote_to_heads not in indices:
+        indices[promote_to_heads] = _build_prepared_full_circuit_index(full_circuit, promote_to_heads)
+
+    return indices[promote_to_heads]
+
+
+def _build_prepared_full_circuit_index(full_circuit: Circuit, promote_to_heads: bool) -> EdgeIndex:
+    prepared_circuit = prepare_circuit_for_evaluation(full_circuit, promote_to_heads)
+    prepared_circuit.granularity = full_circuit.granularity
+    return EdgeIndex(prepared_circuit)
+
+
 def evaluate_hypothesis_circuit(
     hypothesis_circuit: Circuit,
     ll_model: HookedTransformer,
@@ -162,10 +163,7 @@ def evaluate_hypothesis_circuit(
     use_embeddings: bool = True,
     print_summary: bool = True,
 ) -> CircuitEvalResult:
-    full_corr = TLACDCCorrespondence.setup_from_model(
-        ll_model, use_pos_embed=use_embeddings
-    )
-    full_circuit = build_from_acdc_correspondence(full_corr)
+    full_circuit = get_full_circuit_from_model(ll_model, use_pos_embed=use_embeddings)
 
     if gt_circuit is None:
         if "ioi" in case.get_name():
@@ -207,15 +205,61 @@ def build_from_acdc_correspondence(corr: TLACDCCorrespondence) -> Circuit:
     return circuit
 
 
-def get_full_circuit(n_layers: int, n_heads: int) -> Circuit:
-    """Return a full circuit (ACDC level granularity) with n_layers and n_heads."""
-    circuit = Circuit()
+# Full circuits built from ACDC correspondences, by (n_layers, n_heads, use_pos_embed, attn_only)
+_full_circuits_from_correspondence: Dict[Tuple[int, int, bool, bool], Circuit] = {}
+
+
+def get_full_circuit_from_model(ll_model: HookedTransformer, use_pos_embed: bool = True) -> Circuit:
+    """Return the full circuit (ACDC level granularity) of the ACDC correspondence of a model. The circuit only depends
+    on the architecture of the model, so it is built once per architecture and shared. The returned circuit is frozen,
+    call copy() on it to get a circuit that can be modified."""
+    cfg = ll_model.cfg
+    key = (cfg.n_layers, cfg.n_heads, use_pos_embed, cfg.attn_only)
+    if key not in _full_circuits_from_correspondence:
+        full_corr = TLACDCCorrespondence.setup_from_model(ll_model, use_pos_embed=use_pos_embed)
+        full_circuit = build_from_acdc_correspondence(full_corr)
+        full_circuit.granularity = "acdc_hooks"
+        _full_circuits_from_correspondence[key] = nx.freeze(full_circuit)
+
+    return _full_circuits_from_correspondence[key]
+
 
-    circuit.add_node(CircuitNode("hook_embed"))
-    circuit.add_node(CircuitNode("hook_pos_embed"))
+# Full circuits by (n_layers, n_heads, granularity, use_pos_embed)
+_full_circuits: Dict[Tuple[int, int, CircuitGranularity, bool], Circuit] = {}
+
+
+def get_full_circuit(n_layers: int,
+                     n_heads: int,
+                     granularity: CircuitGranularity = "acdc_hooks",
+                     use_pos_embed: bool = True) -> Circuit:
+    """Return a full circuit with n_layers and n_heads (see build_full_circuit). Circuits are built once per set of
+    arguments and shared, so the returned circuit is frozen: call copy() on it to get a circuit that can be modified."""
+    key = (n_layers, n_heads, granularity, use_pos_embed)
+    if key not in _full_circuits:
+        _full_circuits[key] = nx.freeze(build_full_circuit(*key))
+
+    return _full_circuits[key]
+
+
+def build_full_circuit(n_layers: int,
+                       n_heads: int,
+                       granularity: CircuitGranularity = "acdc_hooks",
+                       use_pos_embed: bool = True) -> Circuit:
+    """Return a full circuit (ACDC level granularity) with n_layers and n_heads. If use_pos_embed is False, the
+    embeddings are a single blocks.0.hook_resid_pre node, as in ACDC."""
+    if granularity != "acdc_hooks":
+        raise ValueError(f"Unsupported granularity {granularity} for full circuits, only acdc_hooks is supported")
+
+    circuit = Circuit(granularity)
+
+    if use_pos_embed:
+        circuit.add_node(CircuitNode("hook_embed"))
+        circuit.add_node(CircuitNode("hook_pos_embed"))
+    else:
+        circuit.add_node(CircuitNode("blocks.0.hook_resid_pre"))
 
-    # nodes that write to residual stream match at least one of the following
-    resid_writers_filter = ["hook_embed", "hook_pos_embed", "attn.hook_result", "hook_mlp_out"]
+    # nodes that write to residual stream have one of the following kinds
+    resid_writer_kinds = {"hook_embed", "hook_pos_embed", "hook_resid_pre", "hook_result", "hook_mlp_out"}
 
     for layer in range(n_layers):
         upstream_nodes = list(circuit.nodes)
@@ -241,8 +285,9 @@ def get_full_circuit(n_layers: int, n_heads: int) -> Circuit:
                 f"blocks.{layer}.hook_v_input",
             ]
             for from_node in upstream_nodes:
-                if any([from_node.name.endswith(resid_writer) for resid_writer in resid_writers_filter]):
-                    if f"blocks.{layer}" not in from_node.name:  # discard nodes from current layer
+                if from_node.kind in resid_writer_kinds:
+                    # discard nodes from current layer (blocks.0.hook_resid_pre is an embedding, not a layer 0 node)
+                    if from_node.layer != layer or from_node.kind == "hook_resid_pre":
                         for to_node_name in nodes_that_receive_resid_directly:
                             circuit.add_edge(from_node, CircuitNode(to_node_name, head))
 
@@ -257,15 +302,15 @@ def get_full_circuit(n_layers: int, n_heads: int) -> Circuit:
 
         nodes_that_receive_resid_directly = [mlp_in_node]
         for from_node in upstream_nodes:
-            if any([from_node.name.endswith(resid_writer) for resid_writer in resid_writers_filter]):
-                if (f"blocks.{layer}" not in from_node.name) or ("attn.hook_result" in from_node.name):
+            if from_node.kind in resid_writer_kinds:
+                if from_node.layer != layer or from_node.kind in ["hook_result", "hook_resid_pre"]:
                     for to_node in nodes_that_receive_resid_directly:
                         circuit.add_edge(from_node, to_node)
 
     last_resid_post_node = CircuitNode(f"blocks.{n_layers - 1}.hook_resid_post")
     circuit.add_node(last_resid_post_node)
     for from_node in list(circuit.nodes):
-        if any([from_node.name.endswith(resid_writer) for resid_writer in resid_writers_filter]):
+        if from_node.kind in resid_writer_kinds:
             circuit.add_edge(from_node, last_resid_post_node)
 
     return circuit
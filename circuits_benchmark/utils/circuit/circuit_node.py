@@ -1,7 +1,75 @@
+from __future__ import annotations
+
+import weakref
+from typing import Tuple
+
+
 class CircuitNode(object):
-    def __init__(self, name: str, index: int | None = None):
-        self.name = name
-        self.index = index
+    """A node in a circuit, identified by the name of a hook or component (e.g., "blocks.1.attn.hook_result") and an
+    optional head index. Nodes are immutable and interned: creating a node with the same name and index returns the same
+    object, so that the hash and the structured fields parsed from the name are computed only once per node. Interned
+    nodes are held by weak references, so nodes that are no longer used are freed.
+
+    Structured fields:
+      - layer: the layer of the node (e.g., 1 for "blocks.1.attn.hook_result"), or None for nodes outside the blocks.
+      - kind: the last component of the name (e.g., "hook_result", "hook_embed", "mlp", "W_Q").
+      - head: the head index, same as index.
+    """
+    __slots__ = ("name", "index", "layer", "kind", "_hash", "__weakref__")
+
+    _interned: weakref.WeakValueDictionary[Tuple[str, int | None], CircuitNode] = weakref.WeakValueDictionary()
+
+    name: str
+    index: int | None
+    layer: int | None
+    kind: str
+
+    def __new__(cls, name: str = None, index: int | None = None):
+        key = (name, index)
+        node = cls._interned.get(key)
+        if node is not None:
+            return node
+
+        node = super().__new__(cls)
+        node._init_fields(name, index)
+        if name is not None:
+            cls._interned[key] = node
+        return node
+
+    def _init_fields(self, name: str, index: int | None):
+        name_parts = name.split(".") if name is not None else [None]
+        is_block_node = len(name_parts) > 2 and name_parts[0] == "blocks" and name_parts[1].isdigit()
+        layer = int(name_parts[1]) if is_block_node else None
+
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "index", index)
+        object.__setattr__(self, "layer", layer)
+        object.__setattr__(self, "kind", name_parts[-1])
+        object.__setattr__(self, "_hash", hash((name, index)))
+
+    @property
+    def head(self) -> int | None:
+        return self.index
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, key):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        # Unpickled nodes are interned again
+        return CircuitNode, (self.name, self.index)
+
+    def __setstate__(self, state):
+        # Nodes pickled before they were interned are restored from their name and index
+        self._init_fields(state["name"], state.get("index"))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __str__(self):
         return f"{self.name}[{self.index}]" if self.index is not None else self.name
@@ -10,13 +78,16 @@ class CircuitNode(object):
         return str(self)
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         if not isinstance(other, CircuitNode):
             return False
 
-        return self.name == other.name and self.index == other.index
+        return self._hash == other._hash and self.name == other.name and self.index == other.index
 
     def __lt__(self, other):
         if not isinstance(other, CircuitNode):
@@ -4,10 +4,14 @@ from circuits_benchmark.utils.circuit.circuit_node import CircuitNode
 
 
 class CircuitNodeView(NodeView):
+    def __init__(self, graph):
+        super().__init__(graph)
+        self._graph = graph
+
     def __contains__(self, item: str | CircuitNode):
         if isinstance(item, str):
-            return any([item == node.name for node in self._nodes])
+            return self._graph.has_node_named(item)
         elif isinstance(item, CircuitNode):
-            return any([item == node for node in self._nodes])
+            return item in self._nodes
         else:
             return False
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from circuits_benchmark.utils.circuit.circuit import Circuit
+from circuits_benchmark.utils.circuit.circuit_granularity import CircuitGranularity
+from circuits_benchmark.utils.circuit.circuit_node import CircuitNode
+
+Edge = Tuple[CircuitNode, CircuitNode]
+
+
+class EdgeIndex(object):
+    """Canonical numbering of the edges (and nodes) of a full circuit. Circuits that are subgraphs of the full circuit
+    can then be represented as boolean masks over the edges (see EdgeMaskCircuit). Edges and nodes are sorted, so the
+    numbering only depends on the edges of the full circuit."""
+
+    def __init__(self, full_circuit: Circuit):
+        self.granularity = full_circuit.granularity
+        self.edges: List[Edge] = sorted(full_circuit.edges)
+        self.nodes: List[CircuitNode] = sorted(full_circuit.nodes)
+        self.edge_ids: Dict[Edge, int] = {edge: i for i, edge in enumerate(self.edges)}
+        self.node_ids: Dict[CircuitNode, int] = {node: i for i, node in enumerate(self.nodes)}
+
+        # ids of the source and destination nodes of each edge
+        self.edge_src_ids = np.array([self.node_ids[u] for u, _ in self.edges], dtype=np.int64)
+        self.edge_dst_ids = np.array([self.node_ids[v] for _, v in self.edges], dtype=np.int64)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edges)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.nodes)
+
+    def get_edges_mask(self, edges: Iterable[Edge]) -> np.ndarray:
+        """Returns the mask of the given edges. Raises a ValueError if an edge is not in the full circuit."""
+        try:
+            edge_ids = np.fromiter((self.edge_ids[edge] for edge in edges), dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"Edge {e.args[0]} is not in the full circuit")
+
+        mask = np.zeros(self.n_edges, dtype=bool)
+        mask[edge_ids] = True
+        return mask
+
+    def get_nodes_mask(self, nodes: Iterable[CircuitNode]) -> np.ndarray:
+        """Returns the mask of the given nodes. Raises a ValueError if a node is not in the full circuit."""
+        try:
+            node_ids = np.fromiter((self.node_ids[node] for node in nodes), dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"Node {e.args[0]} is not in the full circuit")
+
+        mask = np.zeros(self.n_nodes, dtype=bool)
+        mask[node_ids] = True
+        return mask
+
+
+# Edge indices of unprepared full circuits, by (n_layers, n_heads, granularity, use_pos_embed)
+_edge_indices: Dict[Tuple[int, int, CircuitGranularity, bool], EdgeIndex] = {}
+
+
+def get_edge_index(n_layers: int,
+                   n_heads: int,
+                   granularity: CircuitGranularity = "acdc_hooks",
+                   prepare_for_evaluation: bool = False,
+                   use_pos_embed: bool = True,
+                   promote_to_heads: bool = True) -> EdgeIndex:
+    """Returns the edge index of the full circuit for a model with n_layers and n_heads (see get_full_circuit). If
+    prepare_for_evaluation is True, returns the index of the full circuit after prepare_circuit_for_evaluation, which
+    is the same one used for computing TPR and FPR in calculate_fpr_and_tpr (see get_prepared_full_circuit_index).
+    Indices are built once per architecture and shared."""
+    # imported here, since circuit_eval uses edge indices for computing TPR and FPR
+    from circuits_benchmark.utils.circuit.circuit_eval import get_full_circuit, get_prepared_full_circuit_index
+
+    full_circuit = get_full_circuit(n_layers, n_heads, granularity, use_pos_embed)
+    if prepare_for_evaluation:
+        return get_prepared_full_circuit_index(full_circuit, promote_to_heads)
+
+    key = (n_layers, n_heads, granularity, use_pos_embed)
+    if key not in _edge_indices:
+        _edge_indices[key] = EdgeIndex(full_circuit)
+
+    return _edge_indices[key]
+
+
+class EdgeMaskCircuit(object):
+    """A circuit represented as a boolean mask over the edges of an EdgeIndex. Set operations between circuits on the
+    same index (union, intersection, difference and complement) and edge counts are vectorized operations over the
+    masks."""
+
+    def __init__(self, index: EdgeIndex, edges_mask: np.ndarray):
+        assert edges_mask.shape == (index.n_edges,) and edges_mask.dtype == bool, "Invalid edges mask"
+        self.index = index
+        self.edges_mask = edges_mask
+
+    @classmethod
+    def from_circuit(cls, circuit: Circuit, index: EdgeIndex) -> EdgeMaskCircuit:
+        """Builds the mask of a circuit. Raises a ValueError if the circuit has edges that are not in the index."""
+        return cls(index, index.get_edges_mask(circuit.edges))
+
+    @classmethod
+    def empty(cls, index: EdgeIndex) -> EdgeMaskCircuit:
+        return cls(index, np.zeros(index.n_edges, dtype=bool))
+
+    @classmethod
+    def full(cls, index: EdgeIndex) -> EdgeMaskCircuit:
+        return cls(index, np.ones(index.n_edges, dtype=bool))
+
+    def to_circuit(self) -> Circuit:
+        circuit = Circuit(self.index.granularity)
+        circuit.add_edges_from(self.get_edges())
+        return circuit
+
+    def get_edges(self) -> List[Edge]:
+        return [self.index.edges[i] for i in np.flatnonzero(self.edges_mask)]
+
+    def get_nodes_mask(self) -> np.ndarray:
+        """Returns the mask of the nodes that are an endpoint of at least one edge in the circuit."""
+        nodes_mask = np.zeros(self.index.n_nodes, dtype=bool)
+        nodes_mask[self.index.edge_src_ids[self.edges_mask]] = True
+        nodes_mask[self.index.edge_dst_ids[self.edges_mask]] = True
+        return nodes_mask
+
+    def get_nodes(self) -> List[CircuitNode]:
+        return [self.index.nodes[i] for i in np.flatnonzero(self.get_nodes_mask())]
+
+    def count_edges(self) -> int:
+        return int(np.count_nonzero(self.edges_mask))
+
+    def count_nodes(self) -> int:
+        return int(np.count_nonzero(self.get_nodes_mask()))
+
+    def __len__(self):
+        return self.count_edges()
+
+    def __contains__(self, edge: Edge):
+        edge_id = self.index.edge_ids.get(edge)
+        return edge_id is not None and bool(self.edges_mask[edge_id])
+
+    def _check_same_index(self, other: EdgeMaskCircuit):
+        if not isinstance(other, EdgeMaskCircuit):
+            raise ValueError(f"Expected an EdgeMaskCircuit, got {type(other)}")
+        if other.index is not self.index:
+            raise ValueError("Edge mask circuits must share the same edge index")
+
+    def __or__(self, other: EdgeMaskCircuit) -> EdgeMaskCircuit:
+        self._check_same_index(other)
+        return EdgeMaskCircuit(self.index, self.edges_mask | other.edges_mask)
+
+    def __and__(self, other: EdgeMaskCircuit) -> EdgeMaskCircuit:
+        self._check_same_index(other)
+        return EdgeMaskCircuit(self.index, self.edges_mask & other.edges_mask)
+
+    def __sub__(self, other: EdgeMaskCircuit) -> EdgeMaskCircuit:
+        self._check_same_index(other)
+        return EdgeMaskCircuit(self.index, self.edges_mask & ~other.edges_mask)
+
+    def __invert__(self) -> EdgeMaskCircuit:
+        """Returns the edges of the full circuit that are not in this circuit."""
+        return EdgeMaskCircuit(self.index, ~self.edges_mask)
+
+    def __eq__(self, other):
+        if not isinstance(other, EdgeMaskCircuit):
+            return False
+        return self.index is other.index and np.array_equal(self.edges_mask, other.edges_mask)
+
+
+def get_masks_tpr_and_fpr(hypothesis_mask: np.ndarray, true_mask: np.ndarray) -> Tuple[float | str, float | str]:
+    """Returns the TP and FP rates of a hypothesis mask with respect to a true mask over the same (edges or nodes)
+    index. As in calculate_fpr_and_tpr, rates whose denominator is zero are "N/A"."""
+    n_true = int(np.count_nonzero(true_mask))
+    n_false = len(true_mask) - n_true
+    n_true_positives = int(np.count_nonzero(hypothesis_mask & true_mask))
+    n_false_positives = int(np.count_nonzero(hypothesis_mask & ~true_mask))
+
+    tpr = n_true_positives / n_true if n_true > 0 else "N/A"
+    fpr = n_false_positives / n_false if n_false > 0 else "N/A"
+    return tpr, fpr
+
+
+def calculate_edge_mask_fpr_and_tpr(hypothesis_circuit: EdgeMaskCircuit,
+                                    true_circuit: EdgeMaskCircuit) -> Tuple[float | str, float | str]:
+    """Returns the edges TP and FP rates of a hypothesis circuit with respect to the true circuit."""
+    hypothesis_circuit._check_same_index(true_circuit)
+    return get_masks_tpr_and_fpr(hypothesis_circuit.edges_mask, true_circuit.edges_mask)
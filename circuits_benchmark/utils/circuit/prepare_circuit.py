@@ -1,3 +1,5 @@
+from typing import Set, Dict, Tuple
+
 from circuits_benchmark.utils.circuit.circuit import Circuit
 from circuits_benchmark.utils.circuit.circuit_node import CircuitNode
 
@@ -12,6 +14,7 @@ def prepare_circuit_for_evaluation(
     rename_edges_from_embed_to_resid_pre: bool = True,
     remove_embed_to_resid_edges: bool = True,
     remove_ignorable_resid_edges: bool = True,
+    edges_mapping: Dict[Tuple[CircuitNode, CircuitNode], Tuple[CircuitNode, CircuitNode] | None] | None = None,
 ) -> Circuit:
     """
     Prepare the circuit by removing or rerouting specific edges based on the given arguments.
@@ -32,18 +35,24 @@ def prepare_circuit_for_evaluation(
             E.g., removes edges like hook_embed -> hook_resid_post
         remove_ignorable_resid_edges: Remove edges originating from resid nodes that are not the first layer and going to resid nodes or from resid nodes to the last layer
             E.g., removes edges like hook_resid_pre -> hook_resid_post
+        edges_mapping: If given, it is filled with the edge of the prepared circuit that each edge of the original circuit
+            is mapped to (or None if the edge is removed).
 
     Returns:
         The prepared circuit
     """
     # Get nodes that are sinks (leafs) in the circuit, such as blocks.{n_layer-1}.hook_resid_post
-    sink_nodes = [node for node in circuit.nodes if not list(circuit.successors(node))]
+    sink_nodes = set(circuit.get_sink_nodes())
 
     # Get nodes that are sources (roots) in the circuit, such as hook_embed or hook_pos_embed
-    source_nodes = [node for node in circuit.nodes if not list(circuit.predecessors(node))]
+    source_nodes = {node for node, in_degree in circuit.in_degree if in_degree == 0}
 
     new_circuit = Circuit()
-    for from_node, to_node in circuit.edges:
+    for edge in circuit.edges:
+        from_node, to_node = edge
+        if edges_mapping is not None:
+            edges_mapping[edge] = None
+
         # Skip the edge based on the removal criteria
         if remove_edges_from_qkv_inputs and is_qkv_input(from_node):
             continue
@@ -65,40 +74,48 @@ def prepare_circuit_for_evaluation(
 
         if reroute_edges_to_qkv_inputs and is_qkv_input(to_node):
             # directly route incoming edges to head's hook_result
-            to_node = CircuitNode(f"{prefix(to_node.name)}.attn.hook_result", to_node.index)
+            to_node = CircuitNode(f"blocks.{to_node.layer}.attn.hook_result", to_node.index)
         elif reroute_edges_to_mlp_in and is_mlp_in(to_node):
             # directly route incoming edges to mlp_out
-            to_node = CircuitNode(f"{prefix(to_node.name)}.hook_mlp_out")
+            to_node = CircuitNode(f"blocks.{to_node.layer}.hook_mlp_out")
 
         new_circuit.add_edge(from_node, to_node)
+        if edges_mapping is not None:
+            edges_mapping[edge] = (from_node, to_node)
 
     return new_circuit
 
 
+QKV_OUT_KINDS = frozenset(["hook_q", "hook_k", "hook_v"])
+QKV_INPUT_KINDS = frozenset(["hook_q_input", "hook_k_input", "hook_v_input"])
+EMBED_KINDS = frozenset(["hook_embed", "hook_pos_embed"])
+RESID_KINDS = frozenset(["hook_resid_post", "hook_resid_pre"])
+
+
 def is_qkv_out(node: CircuitNode) -> bool:
-    return suffix(node.name) in ["hook_q", "hook_k", "hook_v"]
+    return node.kind in QKV_OUT_KINDS
 
 
 def is_qkv_input(node: CircuitNode) -> bool:
-    return suffix(node.name) in ["hook_q_input", "hook_k_input", "hook_v_input"]
+    return node.kind in QKV_INPUT_KINDS
 
 
 def is_mlp_in(node: CircuitNode) -> bool:
-    return suffix(node.name) == "hook_mlp_in"
+    return node.kind == "hook_mlp_in"
 
 
 def is_embed(node: CircuitNode) -> bool:
-    return suffix(node.name) in ["hook_embed", "hook_pos_embed"]
+    return node.kind in EMBED_KINDS
 
 
 def is_resid(node: CircuitNode) -> bool:
-    return suffix(node.name) in ["hook_resid_post", "hook_resid_pre"]
+    return node.kind in RESID_KINDS
 
 
 def is_ignorable_resid_edge(from_node: CircuitNode,
                             to_node: CircuitNode,
-                            sink_nodes: list[CircuitNode],
-                            source_nodes: list[CircuitNode]) -> bool:
+                            sink_nodes: Set[CircuitNode],
+                            source_nodes: Set[CircuitNode]) -> bool:
     # ignore every edge that comes from resid stream
     # other than edges from first layer (that do not go back to resid stream)
     if is_resid(from_node):
@@ -108,11 +125,3 @@ def is_ignorable_resid_edge(from_node: CircuitNode,
 
     # return False when edges are to the last layer
     return to_node not in sink_nodes and is_resid(to_node)
-
-
-def suffix(node_name: str) -> str:
-    return node_name.split(".")[-1]
-
-
-def prefix(node_name: str) -> str:
-    return ".".join(node_name.split(".")[:-1])
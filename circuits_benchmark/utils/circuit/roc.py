@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Literal, Tuple
+
+import numpy as np
+
+RocSweep = Literal["threshold", "edge_count"]
+
+
+@dataclass
+class RocCurve:
+    """TPR and FPR of the circuits obtained by keeping the edges with the highest scores, for every cutoff of a sweep.
+    Cutoffs are sorted by decreasing threshold (i.e., increasing edge count). The first cutoff is the empty circuit
+    (threshold inf) and the last one the full circuit. The circuit at the i-th cutoff has the edge_counts[i] edges with
+    highest scores, that is, the edges with score >= thresholds[i]."""
+    thresholds: np.ndarray
+    edge_counts: np.ndarray
+    tpr: np.ndarray
+    fpr: np.ndarray
+
+    def get_auc(self) -> float:
+        """Returns the area under the curve, using the trapezoidal rule."""
+        return float(np.sum(np.diff(self.fpr) * (self.tpr[1:] + self.tpr[:-1]) / 2))
+
+    def get_rates_at_threshold(self, threshold: float) -> Tuple[float, float]:
+        """Returns the TPR and FPR of the circuit with the edges whose score is strictly greater than threshold, as
+        built by auto_circuit_utils.build_circuit."""
+        # no edge has a score greater than inf, so that threshold falls on the first cutoff (the empty circuit)
+        i = max(np.searchsorted(-self.thresholds, -threshold, side="left") - 1, 0)
+        return float(self.tpr[i]), float(self.fpr[i])
+
+    def get_rates_at_edge_count(self, edge_count: int) -> Tuple[float, float]:
+        """Returns the TPR and FPR of the circuit with the edge_count edges with highest scores. Raises a ValueError if
+        no cutoff keeps exactly edge_count edges (e.g., for a threshold sweep with ties in the scores)."""
+        i = np.searchsorted(self.edge_counts, edge_count)
+        if i >= len(self.edge_counts) or self.edge_counts[i] != edge_count:
+            raise ValueError(f"No cutoff of the sweep keeps exactly {edge_count} edges")
+        return float(self.tpr[i]), float(self.fpr[i])
+
+
+def get_roc_curve(scores: np.ndarray, true_mask: np.ndarray, sweep: RocSweep = "threshold") -> RocCurve:
+    """Computes the ROC curve of the circuits obtained by thresholding per-edge scores, given the mask of the edges that
+    are in the ground truth circuit (e.g., over an EdgeIndex). Instead of building and evaluating a circuit per cutoff,
+    edges are sorted once by decreasing score, and the true and false positives of every cutoff are cumulative sums
+    over the sorted ground truth mask.
+
+    With sweep="threshold" there is one cutoff per distinct score (tied edges are always kept together). With
+    sweep="edge_count" there is one cutoff per number of edges, and ties are broken by the original order of the edges.
+    Edges with a score of -inf (e.g., edges that no model edge is mapped to, see build_edge_scores) are only kept in the
+    last cutoff, which is always the full circuit. Thresholding at any finite threshold never keeps them."""
+    scores = np.asarray(scores, dtype=np.float64)
+    true_mask = np.asarray(true_mask, dtype=bool)
+    assert scores.shape == true_mask.shape and scores.ndim == 1, "scores and true_mask must be 1-D arrays of equal size"
+
+    order = np.argsort(-scores, kind="stable")
+    sorted_scores = scores[order]
+    true_positives = np.cumsum(true_mask[order])
+    edge_counts = np.arange(1, len(scores) + 1)
+
+    if sweep == "threshold":
+        # keep only the last edge of each group of tied scores
+        is_group_end = np.append(sorted_scores[1:] != sorted_scores[:-1], True)[:len(sorted_scores)]
+        group_ends = np.flatnonzero(is_group_end)
+        sorted_scores, true_positives, edge_counts = \
+            sorted_scores[group_ends], true_positives[group_ends], edge_counts[group_ends]
+    elif sweep != "edge_count":
+        raise ValueError(f"Unknown sweep: {sweep}")
+
+    # add the empty circuit as first cutoff
+    thresholds = np.concatenate([[np.inf], sorted_scores])
+    edge_counts = np.concatenate([[0], edge_counts])
+    true_positives = np.concatenate([[0], true_positives])
+    false_positives = edge_counts - true_positives
+
+    n_true = int(np.count_nonzero(true_mask))
+    n_false = len(true_mask) - n_true
+    tpr = true_positives / n_true if n_true > 0 else np.full(len(edge_counts), np.nan)
+    fpr = false_positives / n_false if n_false > 0 else np.full(len(edge_counts), np.nan)
+
+    return RocCurve(thresholds=thresholds, edge_counts=edge_counts, tpr=tpr, fpr=fpr)
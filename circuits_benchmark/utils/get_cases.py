@@ -1,27 +1,44 @@
+import importlib
 from argparse import Namespace
 from typing import List
 
 from circuits_benchmark.benchmark.benchmark_case import BenchmarkCase
-from circuits_benchmark.utils.find_all_subclasses import find_all_transitive_subclasses_in_package
+from circuits_benchmark.utils.case_index import get_case_index, CaseIndexEntry
 
 
-def get_cases(args: Namespace | None = None, indices: List[str] | None = None) -> List[BenchmarkCase]:
+def get_case_index_entries(args: Namespace | None = None, indices: List[str] | None = None) -> List[CaseIndexEntry]:
+    """Returns the index entries of the cases selected by args.indices or indices (all cases if none is given), sorted
+    by case id. Cases are not imported nor instantiated."""
     assert (args is None or args.indices is None) or indices is None, "Cannot specify both args.indices and indices"
 
-    classes = find_all_transitive_subclasses_in_package(BenchmarkCase, "circuits_benchmark.benchmark.cases")
-    classes = [cls for cls in classes if cls.__name__.startswith("Case")]
+    entries = get_case_index()
 
     if args is not None and args.indices is not None:
         indices = [idx.lower() for idx in args.indices.split(",")]
 
     if indices is not None:
         # filter class names that are "CaseN" where N in indices
-        classes = [cls for cls in classes if cls.__name__[4:].lower() in indices]
+        entries = [entry for entry in entries if entry.case_id in indices]
+
+    # sort by the class name without the "Case" prefix
+    return sorted(entries, key=lambda entry: entry.class_name[4:])
+
 
-    # sort classes. if id is a number, numerically, otherwise alphabetically
-    classes.sort(key=lambda cls:
-    cls.__name__[4:] if cls.__name__[4:].isnumeric() else cls.__name__[4:]
-                 )
+def get_case_ids(args: Namespace | None = None, indices: List[str] | None = None) -> List[str]:
+    """Returns the ids of the selected cases (e.g., "3" or "ioi"), without importing them."""
+    return [entry.case_id for entry in get_case_index_entries(args, indices)]
 
-    # instantiate all classes found
-    return [cls() for cls in classes]
+
+def get_cases(args: Namespace | None = None, indices: List[str] | None = None) -> List[BenchmarkCase]:
+    """Returns instances of the selected cases. Only the modules of the selected cases are imported."""
+    cases = []
+    for entry in get_case_index_entries(args, indices):
+        try:
+            module = importlib.import_module(entry.module)
+        except ModuleNotFoundError:
+            # same as when looking for subclasses: cases whose dependencies are missing are skipped
+            continue
+
+        cases.append(getattr(module, entry.class_name)())
+
+    return cases
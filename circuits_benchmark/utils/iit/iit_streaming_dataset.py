@@ -0,0 +1,45 @@
+from typing import Iterator, Tuple
+
+import torch as t
+from torch.utils.data import IterableDataset, DataLoader
+
+from circuits_benchmark.benchmark.tracr_encoded_dataset import TracrEncodedDataset
+from circuits_benchmark.benchmark.tracr_streaming_dataset import TracrStreamingDataset
+from circuits_benchmark.utils.iit.iit_dataset_batch import IITDatasetBatch, BaseData, AblationData
+
+
+class IITStreamingDataset(IterableDataset):
+    """Streaming counterpart of iit's IITDataset: pairs each base sample with an ablation sample. Instead of picking the
+    ablation samples at random from a materialized dataset, they are taken from a second stream of random samples
+    (sampled with a different seed), so neither of the two datasets is held in memory."""
+
+    def __init__(self, base_data: TracrStreamingDataset, ablation_data: TracrStreamingDataset):
+        assert len(ablation_data) >= len(base_data), "There must be at least one ablation sample per base sample"
+        self.base_data = base_data
+        self.ablation_data = ablation_data
+
+    def __len__(self):
+        return len(self.base_data)
+
+    def __iter__(self) -> Iterator[Tuple[BaseData, AblationData]]:
+        return zip(iter(self.base_data), iter(self.ablation_data))
+
+    @staticmethod
+    def collate_fn(batch, device: t.device = t.device("cuda") if t.cuda.is_available() else t.device("cpu")) \
+            -> IITDatasetBatch:
+        base_data, ablation_data = zip(*batch)
+        return (TracrEncodedDataset.collate_fn(base_data, device=device),
+                TracrEncodedDataset.collate_fn(ablation_data, device=device))
+
+    def make_loader(
+        self,
+        batch_size: int,
+        num_workers: int = 0,
+        device: str | t.device = t.device("cuda") if t.cuda.is_available() else t.device("cpu"),
+    ) -> DataLoader:
+        return DataLoader(
+            self,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            collate_fn=lambda x: self.collate_fn(x, device=device),
+        )
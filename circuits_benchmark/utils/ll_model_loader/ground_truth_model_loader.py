@@ -25,6 +25,6 @@ class GroundTruthModelLoader(LLModelLoader):
     ) -> Tuple[Correspondence, HookedTransformer]:
         assert not same_size, "Ground truth models are never same size"
 
-        hl_model = self.case.get_hl_model(device=device)
+        hl_model = self.case.get_hl_model(device=device, clone=True)  # it will be used as a LL model
         corr = self.case.get_correspondence(same_size=True)  # tracr models are always same size
         return corr, hl_model
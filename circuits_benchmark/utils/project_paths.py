@@ -2,6 +2,8 @@ import os
 
 PROJECT_ROOT: str | None = None
 
+CACHE_DIR_ENV_VAR = "CIRCUITS_BENCHMARK_CACHE_DIR"
+
 
 def detect_project_root() -> str:
     """
@@ -31,3 +33,16 @@ def get_default_output_dir() -> str:
     :return: the default output directory for the project.
     """
     return str(os.path.join(detect_project_root(), "results"))
+
+
+def get_default_cache_dir() -> str:
+    """
+    Get the default directory for on-disk caches (compiled Tracr programs, datasets, etc.). It can be overridden with
+    the CIRCUITS_BENCHMARK_CACHE_DIR environment variable (e.g., to keep tests from writing inside the project).
+    :return: the default cache directory for the project.
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if cache_dir:
+        return cache_dir
+
+    return str(os.path.join(get_default_output_dir(), "cache"))
@@ -2,25 +2,27 @@
 import logging
 import sys
 
-import jax
-
 from circuits_benchmark.commands.build_main_parser import build_main_parser
-from circuits_benchmark.commands.algorithms import run_algorithm
-from circuits_benchmark.commands.train import train
-from circuits_benchmark.commands.evaluation import evaluation
 
-# The default of float16 can lead to discrepancies between outputs of
-# the compiled model and the RASP program.
-jax.config.update('jax_default_matmul_precision', 'float32')
 logging.basicConfig(level=logging.ERROR)
 
 if __name__ == "__main__":
   parser = build_main_parser()
   args, _ = parser.parse_known_args(sys.argv[1:])
 
+  # Heavy modules (jax, and the modules of each command) are imported only once we know which command to run.
+  import jax
+
+  # The default of float16 can lead to discrepancies between outputs of
+  # the compiled model and the RASP program.
+  jax.config.update('jax_default_matmul_precision', 'float32')
+
   if args.command == "run":
+    from circuits_benchmark.commands.algorithms import run_algorithm
     run_algorithm.run(args)
   elif args.command == "train":
+    from circuits_benchmark.commands.train import train
     train.run(args)
   elif args.command == "eval":
+    from circuits_benchmark.commands.evaluation import evaluation
     evaluation.run(args)
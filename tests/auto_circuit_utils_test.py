@@ -0,0 +1,52 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+import torch as t
+
+from circuits_benchmark.utils.auto_circuit_utils import build_circuit, build_edge_scores
+from circuits_benchmark.utils.circuit.circuit import Circuit
+from circuits_benchmark.utils.circuit.circuit_eval import get_full_circuit, calculate_fpr_and_tpr
+from circuits_benchmark.utils.circuit.edge_mask import get_edge_index, EdgeMaskCircuit
+from circuits_benchmark.utils.circuit.prepare_circuit import prepare_circuit_for_evaluation
+from circuits_benchmark.utils.circuit.roc import get_roc_curve
+
+
+def build_fake_model_and_scores(full_circuit: Circuit, rng: random.Random):
+    """Returns an object with the edges of the full circuit, as the ones of an auto_circuit PatchableModel, and
+    attribution scores for them (with ties)."""
+    edges = []
+    scores = {}
+    for src, dst in sorted(full_circuit.edges):
+        dst_scores = scores.setdefault(dst.name, [])
+        edges.append(SimpleNamespace(src=SimpleNamespace(module_name=src.name, head_idx=src.index),
+                                     dest=SimpleNamespace(module_name=dst.name, head_idx=dst.index),
+                                     patch_idx=len(dst_scores)))
+        dst_scores.append(rng.randint(-5, 5) / 5)
+
+    attribution_scores = {module_name: t.tensor(module_scores, dtype=t.float64)
+                          for module_name, module_scores in scores.items()}
+    return SimpleNamespace(edges=edges), attribution_scores
+
+
+class TestBuildEdgeScores:
+    @pytest.mark.parametrize("abs_val_threshold", [False, True])
+    def test_roc_curve_matches_thresholded_circuits(self, abs_val_threshold):
+        rng = random.Random(0)
+        full_circuit = get_full_circuit(2, 2)
+        model, attribution_scores = build_fake_model_and_scores(full_circuit, rng)
+
+        true_circuit = Circuit()
+        true_circuit.add_edges_from(rng.sample(sorted(full_circuit.edges), 15))
+
+        index = get_edge_index(2, 2, prepare_for_evaluation=True)
+        edge_scores = build_edge_scores(model, attribution_scores, index, abs_val_threshold=abs_val_threshold)
+        true_mask = EdgeMaskCircuit.from_circuit(prepare_circuit_for_evaluation(true_circuit), index).edges_mask
+        curve = get_roc_curve(edge_scores, true_mask)
+
+        for threshold in [-2, -0.5, 0, 0.1, 0.6, 1]:
+            hypothesis_circuit = build_circuit(model, attribution_scores, threshold,
+                                               abs_val_threshold=abs_val_threshold)
+            result = calculate_fpr_and_tpr(hypothesis_circuit, true_circuit, full_circuit, print_summary=False)
+
+            assert curve.get_rates_at_threshold(threshold) == pytest.approx((result.edges.tpr, result.edges.fpr))
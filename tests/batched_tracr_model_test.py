@@ -0,0 +1,70 @@
+import random
+
+import jax
+import numpy as np
+import torch as t
+from tracr.compiler import compiling
+from tracr.rasp import rasp
+
+from circuits_benchmark.benchmark.cases.case_3 import Case3
+from circuits_benchmark.benchmark.common_programs import make_reverse
+from circuits_benchmark.benchmark.vocabs import TRACR_BOS, TRACR_PAD
+from circuits_benchmark.transformers.batched_tracr_model import BatchedTracrModel, check_tracr_equivalence
+from circuits_benchmark.transformers.hooked_tracr_transformer import HookedTracrTransformer
+
+# The default of float16 can lead to discrepancies between outputs of
+# the compiled model and the RASP program.
+jax.config.update('jax_default_matmul_precision', 'float32')
+
+
+def compile_reverse_model():
+    return compiling.compile_rasp_to_model(
+        make_reverse(rasp.tokens),
+        vocab={1, 2, 3},
+        max_seq_len=5,
+        compiler_bos=TRACR_BOS,
+        compiler_pad=TRACR_PAD,
+    ).model
+
+
+class TestBatchedTracrModel:
+    def test_batched_outputs_match_apply(self):
+        tracr_model = compile_reverse_model()
+        rng = random.Random(0)
+        inputs = [[TRACR_BOS] + [rng.choice([1, 2, 3]) for _ in range(rng.randint(1, 5))] for _ in range(20)]
+
+        batched_outputs = BatchedTracrModel(tracr_model, batch_size=8).apply(inputs)
+        max_len = max(len(input) for input in inputs)
+        for input, batched_output in zip(inputs, batched_outputs):
+            padded_input = input + [TRACR_PAD] * (max_len - len(input))
+            assert batched_output == tracr_model.apply(padded_input).decoded
+
+    def test_numerical_batched_outputs_match_apply(self):
+        case = Case3()
+        tracr_model = case.get_tracr_output().model
+        inputs = case.get_clean_data(max_samples=20, encoded_dataset=False).get_inputs()
+
+        batched_outputs = BatchedTracrModel(tracr_model, batch_size=8).apply(inputs)
+        for input, batched_output in zip(inputs, batched_outputs):
+            expected_output = tracr_model.apply(input).decoded
+            assert batched_output[0] == expected_output[0] == TRACR_BOS
+            assert np.allclose(batched_output[1:], expected_output[1:], atol=1.e-5)
+
+    def test_hooked_tracr_transformer_is_equivalent_to_tracr_model(self):
+        case = Case3()
+        tracr_model = case.get_tracr_output().model
+        inputs = case.get_clean_data(max_samples=2000, encoded_dataset=False).get_inputs()
+
+        result = check_tracr_equivalence(tracr_model, case.get_hl_model(), inputs, atol=1.e-3)
+        assert result.n_inputs == len(inputs)
+        assert result.is_equivalent, f"Mismatching inputs: {result.mismatching_indices[:10]}"
+
+    def test_detects_mismatching_outputs(self):
+        tracr_model = compile_reverse_model()
+        hl_model = HookedTracrTransformer.from_tracr_model(tracr_model, device=t.device("cpu"))
+        with t.no_grad():
+            hl_model.unembed.W_U.copy_(hl_model.unembed.W_U.flip(dims=[-1]))
+
+        inputs = [[TRACR_BOS, 1, 2, 3, 1, 2], [TRACR_BOS, 3, 3, 3, 3, 3]]
+        result = check_tracr_equivalence(tracr_model, hl_model, inputs)
+        assert not result.is_equivalent
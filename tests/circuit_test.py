@@ -1,8 +1,15 @@
+import gc
 import unittest
 
+import networkx as nx
+
 from circuits_benchmark.benchmark.cases.case_21 import Case21
 from circuits_benchmark.benchmark.cases.case_3 import Case3
 from circuits_benchmark.transformers.tracr_circuits_builder import build_tracr_circuits
+from circuits_benchmark.utils.circuit.circuit import Circuit
+from circuits_benchmark.utils.circuit.circuit_eval import get_full_circuit, get_prepared_full_circuit_index
+from circuits_benchmark.utils.circuit.circuit_node import CircuitNode
+from circuits_benchmark.utils.circuit.prepare_circuit import prepare_circuit_for_evaluation
 
 
 class CircuitTest(unittest.TestCase):
@@ -127,3 +134,73 @@ class CircuitTest(unittest.TestCase):
         tracr_circuits = build_tracr_circuits(tacr_output.graph, tacr_output.craft_model, granularity="acdc_hooks")
         for k, v in tracr_circuits.alignment.hl_to_ll_mapping.items():
             self.assertIsInstance(k, str)
+
+    def test_node_index_stays_in_sync_with_graph_mutations(self):
+        circuit = Circuit()
+        circuit.add_edge(CircuitNode("hook_embed"), CircuitNode("blocks.0.attn.hook_result", 0))
+        circuit.add_edge(CircuitNode("hook_embed"), CircuitNode("blocks.0.attn.hook_result", 1))
+        circuit.add_edges_from([(CircuitNode("blocks.0.attn.hook_result", i), CircuitNode("blocks.0.hook_resid_post"))
+                                for i in range(2)])
+
+        self.assertIn("blocks.0.attn.hook_result", circuit.nodes)
+        self.assertIn(CircuitNode("blocks.0.attn.hook_result", 1), circuit.nodes)
+        self.assertEqual(sorted(circuit.get_nodes_by_name("blocks.0.attn.hook_result")),
+                         [CircuitNode("blocks.0.attn.hook_result", 0), CircuitNode("blocks.0.attn.hook_result", 1)])
+        self.assertEqual(circuit.get_result_node(), CircuitNode("blocks.0.hook_resid_post"))
+
+        copy = circuit.copy()
+        circuit.remove_node(CircuitNode("blocks.0.hook_resid_post"))
+        circuit.remove_nodes_from([CircuitNode("blocks.0.attn.hook_result", i) for i in range(2)])
+        self.assertNotIn("blocks.0.attn.hook_result", circuit.nodes)
+        self.assertEqual(circuit.get_result_node(), CircuitNode("hook_embed"))
+
+        self.assertIn("blocks.0.attn.hook_result", copy.nodes)
+        self.assertEqual(copy.get_result_node(), CircuitNode("blocks.0.hook_resid_post"))
+
+    def test_circuit_nodes_are_interned_and_structured(self):
+        node = CircuitNode("blocks.1.attn.hook_result", 0)
+
+        self.assertIs(node, CircuitNode("blocks.1.attn.hook_result", 0))
+        self.assertIsNot(node, CircuitNode("blocks.1.attn.hook_result", 1))
+        self.assertEqual((node.layer, node.kind, node.head), (1, "hook_result", 0))
+        self.assertEqual((CircuitNode("hook_embed").layer, CircuitNode("hook_embed").kind), (None, "hook_embed"))
+
+        with self.assertRaises(AttributeError):
+            node.index = 1
+
+    def test_unused_circuit_nodes_are_not_kept_interned(self):
+        node = CircuitNode("blocks.7.attn.hook_unused", 3)
+        self.assertIn(("blocks.7.attn.hook_unused", 3), CircuitNode._interned)
+
+        del node
+        gc.collect()
+        self.assertNotIn(("blocks.7.attn.hook_unused", 3), CircuitNode._interned)
+
+    def test_full_circuit_is_built_once_and_frozen(self):
+        full_circuit = get_full_circuit(2, 2)
+
+        self.assertIs(full_circuit, get_full_circuit(2, 2, "acdc_hooks", True))
+        self.assertIsNot(full_circuit, get_full_circuit(2, 2, use_pos_embed=False))
+        self.assertIn("blocks.0.hook_resid_pre", get_full_circuit(2, 2, use_pos_embed=False).nodes)
+        with self.assertRaises(nx.NetworkXError):
+            full_circuit.add_edge(CircuitNode("hook_embed"), CircuitNode("blocks.1.hook_resid_post"))
+
+        circuit = full_circuit.copy()
+        circuit.remove_node(CircuitNode("hook_pos_embed"))
+        self.assertIn(CircuitNode("hook_pos_embed"), full_circuit.nodes)
+
+    def test_full_circuit_rejects_unsupported_granularities(self):
+        with self.assertRaises(ValueError):
+            get_full_circuit(2, 2, "component")
+
+    def test_prepared_full_circuit_index_is_built_once_per_full_circuit(self):
+        full_circuit = get_full_circuit(2, 2)
+        index = get_prepared_full_circuit_index(full_circuit)
+
+        self.assertIs(index, get_prepared_full_circuit_index(full_circuit, promote_to_heads=True))
+        self.assertIsNot(index, get_prepared_full_circuit_index(full_circuit, promote_to_heads=False))
+        self.assertEqual(set(index.edges), set(prepare_circuit_for_evaluation(full_circuit).edges))
+
+        # circuits that can be modified are prepared on every call
+        circuit = full_circuit.copy()
+        self.assertIsNot(get_prepared_full_circuit_index(circuit), get_prepared_full_circuit_index(circuit))
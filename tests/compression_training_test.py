@@ -49,6 +49,24 @@ class TestCompressionTraining:
                                                         "--device=" + ("cuda" if t.cuda.is_available() else "cpu")])
         train.run(args)
 
+    def test_non_linear_compression_works_with_streamed_data(self):
+        args, _ = build_main_parser().parse_known_args(["train",
+                                                        "non-linear-compression",
+                                                        "-i=2,3",
+                                                        "--d-model=8",
+                                                        "--max-train-samples=10",
+                                                        "--min-train-samples=10",
+                                                        "--test-data-ratio=0.3",
+                                                        "--stream-train-data=True",
+                                                        "--train-data-shard-size=4",
+                                                        "--epochs=1",
+                                                        "--ae-epochs=2",
+                                                        "--ae-max-train-samples=5",
+                                                        "--resample-ablation-test-loss=True",
+                                                        "--resample-ablation-max-interventions=1",
+                                                        "--device=" + ("cuda" if t.cuda.is_available() else "cpu")])
+        train.run(args)
+
     @pytest.mark.parametrize("case", [Case1(), Case32(), Case19()])
     def test_siia_is_not_nan_for_models_that_have_all_nodes_in_circuit(self, case):
         hl_model: HookedTracrTransformer = case.get_hl_model()
@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+from circuits_benchmark.utils.project_paths import CACHE_DIR_ENV_VAR
+
+
+@pytest.fixture(scope="session", autouse=True)
+def tmp_cache_dir(tmp_path_factory):
+    """Keeps the on-disk caches (compiled Tracr programs, datasets, truth tables) of the test session in a temporary
+    directory, instead of the results folder of the project."""
+    previous_cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    os.environ[CACHE_DIR_ENV_VAR] = str(tmp_path_factory.mktemp("cache"))
+    yield os.environ[CACHE_DIR_ENV_VAR]
+
+    if previous_cache_dir is None:
+        del os.environ[CACHE_DIR_ENV_VAR]
+    else:
+        os.environ[CACHE_DIR_ENV_VAR] = previous_cache_dir
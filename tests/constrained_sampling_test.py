@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from circuits_benchmark.benchmark.constrained_sampling import SampleGroup, sample_group_codes, split_count, \
+    get_token_mask
+
+
+class TestConstrainedSampling:
+    def test_split_count_adds_up(self):
+        assert split_count(100, [0.15, 0.15, 0.7]) == [15, 15, 70]
+        assert split_count(7, [0.5, 0.5]) == [4, 3]
+        assert sum(split_count(1001, [1, 2, 3])) == 1001
+
+    def test_accepted_samples_satisfy_predicate(self):
+        np.random.seed(0)
+
+        def first_token_is_zero(codes, lengths):
+            return codes[:, 0] == 0
+
+        lengths, codes = sample_group_codes(SampleGroup(1, accept=first_token_is_zero), 500, 5, 3, 6)
+
+        assert len(lengths) == len(codes) == 500
+        assert (codes[:, 0] == 0).all()
+        assert ((lengths >= 2) & (lengths <= 5)).all()
+        assert (codes[~get_token_mask(lengths, 5)] == 0).all()
+
+    def test_generated_samples_are_used(self):
+        np.random.seed(0)
+        group = SampleGroup(1, generate=lambda lengths, max_len: np.full((len(lengths), max_len), 3))
+
+        lengths, codes = sample_group_codes(group, 10, 5, 4, 4)
+
+        assert (codes == 3).all()
+
+    def test_unsatisfiable_group_raises(self):
+        group = SampleGroup(1, accept=lambda codes, lengths: np.zeros(len(codes), dtype=bool))
+
+        with pytest.raises(ValueError):
+            sample_group_codes(group, 10, 5, 4, 4, max_rounds=3)
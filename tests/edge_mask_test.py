@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from circuits_benchmark.utils.circuit.circuit import Circuit
+from circuits_benchmark.utils.circuit.circuit_eval import get_full_circuit, get_prepared_full_circuit_index
+from circuits_benchmark.utils.circuit.edge_mask import get_edge_index, EdgeMaskCircuit, calculate_edge_mask_fpr_and_tpr
+from circuits_benchmark.utils.circuit.prepare_circuit import prepare_circuit_for_evaluation
+
+
+def sample_circuit(edges, n_edges, rng):
+    circuit = Circuit()
+    circuit.add_edges_from(rng.sample(edges, n_edges))
+    return circuit
+
+
+class TestEdgeMask:
+    def test_edge_index_is_shared_per_architecture(self):
+        index = get_edge_index(2, 2)
+
+        assert index is get_edge_index(2, 2)
+        assert index is not get_edge_index(2, 3)
+        assert set(index.edges) == set(get_full_circuit(2, 2).edges)
+
+    def test_prepared_edge_index_is_the_one_used_for_evaluation(self):
+        index = get_edge_index(2, 2, prepare_for_evaluation=True)
+
+        assert index is get_prepared_full_circuit_index(get_full_circuit(2, 2))
+        assert index.granularity == "acdc_hooks"
+
+    def test_set_operations_match_circuit_edges(self):
+        index = get_edge_index(2, 2, prepare_for_evaluation=True)
+        edges = sorted(prepare_circuit_for_evaluation(get_full_circuit(2, 2)).edges)
+        rng = random.Random(0)
+        hypothesis = sample_circuit(edges, 10, rng)
+        true = sample_circuit(edges, 8, rng)
+
+        hypothesis_mask = EdgeMaskCircuit.from_circuit(hypothesis, index)
+        true_mask = EdgeMaskCircuit.from_circuit(true, index)
+
+        assert set((hypothesis_mask | true_mask).get_edges()) == set(hypothesis.edges) | set(true.edges)
+        assert set((hypothesis_mask & true_mask).get_edges()) == set(hypothesis.edges) & set(true.edges)
+        assert set((hypothesis_mask - true_mask).get_edges()) == set(hypothesis.edges) - set(true.edges)
+        assert len(~hypothesis_mask) == len(edges) - 10
+        assert set(hypothesis_mask.to_circuit().edges) == set(hypothesis.edges)
+        assert set(hypothesis_mask.get_nodes()) == set(hypothesis.nodes)
+
+        tpr, fpr = calculate_edge_mask_fpr_and_tpr(hypothesis_mask, true_mask)
+        true_positives = set(hypothesis.edges) & set(true.edges)
+        assert tpr == len(true_positives) / 8
+        assert fpr == (10 - len(true_positives)) / (len(edges) - 8)
+
+    def test_rejects_edges_outside_of_full_circuit(self):
+        index = get_edge_index(2, 2, prepare_for_evaluation=True)
+
+        with pytest.raises(ValueError):
+            EdgeMaskCircuit.from_circuit(get_full_circuit(2, 2), index)
@@ -1,7 +1,10 @@
+import os
+import tempfile
 import unittest
 
 from circuits_benchmark.utils.attr_dict import AttrDict
-from circuits_benchmark.utils.get_cases import get_cases
+from circuits_benchmark.utils.case_index import get_case_index, CaseIndexEntry
+from circuits_benchmark.utils.get_cases import get_cases, get_case_ids
 
 
 class GetCasesTest(unittest.TestCase):
@@ -25,3 +28,26 @@ class GetCasesTest(unittest.TestCase):
         args = AttrDict({"indices": "ioi,ioi_next_token"})
         cases = get_cases(args)
         self.assertEqual(len(cases), 2)
+
+    def test_case_ids_are_listed_without_importing_cases(self):
+        case_ids = get_case_ids(indices=["3", "37", "ioi"])
+        self.assertEqual(case_ids, ["3", "37", "ioi"])
+
+    def test_case_index_is_rebuilt_when_cases_change(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cases_dir = os.path.join(tmp_dir, "cases")
+            os.makedirs(cases_dir)
+            index_path = os.path.join(tmp_dir, "case_index.json")
+
+            with open(os.path.join(cases_dir, "case_a.py"), "w") as f:
+                f.write("class CaseA(TracrBenchmarkCase):\n    pass\n")
+
+            entries = get_case_index(cases_dir=cases_dir, package_name="pkg", index_path=index_path)
+            self.assertEqual(entries, [CaseIndexEntry(case_id="a", module="pkg.case_a", class_name="CaseA")])
+            self.assertTrue(os.path.exists(index_path))
+
+            with open(os.path.join(cases_dir, "case_b.py"), "w") as f:
+                f.write("class CaseB(CaseA):\n    pass\n\nclass Helper(object):\n    pass\n")
+
+            entries = get_case_index(cases_dir=cases_dir, package_name="pkg", index_path=index_path)
+            self.assertEqual([entry.case_id for entry in entries], ["a", "b"])
@@ -1,7 +1,11 @@
 from typing import List
 
+import numpy as np
+
 from circuits_benchmark.benchmark.cases.case_1 import Case1
 from circuits_benchmark.benchmark.cases.case_3 import Case3
+from circuits_benchmark.benchmark.cases.case_5 import Case5
+from circuits_benchmark.benchmark.tracr_benchmark_case import sample_without_replacement
 
 
 class TestGetCleanData:
@@ -30,3 +34,53 @@ class TestGetCleanData:
         assert len([o for o in encoded_outputs if o.count(0) == len(o)]) == 15
         assert len([o for o in encoded_outputs if o.count(1) == len(o)]) == 15
         assert len([o for o in encoded_outputs if o.count(0) != len(o) and o.count(1) != len(o)]) == 70
+
+    def test_case_5_should_have_balanced_inputs(self):
+        case = Case5()
+        data = case.get_clean_data(max_samples=100, encoded_dataset=False)
+
+        # the output is the same for all positions: 1 if the input is balanced, 0 otherwise
+        labels = [o[1] for o in data.get_targets()]
+        assert labels.count(1) == 50
+        assert labels.count(0) == 50
+
+    def test_gen_all_data_enumerates_inputs_in_order(self):
+        case = Case3()
+        inputs, outputs = case.gen_all_data(4, 5)
+
+        assert len(inputs) == case.get_total_data_len()
+        assert inputs[0] == ["BOS", "a", "a", "a", "PAD"]
+        assert inputs[1] == ["BOS", "a", "a", "b", "PAD"]
+        assert inputs[-1] == ["BOS", "x", "x", "x", "x"]
+        assert outputs[0][-1] == "PAD"
+
+    def test_gen_all_data_can_shuffle_and_slice_before_labelling(self):
+        case = Case3()
+        all_inputs, _ = case.gen_all_data(4, 5)
+        inputs, outputs = case.gen_all_data(4, 5, n_samples=7, shuffle=True)
+
+        assert len(inputs) == len(outputs) == 7
+        assert all(input in all_inputs for input in inputs)
+
+    def test_sample_without_replacement_returns_distinct_indices(self):
+        for total, n_samples in [(10, 10), (10, 3), (10_000, 50), (2 ** 40, 1000)]:
+            indices = sample_without_replacement(total, n_samples)
+
+            assert len(indices) == len(np.unique(indices)) == n_samples
+            assert indices.min() >= 0 and indices.max() < total
+
+    def test_unique_data_has_no_duplicates_and_is_topped_up(self):
+        case = Case3()
+        data = case.get_clean_data(max_samples=200, unique_data=True, encoded_dataset=False)
+        inputs = [tuple(input) for input in data.get_inputs()]
+
+        assert len(inputs) == 200
+        assert len(set(inputs)) == 200
+
+    def test_unique_data_is_limited_by_total_data_len(self):
+        case = Case3()
+        data = case.get_clean_data(min_samples=None, max_samples=300, unique_data=True, encoded_dataset=False)
+        inputs = [tuple(input) for input in data.get_inputs()]
+
+        # all fixed-length inputs for a vocab of 4 tokens and 4 positions
+        assert len(set(inputs)) == len(inputs) == case.get_total_data_len(5, 5) == 256
@@ -2,6 +2,8 @@ import logging
 import unittest
 
 import jax
+import numpy as np
+import torch
 from tracr.compiler import compiling
 from tracr.rasp import rasp
 
@@ -41,3 +43,61 @@ class HookedTracrTransformerTest(unittest.TestCase):
         print("TransformerLens Replicated Decoding:", tl_output_decoded)
 
         self.assertEqual(tracr_output_decoded, tl_output_decoded)
+
+    def test_batch_input_encoding(self):
+        tracr_output = compiling.compile_rasp_to_model(
+            make_reverse(rasp.tokens),
+            vocab={"a", "b", "c"},
+            max_seq_len=4,
+            compiler_bos=TRACR_BOS,
+            compiler_pad=TRACR_PAD,
+        )
+        tl_model = HookedTracrTransformer.from_tracr_model(tracr_output.model)
+        input_encoder = tracr_output.model.input_encoder
+
+        inputs = [[TRACR_BOS, "a", "b", "c", TRACR_PAD], [TRACR_BOS, "c", "c"]]
+        padded_inputs = [inputs[0], inputs[1] + [TRACR_PAD, TRACR_PAD]]
+        expected_encoding = [input_encoder.encode(input) for input in padded_inputs]
+
+        self.assertEqual(tl_model.map_tracr_input_to_tl_input(inputs).tolist(), expected_encoding)
+        self.assertEqual(tl_model.map_tracr_input_to_tl_input(np.array(padded_inputs)).tolist(), expected_encoding)
+        self.assertEqual(tl_model.map_tracr_input_to_tl_input(np.array(padded_inputs, dtype=object)).tolist(),
+                         expected_encoding)
+
+        with self.assertRaises(ValueError):
+            tl_model.map_tracr_input_to_tl_input([[TRACR_BOS, "d"]])
+
+    def test_typed_output_decoding(self):
+        tracr_output = compiling.compile_rasp_to_model(
+            make_reverse(rasp.tokens),
+            vocab={1, 2, 3},
+            max_seq_len=4,
+            compiler_bos=TRACR_BOS,
+            compiler_pad=TRACR_PAD,
+        )
+        tl_model = HookedTracrTransformer.from_tracr_model(tracr_output.model)
+
+        inputs = [[TRACR_BOS, 1, 2, 3, 3], [TRACR_BOS, 3, 1, 1, 2]]
+        typed_outputs = tl_model(inputs, return_type="typed")
+
+        self.assertIsInstance(typed_outputs, torch.Tensor)
+        self.assertEqual(typed_outputs.tolist(), [[3, 3, 2, 1], [2, 1, 1, 3]])
+        self.assertEqual(tl_model(inputs, return_type="decoded"),
+                         [tracr_output.model.apply(input).decoded for input in inputs])
+
+    def test_mixed_int_and_float_outputs_keep_their_types(self):
+        tracr_output = compiling.compile_rasp_to_model(
+            make_reverse(rasp.tokens),
+            vocab={1, 2.5, 3},
+            max_seq_len=4,
+            compiler_bos=TRACR_BOS,
+            compiler_pad=TRACR_PAD,
+        )
+        tl_model = HookedTracrTransformer.from_tracr_model(tracr_output.model)
+
+        inputs = [[TRACR_BOS, 1, 2.5, 3, 3], [TRACR_BOS, 3, 1, 1, 2.5]]
+        decoded_outputs = tl_model(inputs, return_type="decoded")
+
+        self.assertEqual(decoded_outputs, [tracr_output.model.apply(input).decoded for input in inputs])
+        self.assertEqual([type(value) for value in decoded_outputs[0][1:]], [int, int, float, int])
+        self.assertIs(tl_model.get_output_values_table(), tl_model.get_output_values_table())
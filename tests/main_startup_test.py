@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+from circuits_benchmark.utils.project_paths import detect_project_root
+
+HEAVY_MODULES = ["jax", "torch", "wandb", "transformer_lens", "iit", "acdc", "auto_circuit", "matplotlib"]
+
+
+def run_and_list_heavy_modules(code: str) -> subprocess.CompletedProcess:
+    """Runs code in a fresh interpreter, and prints to stderr the heavy modules that were imported by it."""
+    code += ("\nimport sys\n"
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)\n")
+    return subprocess.run([sys.executable, "-c", code], cwd=detect_project_root(),
+                          capture_output=True, text=True, env={**os.environ, "PYTHONPATH": detect_project_root()})
+
+
+class TestMainStartup:
+    def test_help_does_not_import_heavy_modules(self):
+        code = ("import runpy, sys\n"
+                "sys.argv = ['main.py', '--help']\n"
+                "try:\n"
+                "    runpy.run_path('main.py', run_name='__main__')\n"
+                "except SystemExit as e:\n"
+                "    assert not e.code, e.code\n")
+        result = run_and_list_heavy_modules(code)
+
+        assert result.returncode == 0, result.stderr
+        assert "{run,train,eval}" in result.stdout
+        assert result.stderr.strip() == ""
+
+    def test_building_main_parser_does_not_import_heavy_modules(self):
+        code = ("from circuits_benchmark.commands.build_main_parser import build_main_parser\n"
+                "build_main_parser()\n")
+        result = run_and_list_heavy_modules(code)
+
+        assert result.returncode == 0, result.stderr
+        assert result.stderr.strip() == ""
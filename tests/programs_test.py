@@ -15,6 +15,7 @@ from circuits_benchmark.benchmark.cases.case_90 import make_token_replacer
 from circuits_benchmark.benchmark.common_programs import make_unique_token_extractor, detect_pattern
 from circuits_benchmark.benchmark.tracr_benchmark_case import TracrBenchmarkCase
 from circuits_benchmark.benchmark.vocabs import TRACR_BOS, TRACR_PAD
+from circuits_benchmark.transformers.batched_tracr_model import BatchedTracrModel
 from circuits_benchmark.utils.circleci import is_running_in_circleci, get_circleci_cases_percentage
 from circuits_benchmark.utils.get_cases import get_cases
 
@@ -69,12 +70,19 @@ class ProgramsTest(unittest.TestCase):
         expected_outputs = dataset.get_targets()
 
         is_categorical = isinstance(tracr_model.output_encoder, CategoricalEncoder)
+        decoded_outputs = BatchedTracrModel(tracr_model).apply(inputs)
+
+        # cross-check the batched outputs against the reference tracr_model.apply on a sample of the inputs
+        for i in random.Random(len(inputs)).sample(range(len(inputs)), min(3, len(inputs))):
+            reference_output = tracr_model.apply(inputs[i]).decoded
+            assert all(self.compare_positions(reference_output[1:], decoded_outputs[i][1:], is_categorical, 1.e-5)), \
+                f"Batched outputs do not match tracr_model.apply for input {inputs[i]}"
 
         correct_count = 0
         for i in range(len(inputs)):
             input = inputs[i]
             expected_output = expected_outputs[i]
-            decoded_output = tracr_model.apply(input).decoded
+            decoded_output = decoded_outputs[i]
             correct = all(self.compare_valid_positions(expected_output, decoded_output, is_categorical, atol))
 
             if not correct and fail_on_error:
@@ -0,0 +1,39 @@
+import random
+
+import pytest
+from tracr.rasp import rasp
+
+from circuits_benchmark.benchmark.cases.case_3 import Case3
+from circuits_benchmark.benchmark.common_programs import make_hist, make_reverse, make_frac_prevs, \
+    make_shuffle_dyck, make_sort, detect_pattern
+from circuits_benchmark.benchmark.rasp_batch_evaluator import evaluate_batch
+
+
+def random_samples(vocab, n_samples=200, min_len=1, max_len=8):
+    rng = random.Random(42)
+    return [[rng.choice(vocab) for _ in range(rng.randint(min_len, max_len))] for _ in range(n_samples)]
+
+
+class TestRASPBatchEvaluator:
+    @pytest.mark.parametrize("program, vocab", [
+        (make_hist(), ["a", "b", "c"]),
+        (make_reverse(rasp.tokens), ["a", "b", "c"]),
+        (make_frac_prevs(rasp.tokens == "x"), ["a", "x"]),
+        (make_shuffle_dyck(["()", "{}"]), ["(", ")", "{", "}"]),
+        (make_sort(rasp.tokens, rasp.tokens, max_seq_len=8, min_key=1), [1, 2, 3]),
+        (detect_pattern(rasp.tokens, "abc"), ["a", "b", "c"]),
+    ])
+    def test_matches_reference_interpreter(self, program, vocab):
+        samples = random_samples(vocab)
+        expected_outputs = [rasp.evaluate(program, sample) for sample in samples]
+
+        assert evaluate_batch(program, samples, chunk_size=64) == expected_outputs
+
+    def test_labels_all_data_of_case(self):
+        case = Case3()
+        inputs, outputs = case.gen_all_data(4, 5)
+
+        program = case.get_program()
+        for input, output in zip(inputs, outputs):
+            sample = [x for x in input[1:] if x != "PAD"]
+            assert output[1:len(sample) + 1] == program(sample)
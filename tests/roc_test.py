@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from circuits_benchmark.utils.circuit.roc import get_roc_curve
+
+
+def get_rates_by_thresholding(scores, true_mask, threshold):
+    hypothesis_mask = scores > threshold
+    tpr = np.count_nonzero(hypothesis_mask & true_mask) / np.count_nonzero(true_mask)
+    fpr = np.count_nonzero(hypothesis_mask & ~true_mask) / np.count_nonzero(~true_mask)
+    return tpr, fpr
+
+
+class TestRocCurve:
+    def test_threshold_sweep_matches_thresholding_each_cutoff(self):
+        rng = np.random.default_rng(0)
+        scores = rng.integers(0, 20, size=200).astype(np.float64)  # plenty of ties
+        true_mask = rng.random(200) < 0.2
+
+        curve = get_roc_curve(scores, true_mask)
+
+        assert curve.edge_counts[0] == 0 and curve.edge_counts[-1] == len(scores)
+        assert len(curve.thresholds) == len(np.unique(scores)) + 1
+        for threshold in [-1, 0, 3.5, 10, 19, 25]:
+            assert curve.get_rates_at_threshold(threshold) == pytest.approx(
+                get_rates_by_thresholding(scores, true_mask, threshold))
+
+        for i in range(1, len(curve.thresholds)):
+            assert (curve.tpr[i], curve.fpr[i]) == pytest.approx(
+                get_rates_by_thresholding(scores, true_mask, np.nextafter(curve.thresholds[i], -np.inf)))
+
+    def test_infinite_threshold_is_the_empty_circuit(self):
+        curve = get_roc_curve(np.array([0.9, 0.1, 0.5]), np.array([True, False, True]))
+
+        assert curve.get_rates_at_threshold(np.inf) == (0, 0)
+
+    def test_edge_count_sweep_has_one_cutoff_per_edge(self):
+        scores = np.array([0.9, 0.1, 0.5, 0.7, -np.inf])
+        true_mask = np.array([True, False, True, False, False])
+
+        curve = get_roc_curve(scores, true_mask, sweep="edge_count")
+
+        assert curve.edge_counts.tolist() == [0, 1, 2, 3, 4, 5]
+        assert curve.tpr.tolist() == [0, 0.5, 0.5, 1, 1, 1]
+        assert curve.fpr.tolist() == pytest.approx([0, 0, 1 / 3, 1 / 3, 2 / 3, 1])
+        assert curve.get_rates_at_edge_count(3) == pytest.approx((1, 1 / 3))
+
+    def test_auc(self):
+        true_mask = np.array([True, True, False, False])
+
+        assert get_roc_curve(np.array([4., 3., 2., 1.]), true_mask).get_auc() == pytest.approx(1)
+        assert get_roc_curve(np.array([1., 2., 3., 4.]), true_mask).get_auc() == pytest.approx(0)
+        assert get_roc_curve(np.ones(4), true_mask).get_auc() == pytest.approx(0.5)
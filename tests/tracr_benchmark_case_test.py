@@ -0,0 +1,95 @@
+import pytest
+import torch as t
+
+from circuits_benchmark.benchmark import tracr_benchmark_case
+from circuits_benchmark.benchmark.cases.case_3 import Case3
+
+
+class TestTracrBenchmarkCase:
+    def test_hl_model_is_shared_per_device_and_dtype(self):
+        case = Case3()
+        hl_model = case.get_hl_model(device="cpu")
+
+        assert case.get_hl_model(device=t.device("cpu")) is hl_model
+        assert all(not p.requires_grad for p in hl_model.parameters())
+
+        double_hl_model = case.get_hl_model(device="cpu", dtype=t.float64)
+        assert double_hl_model is not hl_model
+        assert double_hl_model.W_E.dtype == t.float64
+
+    def test_hl_model_clone_is_private_and_trainable(self):
+        case = Case3()
+        hl_model = case.get_hl_model(device="cpu")
+        clone = case.get_hl_model(device="cpu", clone=True)
+
+        assert clone is not hl_model
+        assert all(p.requires_grad for p in clone.parameters())
+        assert all(not p.requires_grad for p in hl_model.parameters())
+
+        input = [["BOS", "a", "x", "b", "x"]]
+        assert t.allclose(clone(input), hl_model(input))
+
+    def test_batch_labelling_matches_rasp_program(self):
+        case = Case3()
+        inputs = [["BOS", "a", "x", "b", "x"], ["BOS", "x", "x", "c", "PAD"]]
+        outputs = case.get_correct_outputs_for_inputs(inputs)
+
+        program = case.get_program()
+        assert outputs == [["BOS"] + program(["a", "x", "b", "x"]),
+                           ["BOS"] + program(["x", "x", "c"]) + ["PAD"]]
+
+    def test_batch_evaluation_falls_back_to_reference_interpreter(self, monkeypatch):
+        case = Case3()
+        samples = [["a", "x", "b", "x"], ["x", "x", "c"], ["b", "b", "a", "c"]]
+        expected = [case.get_program()(sample) for sample in samples]
+
+        def wrong_after_first_sample(program, samples):
+            return [expected[0]] + [[0] * len(sample) for sample in samples[1:]]
+
+        monkeypatch.setattr(tracr_benchmark_case, "evaluate_batch", wrong_after_first_sample)
+        assert case.evaluate_program_on_samples(samples) == expected
+
+        def failing(program, samples):
+            raise ValueError("unsupported")
+
+        monkeypatch.setattr(tracr_benchmark_case, "evaluate_batch", failing)
+        assert case.evaluate_program_on_samples(samples) == expected
+
+    def test_batch_labelling_with_hl_model(self):
+        class Case3LabelledWithHLModel(Case3):
+            def label_with_hl_model(self) -> bool:
+                return True
+
+        case = Case3LabelledWithHLModel()
+        inputs, _ = case.gen_all_data(4, 5)
+        outputs = case.get_correct_outputs_for_inputs(inputs, cross_check_samples=len(inputs))
+
+        assert len(outputs) == len(inputs)
+        assert all(len(output) == 5 for output in outputs)
+
+    def test_permuted_corrupted_data_pairs_samples_of_the_clean_pool(self):
+        case = Case3()
+        clean, corrupted = case.get_clean_and_corrupted_data(max_samples=50)
+
+        assert len(clean) == len(corrupted) == 50
+        clean_rows = sorted(map(tuple, clean.get_inputs().tolist()))
+        assert sorted(map(tuple, corrupted.get_inputs().tolist())) == clean_rows
+
+    def test_permuted_corrupted_data_needs_at_least_two_samples(self, monkeypatch):
+        case = Case3()
+        single_sample = case.get_clean_data(max_samples=50).select(t.tensor([0]))
+        monkeypatch.setattr(case, "get_clean_data", lambda **kwargs: single_sample)
+
+        with pytest.raises(ValueError):
+            case.get_clean_and_corrupted_data(max_samples=50)
+
+    def test_position_corrupted_data_is_labelled_by_the_hl_model(self):
+        case = Case3()
+        clean, corrupted = case.get_clean_and_corrupted_data(max_samples=50, corruption="positions",
+                                                             n_corrupted_positions=1)
+
+        changed_positions = (clean.get_inputs() != corrupted.get_inputs()).sum(dim=1)
+        assert (changed_positions == 1).all()
+
+        expected = case.get_hl_model()(corrupted.get_inputs()).argmax(dim=-1)[:, 1:]
+        assert t.equal(corrupted.get_targets().argmax(dim=-1)[:, 1:].cpu(), expected.cpu())
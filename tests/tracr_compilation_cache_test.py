@@ -0,0 +1,27 @@
+import os
+
+from circuits_benchmark.benchmark.cases.case_3 import Case3
+from circuits_benchmark.benchmark.cases.case_5 import Case5
+from circuits_benchmark.benchmark.tracr_compilation_cache import build_tracr_cache_key
+
+
+class TestTracrCompilationCache:
+    def test_warm_run_loads_compiled_program_from_disk(self, tmp_path):
+        cache_dir = str(tmp_path)
+        compiled = Case3().get_tracr_output(cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 1
+
+        cached = Case3().get_tracr_output(cache_dir=cache_dir)
+        assert cached.model.residual_labels == compiled.model.residual_labels
+        assert set(cached.graph.nodes) == set(compiled.graph.nodes)
+
+        input = ["BOS", "a", "x", "b", "x"]
+        assert cached.model.apply(input).decoded == compiled.model.apply(input).decoded
+
+    def test_cache_key_depends_on_case_and_settings(self):
+        settings = dict(max_seq_len=4, compiler_bos="BOS", compiler_pad="PAD", causal=True)
+        key = build_tracr_cache_key(Case3(), settings)
+
+        assert key == build_tracr_cache_key(Case3(), settings)
+        assert key != build_tracr_cache_key(Case5(), settings)
+        assert key != build_tracr_cache_key(Case3(), {**settings, "max_seq_len": 5})
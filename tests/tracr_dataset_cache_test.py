@@ -0,0 +1,72 @@
+import numpy as np
+import torch as t
+
+from circuits_benchmark.benchmark import tracr_dataset_cache
+from circuits_benchmark.benchmark.cases.case_3 import Case3
+from circuits_benchmark.benchmark.tracr_dataset_cache import build_dataset_cache_key, load_cached_encoded_dataset, \
+    save_encoded_dataset
+
+
+class TestTracrDatasetCache:
+    def test_encoded_dataset_round_trip(self, tmp_path):
+        case = Case3()
+        dataset = case.get_clean_data(max_samples=50, use_cache=False, compact_dataset=True)
+
+        key = build_dataset_cache_key(case, dict(seed=42, max_samples=50))
+        assert load_cached_encoded_dataset(key, cache_dir=str(tmp_path)) is None
+
+        save_encoded_dataset(key, dataset, cache_dir=str(tmp_path))
+        cached = load_cached_encoded_dataset(key, cache_dir=str(tmp_path))
+
+        assert t.equal(cached.get_inputs(), dataset.get_inputs().cpu())
+        assert t.equal(cached.get_targets(), dataset.get_targets().cpu())
+
+    def test_cache_key_depends_on_sampling_settings(self):
+        case = Case3()
+        key = build_dataset_cache_key(case, dict(seed=42, max_samples=50))
+
+        assert key == build_dataset_cache_key(case, dict(seed=42, max_samples=50))
+        assert key != build_dataset_cache_key(case, dict(seed=43, max_samples=50))
+        assert key != build_dataset_cache_key(case, dict(seed=42, max_samples=100))
+
+    def test_cached_clean_data_matches_generated_data(self):
+        case = Case3()
+        generated = case.get_clean_data(max_samples=50, use_cache=False)
+        case.get_clean_data(max_samples=50)
+        cached = case.get_clean_data(max_samples=50)
+
+        assert t.equal(cached.get_inputs(), generated.get_inputs())
+        assert t.equal(cached.get_targets(), generated.get_targets())
+
+    def test_cached_clean_data_has_the_same_devices_as_generated_data(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(tracr_dataset_cache, "get_dataset_cache_dir", lambda: str(tmp_path))
+        case = Case3()
+        for compact_dataset in [False, True]:
+            generated = case.get_clean_data(max_samples=50, use_cache=False, compact_dataset=compact_dataset)
+            case.get_clean_data(max_samples=50, compact_dataset=compact_dataset)
+            cached = case.get_clean_data(max_samples=50, compact_dataset=compact_dataset)
+
+            assert cached.get_inputs().device == generated.get_inputs().device == t.device("cpu")
+            assert cached.get_targets().device == generated.get_targets().device == case.get_hl_model().device
+            assert t.equal(cached.get_inputs(), generated.get_inputs())
+            assert t.equal(cached.get_targets(), generated.get_targets())
+
+    def test_compact_clean_data_matches_encoded_data(self):
+        case = Case3()
+        encoded = case.get_clean_data(max_samples=50, use_cache=False)
+        compact = case.get_clean_data(max_samples=50, use_cache=False, compact_dataset=True)
+
+        assert t.equal(compact.get_inputs(), encoded.get_inputs())
+        assert t.equal(compact.get_targets(), encoded.get_targets())
+
+    def test_random_state_is_the_same_after_cache_hits_and_misses(self):
+        case = Case3()
+        case.get_clean_data(max_samples=50, use_cache=False)
+        state_after_miss = np.random.rand(), t.rand(1)
+
+        case.get_clean_data(max_samples=50)
+        case.get_clean_data(max_samples=50)
+        state_after_hit = np.random.rand(), t.rand(1)
+
+        assert state_after_miss[0] == state_after_hit[0]
+        assert t.equal(state_after_miss[1], state_after_hit[1])
@@ -1,4 +1,5 @@
 import pytest
+import torch as t
 
 from circuits_benchmark.benchmark.cases.case_3 import Case3
 from circuits_benchmark.benchmark.cases.case_9 import Case9
@@ -10,3 +11,19 @@ class TestTracrDataset:
     def test_get_encoded_dataset(self, case):
         data = case.get_clean_data()
         assert len(data) == 10
+
+    @pytest.mark.parametrize("case", [Case3(), Case9()])
+    def test_chunked_encoding_matches_single_pass(self, case):
+        data = case.get_clean_data(min_samples=50, max_samples=50, encoded_dataset=False)
+
+        single_pass = data.get_encoded_dataset(chunk_size=len(data))
+        chunked = data.get_encoded_dataset(chunk_size=7)
+
+        assert t.equal(single_pass.get_inputs(), chunked.get_inputs())
+        assert t.equal(single_pass.get_targets(), chunked.get_targets())
+
+    def test_chunk_size_is_bounded_by_memory_budget(self):
+        data = Case3().get_clean_data(min_samples=50, max_samples=50, encoded_dataset=False)
+
+        assert data.get_encoding_chunk_size(memory_budget=1) == 1
+        assert data.get_encoding_chunk_size(memory_budget=2 ** 20) < data.get_encoding_chunk_size(memory_budget=2 ** 30)
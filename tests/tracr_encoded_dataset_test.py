@@ -0,0 +1,102 @@
+import pytest
+import torch as t
+
+from circuits_benchmark.benchmark.tracr_encoded_dataset import TracrEncodedDataset, CompactTracrEncodedDataset, \
+    get_smallest_int_dtype
+
+
+class TestTracrEncodedDatasetLoader:
+    def make_dataset(self, n_samples=23):
+        inputs = t.arange(n_samples * 5).reshape(n_samples, 5)
+        targets = t.rand((n_samples, 5, 3))
+        return TracrEncodedDataset(inputs, targets)
+
+    def test_batches_are_consecutive_slices(self):
+        dataset = self.make_dataset()
+        batches = list(dataset.make_loader(batch_size=5, device="cpu"))
+
+        assert len(batches) == 5
+        for i, (inputs, targets) in enumerate(batches):
+            assert t.equal(inputs, dataset.inputs[i * 5:(i + 1) * 5])
+            assert t.equal(targets, dataset.targets[i * 5:(i + 1) * 5])
+
+    def test_shuffled_batches_cover_all_samples(self):
+        dataset = self.make_dataset()
+        batches = list(dataset.make_loader(batch_size=5, shuffle=True, device="cpu"))
+
+        inputs = t.cat([batch[0] for batch in batches])
+        targets = t.cat([batch[1] for batch in batches])
+        order = inputs[:, 0].argsort()
+        assert t.equal(inputs[order], dataset.inputs)
+        assert t.equal(targets[order], dataset.targets)
+
+    def test_device_resident_loader_matches_default_loader(self):
+        dataset = self.make_dataset()
+        loader = dataset.make_loader(batch_size=4, device="cpu")
+        resident_loader = dataset.make_loader(batch_size=4, device="cpu", device_resident=True)
+
+        assert len(loader) == len(resident_loader) == 6
+        for batch, resident_batch in zip(loader, resident_loader):
+            assert t.equal(batch[0], resident_batch[0])
+            assert t.equal(batch[1], resident_batch[1])
+
+    def test_unbatched_loader_yields_samples(self):
+        dataset = self.make_dataset(n_samples=3)
+        samples = list(dataset.make_loader(batch_size=None, device="cpu"))
+
+        assert len(samples) == 3
+        assert t.equal(samples[1][0], dataset.inputs[1])
+
+    def test_pinned_loader_can_not_use_worker_processes(self):
+        dataset = self.make_dataset()
+
+        with pytest.raises(AssertionError):
+            dataset.make_loader(batch_size=5, device="cpu", num_workers=1, pin_memory=True)
+
+        batches = list(dataset.make_loader(batch_size=5, device="cpu", num_workers=1))
+        assert t.equal(t.cat([batch[0] for batch in batches]), dataset.inputs)
+
+
+class TestCompactTracrEncodedDataset:
+    def make_categorical_dataset(self, n_samples=23, seq_len=5, d_vocab=6, num_classes=4):
+        generator = t.Generator().manual_seed(0)
+        inputs = t.randint(0, d_vocab, (n_samples, seq_len), generator=generator)
+        class_indices = t.randint(0, num_classes, (n_samples, seq_len), generator=generator)
+        targets = t.nn.functional.one_hot(class_indices, num_classes=num_classes).float()
+        return TracrEncodedDataset(inputs, targets)
+
+    def test_categorical_dataset_is_stored_compactly(self):
+        dataset = self.make_categorical_dataset()
+        compact = CompactTracrEncodedDataset.from_encoded_dataset(dataset, is_categorical=True)
+
+        assert compact.inputs.dtype == t.uint8
+        assert compact.targets.shape == dataset.targets.shape[:-1]
+        assert t.equal(compact.get_inputs(), dataset.get_inputs())
+        assert t.equal(compact.get_targets(), dataset.get_targets())
+        assert compact.get_targets().dtype == dataset.get_targets().dtype
+
+    def test_numerical_targets_are_kept(self):
+        dataset = TracrEncodedDataset(t.randint(0, 300, (10, 4)), t.rand((10, 4, 1)))
+        compact = CompactTracrEncodedDataset.from_encoded_dataset(dataset, is_categorical=False)
+
+        assert compact.inputs.dtype == t.int16
+        assert t.equal(compact.get_inputs(), dataset.get_inputs())
+        assert t.equal(compact.get_targets(), dataset.get_targets())
+
+    def test_items_and_batches_match_encoded_dataset(self):
+        dataset = self.make_categorical_dataset()
+        compact = CompactTracrEncodedDataset.from_encoded_dataset(dataset, is_categorical=True)
+
+        for i in range(len(dataset)):
+            assert all(t.equal(a, b) for a, b in zip(compact[i], dataset[i]))
+
+        device = t.device("cpu")
+        for batch, compact_batch in zip(dataset.make_loader(batch_size=5, device=device),
+                                        compact.make_loader(batch_size=5, device=device)):
+            assert t.equal(batch[0], compact_batch[0])
+            assert t.equal(batch[1], compact_batch[1])
+
+    def test_smallest_int_dtype(self):
+        assert get_smallest_int_dtype(255) == t.uint8
+        assert get_smallest_int_dtype(256) == t.int16
+        assert get_smallest_int_dtype(2 ** 15) == t.int32
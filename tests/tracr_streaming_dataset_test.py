@@ -0,0 +1,85 @@
+import random
+
+import numpy as np
+import pytest
+import torch as t
+
+from circuits_benchmark.benchmark.cases.case_1 import Case1
+from circuits_benchmark.benchmark.cases.case_3 import Case3
+from circuits_benchmark.benchmark.tracr_streaming_dataset import (get_shard_seed, sample_data_in_shards, sample_shard,
+                                                                   seeded_rngs)
+
+
+class TestTracrStreamingDataset:
+    def test_iterating_twice_yields_the_same_samples(self):
+        dataset = Case3().get_streaming_data(25, shard_size=10)
+
+        first = list(dataset)
+        second = list(dataset)
+
+        assert len(first) == 25
+        assert all(t.equal(a[0], b[0]) and t.equal(a[1], b[1]) for a, b in zip(first, second))
+
+    def test_loader_batches_match_shards(self):
+        dataset = Case3().get_streaming_data(25, shard_size=10)
+        batches = list(dataset.make_loader(batch_size=10, device="cpu"))
+
+        assert len(batches) == 3
+        for shard_index, (inputs, targets) in enumerate(batches):
+            shard = dataset.get_shard(shard_index)
+            assert t.equal(inputs, shard.get_inputs().cpu())
+            assert t.equal(targets, shard.get_targets().cpu())
+
+    def test_loader_can_not_be_shuffled(self):
+        dataset = Case3().get_streaming_data(25, shard_size=10)
+
+        with pytest.raises(ValueError):
+            dataset.make_loader(batch_size=10, shuffle=True, device="cpu")
+
+    def test_shards_do_not_change_global_random_state(self):
+        dataset = Case3().get_streaming_data(10)
+
+        random.seed(0)
+        np.random.seed(0)
+        dataset.get_shard(0)
+        assert random.random() == random.Random(0).random()
+        assert np.random.rand() == np.random.RandomState(0).rand()
+
+    def test_shards_are_permuted(self):
+        # Case1 samples its data grouped by output, so unpermuted shards would be sorted by label
+        case = Case1()
+        max_seq_len = case.get_max_seq_len()
+        with seeded_rngs(get_shard_seed(42, 0)):
+            grouped_inputs, grouped_outputs = case.sample_data(50, max_seq_len, max_seq_len)
+
+        inputs, outputs = sample_shard(case, 50, max_seq_len, max_seq_len, seed=42, shard_index=0)
+
+        assert inputs != grouped_inputs
+        assert sorted(zip(map(str, inputs), map(str, outputs))) == \
+               sorted(zip(map(str, grouped_inputs), map(str, grouped_outputs)))
+
+    def test_shard_seeds_depend_on_base_seed_and_shard_index(self):
+        assert get_shard_seed(42, 0) == get_shard_seed(42, 0)
+        assert get_shard_seed(42, 1) != get_shard_seed(43, 0)
+        assert get_shard_seed(42, 0) != get_shard_seed(42, 1)
+
+
+class TestSampleDataInShards:
+    def test_samples_are_the_same_for_any_number_of_workers(self):
+        case = Case3()
+        max_seq_len = case.get_max_seq_len()
+
+        sequential = sample_data_in_shards(case, 25, max_seq_len, max_seq_len, seed=42, shard_size=10, n_workers=1)
+        parallel = sample_data_in_shards(case, 25, max_seq_len, max_seq_len, seed=42, shard_size=10, n_workers=3)
+
+        assert len(sequential[0]) == 25
+        assert sequential == parallel
+
+    def test_shards_match_streaming_dataset(self):
+        case = Case3()
+        max_seq_len = case.get_max_seq_len()
+        inputs, _ = sample_data_in_shards(case, 25, max_seq_len, max_seq_len, seed=42, shard_size=10)
+
+        dataset = case.get_streaming_data(25, seed=42, shard_size=10)
+        encoded_inputs = case.get_hl_model().map_tracr_input_to_tl_input(inputs)
+        assert t.equal(encoded_inputs.cpu(), t.stack([input for input, _ in dataset]).cpu())
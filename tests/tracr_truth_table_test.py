@@ -0,0 +1,33 @@
+import os
+
+from circuits_benchmark.benchmark.cases.case_3 import Case3
+from circuits_benchmark.benchmark.tracr_truth_table import load_or_build_truth_table
+
+
+class TestTracrTruthTable:
+    def test_truth_table_matches_labelling(self, tmp_path):
+        case = Case3()
+        truth_table = load_or_build_truth_table(case, tables_dir=str(tmp_path))
+        assert len(os.listdir(tmp_path)) == 1
+
+        inputs = case.gen_all_inputs(2, case.get_max_seq_len()).tolist()
+        expected_outputs = case.compute_correct_outputs_for_inputs(inputs)
+
+        cached = load_or_build_truth_table(case, tables_dir=str(tmp_path))
+        assert cached.lookup(cached.encode_inputs(inputs), case.get_max_seq_len()) == expected_outputs
+        assert truth_table.lookup(truth_table.encode_inputs(inputs), case.get_max_seq_len()) == expected_outputs
+
+    def test_truth_table_is_not_built_for_few_inputs(self):
+        case = Case3()
+        case.sample_data(10, 2, case.get_max_seq_len())
+
+        assert not case.truth_table_loaded
+        assert case.get_truth_table(n_inputs=10) is None
+
+    def test_sampled_data_is_labelled_by_truth_table(self):
+        case = Case3()
+        assert case.get_truth_table() is not None
+
+        inputs, outputs = case.sample_data(100, 2, case.get_max_seq_len())
+        assert outputs == case.compute_correct_outputs_for_inputs(inputs)
+        assert outputs == case.get_correct_outputs_for_inputs(inputs)